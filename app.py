@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-import requests
+try: from frontend.api import ClienteAPI
+except ImportError: from api import ClienteAPI # executando de dentro de frontend/
 import plotly.express as px
 from streamlit_option_menu import option_menu
 from datetime import datetime, date
@@ -18,6 +19,7 @@ if 'carrinho' not in st.session_state: st.session_state['carrinho'] = []
 if 'logado' not in st.session_state: st.session_state['logado'] = False
 if 'usuario' not in st.session_state: st.session_state['usuario'] = ""
 if 'cargo' not in st.session_state: st.session_state['cargo'] = ""
+if 'token' not in st.session_state: st.session_state['token'] = ""
 
 def render_logo_svg(width="50px", color="#C57A57"):
     return f'<svg width="{width}" height="{width}" viewBox="0 0 100 100" fill="none" xmlns="http://www.w3.org/2000/svg"><path d="M30 20 V80 C30 90 40 95 50 85 L80 50 C90 40 80 20 60 20 Z" stroke="{color}" stroke-width="8" fill="none"/><path d="M30 50 L60 20" stroke="{color}" stroke-width="8" stroke-linecap="round"/><circle cx="35" cy="85" r="5" fill="{color}"/></svg>'
@@ -59,16 +61,37 @@ def apply_custom_style():
 apply_custom_style()
 
 # --- FUNÇÃO BLINDADA ---
+@st.cache_resource
+def cliente_api(): return ClienteAPI(API_URL) # sessão keep-alive e cache compartilhados entre reruns
+
+api = cliente_api()
+
+# O cliente é compartilhado entre sessões: o token de cada usuário vai por chamada
+def auth(): return {"Authorization": f"Bearer {st.session_state['token']}"}
+def encerrar_sessao(aviso=""):
+    st.session_state['logado'] = False; st.session_state['token'] = ""; st.session_state['aviso_login'] = aviso; st.rerun()
+def sair():
+    try: api.post("auth/logout/", headers=auth(), invalidar=False)
+    except Exception: pass # sem conexão o token expira sozinho
+    encerrar_sessao()
+def autenticada(res):
+    # 401: token expirado, revogado ou a API reiniciou sem TOKEN_SECRET fixo -> volta ao login
+    if res.status_code == 401: encerrar_sessao("Sessão expirada. Entre novamente.")
+    return res
+
 def get_data(endpoint):
     try:
-        endpoint = endpoint.strip("/")
-        resp = requests.get(f"{API_URL}/{endpoint}/")
-        if resp.status_code == 200:
-            return resp.json()
-        return [] 
+        return api.get(endpoint)
     except:
         return [] 
 
+def get_varios(*endpoints):
+    # Várias listagens independentes de uma vez (em paralelo)
+    try:
+        return api.varios(*endpoints)
+    except:
+        return [[] for _ in endpoints]
+
 def card_html(titulo, valor, subtexto, cor="card-dark"): 
     st.markdown(f"<div class='card-container {cor}'><div class='card-title'>{titulo}</div><div class='card-value'>{valor}</div><div style='font-size:12px; margin-top:10px; opacity:0.8'>{subtexto}</div></div>", unsafe_allow_html=True)
 
@@ -87,6 +110,8 @@ def tela_login():
         if not os.path.exists(logo_path): logo_path = "logo.png"
         if os.path.exists(logo_path): st.image(logo_path, use_container_width=True)
         else: st.markdown(f"<div style='display:flex; flex-direction:column; align-items:center;'>{render_logo_svg(width='80px', color='#3B82F6')}<div class='login-title'>Decant ERP</div></div>", unsafe_allow_html=True)
+        aviso = st.session_state.pop('aviso_login', "")
+        if aviso: st.warning(aviso)
         
         with st.form("login_form"):
             st.write("--- MODO DE DIAGNÓSTICO ---")
@@ -100,7 +125,7 @@ def tela_login():
                 
                 try:
                     # 2. Faz a chamada
-                    res = requests.post(f"{API_URL}/auth/login/", json={"username": u_input, "senha": p_input, "cargo": ""})
+                    res = api.post("auth/login/", json={"username": u_input, "senha": p_input, "cargo": ""}, invalidar=False)
                     
                     # 3. MOSTRA A RESPOSTA CRUA (Aqui vamos descobrir o erro)
                     st.warning(f"Status Code: {res.status_code}") 
@@ -111,6 +136,7 @@ def tela_login():
                         st.session_state['logado'] = True
                         st.session_state['usuario'] = data['usuario']
                         st.session_state['cargo'] = data['cargo']
+                        st.session_state['token'] = data['access_token']
                         st.success("Login OK! Redirecionando...")
                         time.sleep(1)
                         st.rerun()
@@ -132,7 +158,7 @@ def sistema_erp():
         page_id = next(x["id"] for x in menu if x["l"] == sel)
         st.markdown("<div style='margin-top: 40px'></div>", unsafe_allow_html=True)
         st.markdown(f"<div style='background-color: #1E293B; padding: 10px; border-radius: 12px; margin-bottom: 10px; border: 1px solid #334155; text-align: center;'><div style='color: #94A3B8; font-size: 10px; text-transform: uppercase; letter-spacing: 1px; margin-bottom: 2px;'>Bem-vindo</div><div style='color: white; font-weight: 600; font-size: 14px;'>{st.session_state['usuario']}</div><div style='color: #3B82F6; font-size: 11px;'>{st.session_state['cargo']}</div></div>", unsafe_allow_html=True)
-        if st.button("Sair / Logout", use_container_width=True): st.session_state['logado'] = False; st.rerun()
+        if st.button("Sair / Logout", use_container_width=True): sair()
 
     if page_id == "crm":
         header("CRM & Fidelização")
@@ -169,7 +195,7 @@ def sistema_erp():
             fig.update_layout(title={'text': "Fluxo de Caixa Mensal", 'y': 0.93, 'x': 0.05, 'xanchor': 'left', 'yanchor': 'top', 'font': {'size': 16, 'color': 'white', 'family': 'Inter', 'weight': 'bold'}}, paper_bgcolor='#1E293B', plot_bgcolor='#1E293B', font_color='#94A3B8', xaxis=dict(showgrid=False), yaxis=dict(showgrid=True, gridcolor='#334155'), legend=dict(orientation="h", y=1.05), margin=dict(l=20, r=20, t=60, b=20), height=370)
             st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
         with c_vendas:
-            vendas = get_data("vendas"); clientes = get_data("clientes"); map_clientes = {c['id']: c for c in clientes}
+            vendas, clientes = get_varios("vendas", "clientes"); map_clientes = {c['id']: c for c in clientes}
             rows_html = ""
             for v in vendas[:5]:
                 cli = map_clientes.get(v['cliente_id'], {'nome': 'Cliente', 'email': '-'})
@@ -178,7 +204,7 @@ def sistema_erp():
 
     elif page_id == "pdv":
         header("Frente de Caixa (PDV)")
-        clis = get_data("clientes"); prods = get_data("produtos")
+        clis, prods = get_varios("clientes", "produtos")
         produtos_acabados = [p for p in prods if p['tipo'] == 'Produto Acabado']
         c_esq, c_dir = st.columns([1.5, 1])
         with c_esq:
@@ -215,10 +241,10 @@ def sistema_erp():
                 if st.button("✅ FINALIZAR VENDA", type="primary", use_container_width=True):
                     cid = next(c['id'] for c in clis if c['nome'] == cli_sel)
                     payload = {"cliente_id": cid, "itens": [{"produto_id": i['id'], "quantidade": i['qtd'], "valor_total": i['total']} for i in st.session_state['carrinho']], "metodo_pagamento": pagamento}
-                    res = requests.post(f"{API_URL}/vendas/pdv/", json=payload)
+                    res = api.post("vendas/pdv/", json=payload)
                     if res.status_code == 200:
                         data = res.json(); st.session_state['carrinho'] = []; st.success("Venda Realizada!")
-                        pdf_bytes = requests.get(f"{API_URL}/vendas/recibo/{data['grupo_id']}/").content
+                        pdf_bytes = api.get_bruto(f"vendas/recibo/{data['grupo_id']}/").content
                         st.download_button("🖨️ Imprimir Cupom", pdf_bytes, file_name="cupom.pdf")
                     else: st.error(f"Erro: {res.text}")
             else: st.info("Carrinho vazio.")
@@ -232,7 +258,7 @@ def sistema_erp():
                 c3, c4 = st.columns(2); valor = c3.number_input("Valor (R$)", min_value=0.01); cat = c4.selectbox("Categoria", ["Custos Fixos", "Despesa Variável", "Impostos", "Receita Extra", "Investimento"])
                 c5, c6 = st.columns(2); dt_venc = c5.date_input("Vencimento"); pago = c6.checkbox("Já foi pago?")
                 if st.form_submit_button("Salvar Lançamento"):
-                    res = requests.post(f"{API_URL}/financeiro/lancamento/", json={"descricao": desc, "tipo": tipo, "categoria": cat, "valor": valor, "data_vencimento": str(dt_venc), "pago": pago})
+                    res = api.post("financeiro/lancamento/", json={"descricao": desc, "tipo": tipo, "categoria": cat, "valor": valor, "data_vencimento": str(dt_venc), "pago": pago})
                     if res.status_code == 200: st.success("Lançado!"); st.rerun()
                     else: st.error("Erro")
         with t2:
@@ -245,7 +271,7 @@ def sistema_erp():
                     c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
                     c1.markdown(f"**{icone} {row['descricao']}**"); c2.write(f"R$ {row['valor']:,.2f}"); c3.write(f"{row['data_vencimento']} | {status}")
                     if not row['pago']:
-                        if c4.button("Pagar", key=f"pay_{row['id']}"): requests.post(f"{API_URL}/financeiro/pagar/{row['id']}"); st.rerun()
+                        if c4.button("Pagar", key=f"pay_{row['id']}"): api.post(f"financeiro/pagar/{row['id']}"); st.rerun()
                 st.divider()
             else: st.info("Nenhum lançamento financeiro.")
 
@@ -257,7 +283,7 @@ def sistema_erp():
             with st.form("new_cli"):
                 n = st.text_input("Nome"); e = st.text_input("Email"); t = st.text_input("Telefone")
                 if st.form_submit_button("Cadastrar"):
-                    requests.post(f"{API_URL}/clientes/", json={"nome":n, "email":e, "telefone":t}); st.success("Cliente cadastrado!"); st.rerun()
+                    api.post("clientes/", json={"nome":n, "email":e, "telefone":t}); st.success("Cliente cadastrado!"); st.rerun()
         with c2:
             st.markdown("##### Lista de Clientes")
             clis = get_data("clientes")
@@ -278,28 +304,38 @@ def sistema_erp():
                 st.dataframe(df_show, use_container_width=True, hide_index=True)
             else: st.info("Sem produtos.")
         with t2:
-            movs = get_data("estoque/kardex"); 
+            # Kardex paginado (mais recentes primeiro): o header X-Next-Cursor aponta a página seguinte
+            if 'kardex_cursores' not in st.session_state: st.session_state['kardex_cursores'] = [None]
+            cursores = st.session_state['kardex_cursores']
+            try:
+                res = api.get_bruto("estoque/kardex/", params={"after": cursores[-1]} if cursores[-1] else {})
+                movs, proximo = (res.json(), res.headers.get("X-Next-Cursor")) if res.status_code == 200 else ([], None)
+            except Exception: movs, proximo = [], None
             if movs: st.dataframe(pd.DataFrame(movs), use_container_width=True, hide_index=True)
             else: st.info("Nenhuma movimentação registrada.")
+            b1, b2, b3 = st.columns([1, 1, 2])
+            if len(cursores) > 1 and b1.button("◀ Mais recentes"): cursores.pop(); st.rerun()
+            if proximo and b2.button("Mais antigos ▶"): cursores.append(proximo); st.rerun()
+            b3.caption(f"Página {len(cursores)}")
         with t3:
             with st.form("np"):
                 n = st.text_input("Nome"); t = st.radio("Tipo", ["Materia Prima", "Produto Acabado"]); u = st.selectbox("Unid", ["kg","L","Un"]); e = st.number_input("Estoque"); c = st.number_input("Custo")
-                if st.form_submit_button("Salvar"): requests.post(f"{API_URL}/produtos/", json={"nome":n,"tipo":t,"unidade":u,"estoque_atual":e,"custo":c}); st.success("Salvo!"); st.rerun()
+                if st.form_submit_button("Salvar"): api.post("produtos/", json={"nome":n,"tipo":t,"unidade":u,"estoque_atual":e,"custo":c}); st.success("Salvo!"); st.rerun()
     elif page_id == "forn":
         header("Fornecedores")
         with st.form("nf"):
             n = st.text_input("Empresa"); p = st.number_input("Prazo"); 
-            if st.form_submit_button("Salvar"): requests.post(f"{API_URL}/fornecedores/", json={"nome":n,"prazo_entrega_dias":p}); st.success("OK")
+            if st.form_submit_button("Salvar"): api.post("fornecedores/", json={"nome":n,"prazo_entrega_dias":p}); st.success("OK")
     elif page_id == "prec":
         header("Preços")
-        prods = get_data("produtos"); forns = get_data("fornecedores"); cots = get_data("cotacoes")
+        prods, forns, cots = get_varios("produtos", "fornecedores", "cotacoes")
         c1, c2 = st.columns([1,2])
         with c1:
             with st.form("prc"):
                 p = st.selectbox("Item", [x['nome'] for x in prods]); f = st.selectbox("Forn.", [x['nome'] for x in forns]); v = st.number_input("Preço", 0.01)
                 if st.form_submit_button("Salvar"):
                     pid = next(x['id'] for x in prods if x['nome']==p); fid = next(x['id'] for x in forns if x['nome']==f)
-                    requests.post(f"{API_URL}/cotacoes/", json={"produto_id":pid,"fornecedor_id":fid,"preco":v}); st.success("OK"); st.rerun()
+                    api.post("cotacoes/", json={"produto_id":pid,"fornecedor_id":fid,"preco":v}); st.success("OK"); st.rerun()
         with c2:
             if cots:
                 p_map = {x['id']:x['nome'] for x in prods}; f_map = {x['id']:x['nome'] for x in forns}
@@ -313,25 +349,25 @@ def sistema_erp():
                     nm = st.text_input("Nome"); pf = st.selectbox("Produto Final", [x['nome'] for x in prods if x['tipo']=='Produto Acabado'])
                     if st.form_submit_button("Criar"): 
                         pid = next(x['id'] for x in prods if x['nome']==pf)
-                        requests.post(f"{API_URL}/formulas/", json={"nome":nm,"produto_final_id":pid}); st.success("Criado")
+                        api.post("formulas/", json={"nome":nm,"produto_final_id":pid}); st.success("Criado")
                 st.markdown("---"); st.write("Adicionar Ingrediente"); forms = get_data("formulas")
                 if forms:
                     f_map = {x['nome']:x['id'] for x in forms}; sel_f = st.selectbox("Fórmula", list(f_map.keys()))
                     st.info("Ingredientes Atuais:")
-                    res_atual = requests.post(f"{API_URL}/planejamento/calcular/?formula_id={f_map[sel_f]}&quantidade_producao=1").json()
+                    res_atual = api.post(f"planejamento/calcular/?formula_id={f_map[sel_f]}&quantidade_producao=1", invalidar=False).json()
                     if res_atual.get('materiais'): st.dataframe(pd.DataFrame(res_atual['materiais'])[['ingrediente', 'necessario']], use_container_width=True, hide_index=True)
                     else: st.text("Vazia")
                     with st.form("ni"):
                         ing = st.selectbox("Ingrediente", [x['nome'] for x in prods if x['tipo']=='Materia Prima']); q = st.number_input("Qtd", format="%.3f")
                         if st.form_submit_button("Adicionar"):
                             iid = next(x['id'] for x in prods if x['nome']==ing)
-                            requests.post(f"{API_URL}/formulas/itens/", json={"formula_id":f_map[sel_f],"materia_prima_id":iid,"quantidade":q}); st.success("OK"); st.rerun()
+                            api.post("formulas/itens/", json={"formula_id":f_map[sel_f],"materia_prima_id":iid,"quantidade":q}); st.success("OK"); st.rerun()
         with t2:
             forms = get_data("formulas")
             if forms:
                 for f in forms:
                     with st.expander(f"📄 {f['nome']}", expanded=False):
-                        res = requests.post(f"{API_URL}/planejamento/calcular/?formula_id={f['id']}&quantidade_producao=1").json()
+                        res = api.post(f"planejamento/calcular/?formula_id={f['id']}&quantidade_producao=1", invalidar=False).json()
                         c1, c2 = st.columns([1.5, 1])
                         with c1:
                             if res.get('materiais'):
@@ -339,12 +375,12 @@ def sistema_erp():
                                     for item in res['materiais']:
                                         cc1, cc2, cc3, cc4, cc5 = st.columns([2.5, 0.8, 0.8, 0.8, 0.5], vertical_alignment="center")
                                         cc1.write(item['ingrediente']); cc2.write(f"{item['necessario']} {item['unidade']}"); cc3.write(f"R$ {item['custo_unit']:.2f}"); cc4.write(f"R$ {item['subtotal']:.4f}")
-                                        if cc5.button("🗑️", key=f"del_{item['id']}"): requests.delete(f"{API_URL}/formulas/itens/{item['id']}"); st.rerun()
+                                        if cc5.button("🗑️", key=f"del_{item['id']}"): api.delete(f"formulas/itens/{item['id']}"); st.rerun()
                                 except TypeError:
                                     for item in res['materiais']:
                                         cc1, cc2, cc3, cc4, cc5 = st.columns([2.5, 0.8, 0.8, 0.8, 0.5])
                                         cc1.write(item['ingrediente']); cc2.write(f"{item['necessario']} {item['unidade']}"); cc3.write(f"R$ {item['custo_unit']:.2f}"); cc4.write(f"R$ {item['subtotal']:.4f}")
-                                        if cc5.button("🗑️", key=f"del_{item['id']}"): requests.delete(f"{API_URL}/formulas/itens/{item['id']}"); st.rerun()
+                                        if cc5.button("🗑️", key=f"del_{item['id']}"): api.delete(f"formulas/itens/{item['id']}"); st.rerun()
                             else: st.warning("Sem ingredientes")
                         with c2:
                             st.metric("Custo Ind.", f"R$ {res.get('custo_total', 0.0):.2f}")
@@ -354,20 +390,20 @@ def sistema_erp():
             f = st.selectbox("Fórmula", [x['nome'] for x in forms]); q = st.number_input("Qtd", 100.0)
             if st.button("Calcular"):
                 fid = next(x['id'] for x in forms if x['nome']==f)
-                res = requests.post(f"{API_URL}/planejamento/calcular/?formula_id={fid}&quantidade_producao={q}").json()
-                st.dataframe(pd.DataFrame(res['materiais']), use_container_width=True)
+                res = api.post(f"planejamento/calcular/?formula_id={fid}&quantidade_producao={q}", invalidar=False).json()
+                st.dataframe(pd.DataFrame(res.get('explosao') or res.get('materiais', [])), use_container_width=True)
     elif page_id == "comp":
         header("Compras & Recebimento")
         c1, c2 = st.columns([1,1]); 
         with c1:
             st.markdown("#### 1. Novo Pedido de Compra")
-            prods = get_data("produtos"); forns = get_data("fornecedores")
+            prods, forns = get_varios("produtos", "fornecedores")
             with st.form("nc"):
                 p = st.selectbox("Produto", [x['nome'] for x in prods]); f = st.selectbox("Fornecedor", [x['nome'] for x in forns])
                 q = st.number_input("Qtd"); v = st.number_input("Valor Unit.")
                 if st.form_submit_button("Gerar Pedido"):
                     pid = next(x['id'] for x in prods if x['nome']==p); fid = next(x['id'] for x in forns if x['nome']==f)
-                    requests.post(f"{API_URL}/compras/", json={"produto_id":pid,"fornecedor_id":fid,"quantidade":q,"valor_unitario":v}); st.success("Enviado"); st.rerun()
+                    api.post("compras/", json={"produto_id":pid,"fornecedor_id":fid,"quantidade":q,"valor_unitario":v}); st.success("Enviado"); st.rerun()
         with c2:
             st.markdown("#### 2. Dar Entrada (Nota Fiscal)")
             peds = get_data("compras"); pendentes = [p for p in peds if p['status'] == 'Pendente']
@@ -382,7 +418,7 @@ def sistema_erp():
                         validade = c_validade.date_input("Validade", value=None)
                         if st.form_submit_button("Confirmar Entrada"):
                             if lote and validade:
-                                res = requests.post(f"{API_URL}/compras/{pedido_real['id']}/processar/", json={"lote": lote, "validade": str(validade)})
+                                res = api.post(f"compras/{pedido_real['id']}/processar/", json={"lote": lote, "validade": str(validade)})
                                 if res.status_code == 200: st.balloons(); st.success("Estoque Atualizado!"); time.sleep(1); st.rerun()
                             else: st.warning("Preencha Lote e Validade.")
             else: st.info("Nenhum pedido pendente.")
@@ -390,7 +426,7 @@ def sistema_erp():
             for pd_ in peds[:5]:
                 k1, k3 = st.columns([4,1]); status_icon = "🟢" if pd_['status'] == "Recebido" else "🟠"
                 k1.write(f"{status_icon} **Pedido #{pd_['id']}** | Qtd: {pd_['quantidade']}")
-                pdf_bytes = requests.get(f"{API_URL}/compras/{pd_['id']}/pdf/").content
+                pdf_bytes = api.get_bruto(f"compras/{pd_['id']}/pdf/").content
                 k3.download_button("📄", pdf_bytes, file_name=f"pedido_{pd_['id']}.pdf", key=f"btn_ped_{pd_['id']}")
     elif page_id == "vend":
         header("Vendas (Administrativo)")
@@ -398,12 +434,12 @@ def sistema_erp():
         with c1:
             st.markdown("#### Nova Venda")
             with st.form("nv"):
-                clis = get_data("clientes"); prods = get_data("produtos")
+                clis, prods = get_varios("clientes", "produtos")
                 c = st.selectbox("Cliente", [x['nome'] for x in clis]); p = st.selectbox("Produto", [x['nome'] for x in prods if x['tipo']=='Produto Acabado'])
                 q = st.number_input("Qtd", 1.0); v = st.number_input("Total R$", 1.0)
                 if st.form_submit_button("Registrar Venda"):
                     cid = next(x['id'] for x in clis if x['nome']==c); pid = next(x['id'] for x in prods if x['nome']==p)
-                    r = requests.post(f"{API_URL}/vendas/", json={"cliente_id":cid,"produto_id":pid,"quantidade":q,"valor_total":v})
+                    r = api.post("vendas/", json={"cliente_id":cid,"produto_id":pid,"quantidade":q,"valor_total":v})
                     if r.status_code == 200: st.success("Venda OK"); st.rerun()
                     else: st.error("Sem Estoque")
         with c2:
@@ -413,7 +449,7 @@ def sistema_erp():
                 for ven in vendas:
                     r1, r2, r3 = st.columns([1, 2, 1])
                     r1.write(f"#{ven['id']}"); r2.write(f"R$ {ven['valor_total']:.2f}")
-                    pdf_bytes = requests.get(f"{API_URL}/vendas/{ven['id']}/pdf/").content
+                    pdf_bytes = api.get_bruto(f"vendas/{ven['id']}/pdf/").content
                     r3.download_button("📄 Baixar", pdf_bytes, key=f"btn_venda_{ven['id']}", file_name=f"recibo_{ven['id']}.pdf")
     elif page_id == "cfg":
         header("Configurações")
@@ -423,26 +459,31 @@ def sistema_erp():
             with c1:
                 st.markdown("##### 1. Backup de Segurança")
                 st.info("Baixe uma cópia dos seus dados.")
-                backup_data = requests.get(f"{API_URL}/sistema/backup/")
-                if backup_data.status_code == 200: st.download_button("⬇️ BAIXAR BACKUP", backup_data.content, f"backup_decant_{datetime.now().strftime('%Y%m%d')}.db", "application/octet-stream", use_container_width=True)
+                if st.button("📦 GERAR BACKUP", use_container_width=True):
+                    backup_data = autenticada(api.get_bruto("sistema/backup/", headers=auth()))
+                    if backup_data.status_code == 200: st.download_button("⬇️ BAIXAR BACKUP", backup_data.content, f"backup_decant_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db.gz", "application/gzip", use_container_width=True)
+                    elif backup_data.status_code == 403: st.error("Área restrita ao cargo Diretor.")
+                    else: st.error("Falha ao gerar o backup.")
             with c2:
-                if st.session_state['usuario'] == "admin": 
+                if st.session_state['cargo'] == "Diretor":
                     st.markdown("##### 2. Zerar Sistema (Modo Produção)")
                     st.warning("⚠️ Cuidado! Isso apaga TODOS os dados.")
                     if st.button("🗑️ APAGAR DADOS DE TESTE", type="primary", use_container_width=True):
-                        res = requests.delete(f"{API_URL}/sistema/resetar_dados/")
+                        res = autenticada(api.delete("sistema/resetar_dados/", headers=auth()))
                         if res.status_code == 200: st.balloons(); st.success("Sistema Limpo!"); time.sleep(2); st.rerun()
                 else: st.info("Área restrita.")
         with t2:
-            st.markdown("##### Criar Novo Usuário")
-            with st.form("new_user"):
-                u = st.text_input("Usuário"); s = st.text_input("Senha", type="password"); c = st.selectbox("Cargo", ["Diretor", "Gerente de Produção", "Assistente Administrativo"])
-                if st.form_submit_button("Criar Acesso"):
-                    res = requests.post(f"{API_URL}/usuarios/", json={"username":u, "senha":s, "cargo":c})
-                    if res.status_code == 200: st.success(f"Usuário {u} criado!"); st.rerun()
-                    else: st.error("Erro ao criar.")
-            st.divider(); st.markdown("**Usuários Ativos**"); us = get_data("usuarios")
-            if us: st.dataframe(pd.DataFrame(us)[['id', 'username', 'cargo']], use_container_width=True)
+            if st.session_state['cargo'] != "Diretor": st.info("Área restrita.")
+            else:
+                st.markdown("##### Criar Novo Usuário")
+                with st.form("new_user"):
+                    u = st.text_input("Usuário"); s = st.text_input("Senha", type="password"); c = st.selectbox("Cargo", ["Diretor", "Gerente de Produção", "Assistente Administrativo"])
+                    if st.form_submit_button("Criar Acesso"):
+                        res = autenticada(api.post("usuarios/", json={"username":u, "senha":s, "cargo":c}, headers=auth()))
+                        if res.status_code == 200: st.success(f"Usuário {u} criado!"); st.rerun()
+                        else: st.error("Erro ao criar.")
+                st.divider(); st.markdown("**Usuários Ativos**"); res = autenticada(api.get_bruto("usuarios/", headers=auth())); us = res.json() if res.status_code == 200 else []
+                if us: st.dataframe(pd.DataFrame(us)[['id', 'username', 'cargo']], use_container_width=True)
 
 if st.session_state['logado']: sistema_erp()
 else: tela_login()
\ No newline at end of file
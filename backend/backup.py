@@ -0,0 +1,165 @@
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import weakref
+import zlib
+from datetime import datetime
+
+# --- BACKUP ONLINE (API de backup do sqlite3) ---
+# A cópia é feita em passos de N páginas: entre um passo e outro o lock de leitura
+# é solto e os escritores seguem (no WAL nem chegam a esperar). Se alguém escrever
+# no meio, o sqlite recomeça a cópia sozinho, então o snapshot é sempre consistente.
+# Nunca se copia o arquivo .db cru: uma escrita no meio do download corrompe a cópia.
+PASTA_PADRAO = os.getenv("BACKUP_DIR", "backups")
+RETENCAO_PADRAO = int(os.getenv("BACKUP_RETENCAO", "14"))  # quantos backups rotativos manter
+PAGINAS_POR_PASSO = int(os.getenv("BACKUP_PAGINAS_POR_PASSO", "1024"))  # 4 MB com página de 4 KB
+PAUSA_ENTRE_PASSOS = 0.005
+PEDACO = 1024 * 1024
+PREFIXO = "decant_"
+PREFIXO_SEGURANCA = "antes_restauracao_"  # cópia do banco feita antes de cada restauração
+PREFIXOS = (PREFIXO, PREFIXO_SEGURANCA)  # cada tipo tem sua própria retenção
+
+def snapshot(banco: str, destino: str, paginas: int = PAGINAS_POR_PASSO, pausa: float = PAUSA_ENTRE_PASSOS):
+    origem = sqlite3.connect(f"file:{banco}?mode=ro", uri=True)
+    copia = sqlite3.connect(destino)
+    try:
+        origem.backup(copia, pages=paginas, progress=lambda *_: time.sleep(pausa))
+        copia.execute("PRAGMA journal_mode=DELETE")  # arquivo único, sem depender de -wal/-shm
+    finally:
+        copia.close(); origem.close()
+
+def descompactar(arquivo: str, destino: str):
+    with gzip.open(arquivo, "rb") as ent, open(destino, "wb") as sai: shutil.copyfileobj(ent, sai, PEDACO)
+
+def _remover(caminho: str):
+    try: os.remove(caminho)
+    except FileNotFoundError: pass
+
+def integridade(banco: str) -> str:
+    con = sqlite3.connect(f"file:{banco}?mode=ro", uri=True)
+    try: return "; ".join(linha[0] for linha in con.execute("PRAGMA integrity_check"))
+    finally: con.close()
+
+class Backups:
+    def __init__(self, banco: str, pasta: str = PASTA_PADRAO, retencao: int = RETENCAO_PADRAO):
+        self.banco = banco
+        self.pasta = pasta
+        self.retencao = retencao
+
+    def _temporario(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        fd, caminho = tempfile.mkstemp(suffix=".db", dir=self.pasta); os.close(fd)
+        return caminho
+
+    def nome(self, prefixo: str = PREFIXO) -> str:
+        return f"{prefixo}{datetime.now().strftime('%Y%m%d_%H%M%S')}.db.gz"
+
+    def stream(self):
+        # Download: snapshot num temporário e gzip incremental enquanto o cliente consome
+        temp = self._temporario()
+        try: snapshot(self.banco, temp)
+        except Exception:
+            os.remove(temp); raise
+        def gerar():
+            gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+            try:
+                with open(temp, "rb") as f:
+                    for bloco in iter(lambda: f.read(PEDACO), b""):
+                        pedaco = gz.compress(bloco)
+                        if pedaco: yield pedaco
+                yield gz.flush()
+            finally:
+                _remover(temp)
+        gerador = gerar()
+        # Cliente que cai antes do primeiro pedaço: o gerador nem começa e o finally não roda.
+        # O temporário sai quando o gerador é coletado, em qualquer caminho.
+        weakref.finalize(gerador, _remover, temp)
+        return gerador
+
+    def criar(self, prefixo: str = PREFIXO, rotacionar: bool = True) -> str:
+        temp = self._temporario()
+        final = os.path.join(self.pasta, self.nome(prefixo))
+        try:
+            snapshot(self.banco, temp)
+            with open(temp, "rb") as ent, gzip.open(final + ".parcial", "wb", compresslevel=6) as sai: shutil.copyfileobj(ent, sai, PEDACO)
+            os.replace(final + ".parcial", final)  # nunca deixa um .gz pela metade com nome de backup
+        finally:
+            os.remove(temp)
+            if os.path.exists(final + ".parcial"): os.remove(final + ".parcial")
+        if rotacionar: self.rotacionar()
+        return final
+
+    def listar(self, prefixo: str = None):
+        # Rotativos e cópias de segurança (mais recentes primeiro); prefixo filtra um tipo só
+        if not os.path.isdir(self.pasta): return []
+        prefixos = (prefixo,) if prefixo else PREFIXOS
+        nomes = sorted((n for n in os.listdir(self.pasta) if n.startswith(prefixos) and n.endswith(".db.gz")), reverse=True)
+        return [{"arquivo": n, "bytes": os.path.getsize(os.path.join(self.pasta, n))} for n in nomes]
+
+    def rotacionar(self):
+        # O nome carrega o timestamp: ordem alfabética = ordem cronológica (por prefixo)
+        removidos = [b["arquivo"] for prefixo in PREFIXOS for b in self.listar(prefixo)[self.retencao:]]
+        for nome in removidos: os.remove(os.path.join(self.pasta, nome))
+        return removidos
+
+    def _resolver(self, arquivo: str = None) -> str:
+        if arquivo is None:
+            existentes = self.listar(PREFIXO)
+            if not existentes: raise FileNotFoundError(f"Nenhum backup em {self.pasta}")
+            arquivo = existentes[0]["arquivo"]
+        return arquivo if os.path.exists(arquivo) else os.path.join(self.pasta, arquivo)
+
+    def verificar(self, arquivo: str = None) -> dict:
+        caminho = self._resolver(arquivo); temp = self._temporario()
+        try:
+            try: descompactar(caminho, temp)
+            except (OSError, EOFError, zlib.error) as e: return {"arquivo": caminho, "ok": False, "detalhe": f"gzip inválido: {e}"}
+            try: resultado = integridade(temp)
+            except sqlite3.DatabaseError as e: return {"arquivo": caminho, "ok": False, "detalhe": str(e)}
+            return {"arquivo": caminho, "ok": resultado == "ok", "detalhe": resultado}
+        finally:
+            os.remove(temp)
+
+    def restaurar(self, arquivo: str = None) -> dict:
+        # Verifica antes, guarda o banco atual e copia de volta pela mesma API de backup
+        # (as conexões abertas enxergam a troca de forma atômica). Pare a API antes.
+        caminho = self._resolver(arquivo)
+        status = self.verificar(caminho)
+        if not status["ok"]: raise ValueError(f"Backup inválido ({caminho}): {status['detalhe']}")
+        anterior = self.criar(prefixo=PREFIXO_SEGURANCA, rotacionar=False) if os.path.exists(self.banco) else None
+        temp = self._temporario()
+        try:
+            descompactar(caminho, temp)
+            origem = sqlite3.connect(temp); destino = sqlite3.connect(self.banco)
+            try: origem.backup(destino)
+            finally: destino.close(); origem.close()
+        finally:
+            os.remove(temp)
+        self.rotacionar()  # só depois de restaurar: o backup escolhido não some no meio
+        return {"restaurado": caminho, "copia_anterior": anterior}
+
+# Uso: python -m backend.backup [--banco arquivo.db] {criar,listar,verificar,restaurar} [arquivo]
+def main():
+    parser = argparse.ArgumentParser(description="Backup do banco do Decant ERP")
+    parser.add_argument("comando", choices=["criar", "listar", "verificar", "restaurar"])
+    parser.add_argument("arquivo", nargs="?", help="backup .db.gz (padrão: o mais recente)")
+    parser.add_argument("--banco", default=os.getenv("DB_ARQUIVO", "sistema_final.db"))
+    parser.add_argument("--pasta", default=PASTA_PADRAO)
+    parser.add_argument("--retencao", type=int, default=RETENCAO_PADRAO)
+    args = parser.parse_args()
+    b = Backups(args.banco, args.pasta, args.retencao)
+    if args.comando == "criar": print(b.criar())
+    elif args.comando == "listar":
+        for item in b.listar(): print(f"{item['arquivo']}  {item['bytes']} bytes")
+    elif args.comando == "verificar":
+        status = b.verificar(args.arquivo); print(f"{status['arquivo']}: {status['detalhe']}")
+        if not status["ok"]: raise SystemExit(1)
+    else:
+        res = b.restaurar(args.arquivo); print(f"restaurado de {res['restaurado']} (banco anterior em {res['copia_anterior']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+# --- CACHE DE PDFs (cupons, recibos, pedidos e OPs) ---
+# Chave = identidade do documento + hash do conteúdo das linhas de origem.
+# Se a venda/compra/OP mudar, o hash muda e a versão antiga é descartada.
+# Memória em LRU; o que sai da memória vai para uma pasta em disco (também limitada).
+PASTA_PADRAO = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "decant_pdf_cache"))
+
+def hash_conteudo(linhas) -> str:
+    return hashlib.sha256(json.dumps(linhas, default=str, sort_keys=True).encode()).hexdigest()
+
+class CachePDF:
+    def __init__(self, max_memoria_bytes=32 * 1024 * 1024, max_disco_bytes=256 * 1024 * 1024, pasta=PASTA_PADRAO):
+        self.max_memoria_bytes = max_memoria_bytes
+        self.max_disco_bytes = max_disco_bytes
+        self.pasta = pasta
+        self._memoria = OrderedDict() # chave -> bytes (ordem = uso)
+        self._bytes_memoria = 0
+        self._disco = OrderedDict() # chave -> tamanho do arquivo
+        self._bytes_disco = 0
+        self._versao = {} # identidade -> chave atual (só de chaves ainda em cache)
+        self._lock = Lock()
+        if self.pasta:
+            # Uma subpasta por processo: workers não apagam arquivos uns dos outros
+            os.makedirs(self.pasta, exist_ok=True)
+            self.pasta = tempfile.mkdtemp(prefix="pdf_", dir=self.pasta)
+            atexit.register(shutil.rmtree, self.pasta, True)
+
+    def _arquivo(self, chave):
+        return os.path.join(self.pasta, hashlib.sha1(chave.encode()).hexdigest() + ".pdf")
+
+    def _remover(self, chave):
+        dados = self._memoria.pop(chave, None)
+        if dados is not None: self._bytes_memoria -= len(dados)
+        tamanho = self._disco.pop(chave, None)
+        if tamanho is not None:
+            self._bytes_disco -= tamanho
+            try: os.remove(self._arquivo(chave))
+            except OSError: pass
+
+    def _esquecer(self, chave):
+        # A chave saiu do cache de vez: a identidade sai junto, senão o mapa cresce sem limite
+        identidade = chave.rsplit(":", 1)[0]
+        if self._versao.get(identidade) == chave: del self._versao[identidade]
+
+    def _guardar_memoria(self, chave, dados):
+        self._memoria[chave] = dados; self._memoria.move_to_end(chave)
+        self._bytes_memoria += len(dados)
+        while self._bytes_memoria > self.max_memoria_bytes and len(self._memoria) > 1:
+            antiga, conteudo = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(conteudo)
+            self._despejar_disco(antiga, conteudo)
+
+    def _despejar_disco(self, chave, dados):
+        if chave in self._disco: return
+        if not self.pasta: self._esquecer(chave); return
+        try:
+            with open(self._arquivo(chave), "wb") as f: f.write(dados)
+        except OSError: self._esquecer(chave); return
+        self._disco[chave] = len(dados); self._bytes_disco += len(dados)
+        while self._bytes_disco > self.max_disco_bytes and self._disco:
+            antiga, tamanho = self._disco.popitem(last=False)
+            self._bytes_disco -= tamanho
+            self._esquecer(antiga)
+            try: os.remove(self._arquivo(antiga))
+            except OSError: pass
+
+    def obter(self, identidade: str, linhas, gerar):
+        # gerar() só roda em cache miss
+        chave = f"{identidade}:{hash_conteudo(linhas)}"
+        with self._lock:
+            anterior = self._versao.get(identidade)
+            if anterior and anterior != chave: self._remover(anterior)
+            self._versao[identidade] = chave
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                return self._memoria[chave]
+            if chave in self._disco:
+                try:
+                    with open(self._arquivo(chave), "rb") as f: dados = f.read()
+                    self._bytes_disco -= self._disco.pop(chave)
+                    os.remove(self._arquivo(chave))
+                    self._guardar_memoria(chave, dados)
+                    return dados
+                except OSError:
+                    self._remover(chave)
+        dados = gerar()
+        with self._lock:
+            if self._versao.get(identidade) == chave and chave not in self._memoria: self._guardar_memoria(chave, dados)
+        return dados
+
+    def limpar(self):
+        with self._lock:
+            for chave in list(self._memoria) + list(self._disco): self._remover(chave)
+            self._versao.clear()
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from backend.models import Cliente, ClienteUltimaCompra, Produto, Venda
+from backend.paginacao import codificar_cursor, decodificar_cursor
+from backend.ultima_compra import UltimaCompra
+
+DIAS_MINIMO = 25
+# Faixas de status em dias sem comprar (mínimo, máximo inclusivos); abaixo de DIAS_MINIMO é recente.
+# O filtro da API e o rótulo de cada linha saem daqui, então os limites são sempre os mesmos.
+FAIXAS_STATUS = {
+    "atencao": (DIAS_MINIMO, 45),
+    "critico": (46, 90),
+    "inativo": (91, None),
+}
+ROTULOS = {"atencao": "🟡 Atenção (25+ dias)", "critico": "🔴 Crítico (46+ dias)", "inativo": "💤 Inativo"}
+
+def classificar(dias: int) -> str:
+    for status, (minimo, maximo) in FAIXAS_STATUS.items():
+        if dias >= minimo and (maximo is None or dias <= maximo): return ROTULOS[status]
+    return "🟢 Recente"
+
+ultima_compra = UltimaCompra(ClienteUltimaCompra, Venda)
+registrar_compra = ultima_compra.registrar
+reconstruir_ultima_compra = ultima_compra.reconstruir
+
+def pagina_oportunidades(db: Session, status: Optional[str] = None, after: Optional[str] = None, limit: int = 200, agora: Optional[datetime] = None):
+    agora = agora or datetime.utcnow()
+    dias_min, dias_max = FAIXAS_STATUS[status] if status else (DIAS_MINIMO, None)
+    # "dias sem comprar" vira um intervalo sobre data_ultima_compra (índice)
+    q = db.query(ClienteUltimaCompra.cliente_id, ClienteUltimaCompra.data_ultima_compra, Cliente.nome, Cliente.telefone, Produto.nome.label("produto")).join(Cliente, Cliente.id == ClienteUltimaCompra.cliente_id).join(Produto, Produto.id == ClienteUltimaCompra.produto_id)
+    q = q.filter(ClienteUltimaCompra.data_ultima_compra <= agora - timedelta(days=dias_min))
+    if dias_max is not None: q = q.filter(ClienteUltimaCompra.data_ultima_compra > agora - timedelta(days=dias_max + 1))
+    if after:
+        data, id = decodificar_cursor(after)
+        q = q.filter(tuple_(ClienteUltimaCompra.data_ultima_compra, ClienteUltimaCompra.cliente_id) < tuple_(data, id))
+    linhas = q.order_by(ClienteUltimaCompra.data_ultima_compra.desc(), ClienteUltimaCompra.cliente_id.desc()).limit(limit).all()
+    proximo = codificar_cursor(linhas[-1].data_ultima_compra, linhas[-1].cliente_id) if len(linhas) == limit else None
+    res = []
+    for l in linhas:
+        dias = (agora - l.data_ultima_compra).days
+        res.append({"Cliente": l.nome, "Telefone": l.telefone, "Último Produto": l.produto, "Data": l.data_ultima_compra.strftime("%d/%m/%Y"), "Dias sem Comprar": dias, "Status": classificar(dias)})
+    return res, proximo
@@ -0,0 +1,43 @@
+from datetime import date, datetime, time, timedelta
+from threading import Lock
+from typing import Optional
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from backend.models import Produto, Venda
+
+# --- CACHE ---
+# Resultado por (período, limites); vale enquanto a assinatura de vendas não mudar
+_cache = {}
+_cache_lock = Lock()
+CACHE_MAX = 64
+
+def assinatura_vendas(db: Session):
+    # max(id) pega vendas novas; count(*) pega exclusões (ex.: reset de dados)
+    return tuple(db.query(func.max(Venda.id), func.count(Venda.id)).one())
+
+def calcular_curva_abc(db: Session, inicio: Optional[date] = None, fim: Optional[date] = None, limite_a: float = 80.0, limite_b: float = 95.0):
+    chave = (inicio, fim, limite_a, limite_b)
+    assinatura = assinatura_vendas(db)
+    with _cache_lock:
+        em_cache = _cache.get(chave)
+    if em_cache and em_cache[0] == assinatura: return em_cache[1]
+
+    receita = func.sum(Venda.valor_total).label("receita")
+    q = select(Venda.produto_id, receita).group_by(Venda.produto_id)
+    if inicio: q = q.where(Venda.data_venda >= datetime.combine(inicio, time.min))
+    if fim: q = q.where(Venda.data_venda < datetime.combine(fim + timedelta(days=1), time.min))
+    agg = q.subquery()
+
+    # Participação acumulada ANTES do produto: o primeiro item é sempre "A"
+    ordem = (agg.c.receita.desc(), agg.c.produto_id)
+    acumulado = func.sum(agg.c.receita).over(order_by=ordem)
+    total = func.sum(agg.c.receita).over()
+    anterior = (acumulado - agg.c.receita) * 100.0 / total
+    classe = case((anterior < limite_a, "A"), (anterior < limite_b, "B"), else_="C")
+    stmt = select(Produto.nome, agg.c.receita, (acumulado * 100.0 / total).label("acumulado"), classe.label("classe")).join(Produto, Produto.id == agg.c.produto_id).order_by(*ordem)
+
+    res = [{"Produto": l.nome, "Receita": l.receita, "Acumulado (%)": round(l.acumulado, 2), "Classe": l.classe} for l in db.execute(stmt)]
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX: _cache.clear()
+        _cache[chave] = (assinatura, res)
+    return res
@@ -1,13 +1,90 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # MUDAMOS O NOME AQUI PARA V3 (Versão 3)
 SQLALCHEMY_DATABASE_URL = "sqlite:///./sistema_final.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# --- CONFIGURAÇÃO DO SQLITE (sobrescrevível por variáveis de ambiente) ---
+CONFIG_PADRAO = {
+    "wal": os.getenv("DB_WAL", "1") == "1",
+    "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout_ms": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("DB_CACHE_SIZE", "-65536")), # negativo = KiB (64 MB)
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+}
+
+def caminho_arquivo(url: str) -> str:
+    # sqlite:///./arquivo.db -> ./arquivo.db
+    return url.split("sqlite:///", 1)[1]
+
+def url_somente_leitura(url: str) -> str:
+    # sqlite:///./arquivo.db -> sqlite:///file:./arquivo.db?mode=ro&uri=true
+    return f"sqlite:///file:{caminho_arquivo(url)}?mode=ro&uri=true"
+
+def criar_engine(url: str, somente_leitura: bool = False, **config):
+    cfg = {**CONFIG_PADRAO, **config}
+    if somente_leitura: url = url_somente_leitura(url)
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": cfg["busy_timeout_ms"] / 1000},
+        pool_size=cfg["pool_size"], max_overflow=cfg["max_overflow"], pool_timeout=cfg["pool_timeout"],
+    )
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(conexao, _registro):
+        cur = conexao.cursor()
+        if cfg["wal"] and not somente_leitura: cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={cfg['synchronous']}")
+        cur.execute(f"PRAGMA busy_timeout={cfg['busy_timeout_ms']}")
+        cur.execute(f"PRAGMA mmap_size={cfg['mmap_size']}")
+        cur.execute(f"PRAGMA cache_size={cfg['cache_size']}")
+        if somente_leitura: cur.execute("PRAGMA query_only=1")
+        cur.close()
+
+    return engine
+
+engine = criar_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+# Conexões somente leitura para relatórios: não disputam o lock de escrita do PDV
+engine_leitura = criar_engine(SQLALCHEMY_DATABASE_URL, somente_leitura=True)
+SessionLeitura = sessionmaker(autocommit=False, autoflush=False, bind=engine_leitura)
+
+Base = declarative_base()
+
+def garantir_indices(metadata, bind):
+    # create_all não cria índices novos em tabelas que já existem no banco
+    for tabela in metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(bind=bind, checkfirst=True)
+
+def garantir_colunas(metadata, bind):
+    # create_all também não adiciona colunas novas: ALTER TABLE para as que faltarem
+    insp = inspect(bind)
+    with bind.begin() as conn:
+        for tabela in metadata.sorted_tables:
+            if not insp.has_table(tabela.name): continue
+            existentes = {c["name"] for c in insp.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name not in existentes:
+                    conn.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {coluna.type.compile(dialect=bind.dialect)}'))
+
+def aplicar_migracoes(bind, migracoes):
+    # Migrações de dados em ordem; a posição na lista (1, 2, ...) é gravada em PRAGMA user_version
+    with bind.begin() as conn:
+        versao = conn.execute(text("PRAGMA user_version")).scalar()
+        for numero, migracao in enumerate(migracoes[versao:], start=versao + 1):
+            migracao(conn)
+            conn.execute(text(f"PRAGMA user_version = {numero}"))
+
+def normalizar_coluna_data(conn, tabela, coluna):
+    # String -> Date (o SQLAlchemy grava 'YYYY-MM-DD' no SQLite): converte DD/MM/YYYY, corta a hora
+    # e anula o que não for data, para a leitura como Date não quebrar
+    conn.execute(text(f"UPDATE {tabela} SET {coluna} = substr({coluna}, 7, 4) || '-' || substr({coluna}, 4, 2) || '-' || substr({coluna}, 1, 2) WHERE {coluna} LIKE '__/__/____'"))
+    conn.execute(text(f"UPDATE {tabela} SET {coluna} = substr({coluna}, 1, 10) WHERE length({coluna}) > 10"))
+    conn.execute(text(f"UPDATE {tabela} SET {coluna} = NULL WHERE {coluna} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"))
@@ -0,0 +1,47 @@
+from datetime import datetime
+from sqlalchemy import event, func, insert, select
+
+# --- DIÁRIO DE MOVIMENTAÇÕES (append-only, em buffer) ---
+# Os movimentos da transação ficam numa lista de tuplas na própria sessão e vão para o
+# banco num único INSERT executemany no commit, em vez de um objeto ORM (e um flush)
+# por movimento. Rollback descarta o buffer junto com o resto.
+class DiarioMovimentos:
+    def __init__(self, fabrica_sessao, modelo, colunas, coluna_data, delta=None, relogio=datetime.now):
+        # colunas: ordem dos valores passados a registrar(); coluna_data é preenchida aqui
+        # delta: expressão da quantidade com sinal (entrada +, saída -) usada nos saldos
+        self.modelo, self.tabela = modelo, modelo.__table__
+        self.colunas = tuple(colunas) + (coluna_data,)
+        self.data = getattr(modelo, coluna_data)
+        self.delta = delta if delta is not None else modelo.quantidade
+        self.relogio = relogio
+        self._chave = f"diario:{self.tabela.name}"
+        event.listen(fabrica_sessao, "before_commit", self._descarregar)
+        event.listen(fabrica_sessao, "after_transaction_end", self._descartar)
+
+    def registrar(self, db, *valores):
+        db.info.setdefault(self._chave, []).append(valores + (self.relogio(),))
+
+    def pendentes(self, db):
+        return len(db.info.get(self._chave, ()))
+
+    def _descarregar(self, session):
+        linhas = session.info.pop(self._chave, None)
+        if linhas: session.execute(insert(self.tabela), [dict(zip(self.colunas, l)) for l in linhas])
+
+    def _descartar(self, session, transacao):
+        # Fim da transação principal sem commit (rollback/close): o buffer vai junto
+        if transacao.parent is None: session.info.pop(self._chave, None)
+
+    # --- LEITURA ---
+    def saldos(self, db, produto_ids=None):
+        # Saldo atual por produto somando o diário (só o que já foi commitado)
+        q = db.query(self.modelo.produto_id, func.sum(self.delta)).group_by(self.modelo.produto_id)
+        if produto_ids is not None: q = q.filter(self.modelo.produto_id.in_(produto_ids))
+        return {pid: saldo or 0.0 for pid, saldo in q.all()}
+
+    def extrato(self, db, produto_id, limite=500):
+        # Últimos movimentos do produto com o saldo corrente após cada um (janela por data, id)
+        saldo = func.sum(self.delta).over(order_by=(self.data, self.modelo.id)).label("saldo")
+        sub = select(self.tabela, saldo).where(self.modelo.produto_id == produto_id).subquery()
+        linhas = db.execute(select(sub).order_by(sub.c[self.data.key].desc(), sub.c.id.desc()).limit(limite)).mappings().all()
+        return [dict(l) for l in linhas]
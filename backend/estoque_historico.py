@@ -0,0 +1,65 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import DateTime, and_, func, literal, select
+from sqlalchemy.dialects.sqlite import insert
+
+INICIO = datetime(1900, 1, 1)
+
+# --- ESTOQUE EM UMA DATA (checkpoints + movimentos) ---
+# Um checkpoint guarda o saldo de cada produto com os movimentos ANTERIORES à sua data
+# (1º dia de cada mês, 00:00). O estoque em D = checkpoint mais próximo <= D + movimentos
+# entre ele e D, lidos pelo índice (produto_id, data): nunca o razão inteiro.
+# Só produtos que se movimentaram no período ganham linha nova (checkpoints esparsos).
+# Pressupõe razão append-only com data = momento do registro (o diário de movimentos).
+def inicio_do_mes(d: datetime) -> datetime:
+    return datetime(d.year, d.month, 1)
+
+def proximo_mes(d: datetime) -> datetime:
+    return datetime(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+class HistoricoEstoque:
+    def __init__(self, movimento, coluna_data, delta, checkpoint, produto):
+        # movimento/checkpoint/produto: modelos; delta: quantidade com sinal (entrada +, saída -)
+        self.mov, self.data, self.delta = movimento, coluna_data, delta
+        self.cp, self.produto = checkpoint, produto
+
+    def _ultimo_checkpoint(self, ate: datetime, inclusivo: bool, produto_id: int = None):
+        # Último checkpoint de cada produto antes de "ate" (com saldo)
+        ult = select(self.cp.produto_id, func.max(self.cp.data).label("data")).where(self.cp.data <= ate if inclusivo else self.cp.data < ate)
+        if produto_id is not None: ult = ult.where(self.cp.produto_id == produto_id)
+        ult = ult.group_by(self.cp.produto_id).subquery()
+        return select(self.cp.produto_id, self.cp.data, self.cp.saldo).join(ult, and_(self.cp.produto_id == ult.c.produto_id, self.cp.data == ult.c.data)).subquery()
+
+    def gerar_checkpoint(self, db, em: datetime) -> int:
+        # Saldos em "em" a partir do checkpoint anterior + movimentos do intervalo (faixa no índice de data)
+        anterior = db.query(func.max(self.cp.data)).filter(self.cp.data < em).scalar()
+        if db.query(self.cp.produto_id).filter(self.cp.data == em).first(): return 0
+        base = self._ultimo_checkpoint(em, inclusivo=False)
+        periodo = select(self.mov.produto_id.label("produto_id"), func.sum(self.delta).label("delta")).where(self.data < em)
+        if anterior: periodo = periodo.where(self.data >= anterior)
+        periodo = periodo.group_by(self.mov.produto_id).subquery()
+        sel = select(periodo.c.produto_id, literal(em, DateTime), func.coalesce(base.c.saldo, 0.0) + periodo.c.delta).outerjoin(base, base.c.produto_id == periodo.c.produto_id).where(periodo.c.produto_id.is_not(None))
+        # Dois processos subindo juntos podem gerar o mesmo mês: o segundo não duplica nem quebra na PK
+        return db.execute(insert(self.cp).from_select(["produto_id", "data", "saldo"], sel).on_conflict_do_nothing()).rowcount
+
+    def gerar_pendentes(self, db, agora: datetime = None) -> int:
+        # Cria os checkpoints mensais que faltam até o início do mês corrente
+        ultimo = db.query(func.max(self.cp.data)).scalar()
+        primeiro = db.query(func.min(self.data)).scalar() if ultimo is None else None
+        if ultimo is None and primeiro is None: return 0
+        em = proximo_mes(ultimo) if ultimo else proximo_mes(inicio_do_mes(primeiro))
+        limite = inicio_do_mes(agora or datetime.now())
+        total = 0
+        while em <= limite:
+            total += self.gerar_checkpoint(db, em)
+            em = proximo_mes(em)
+        db.commit()
+        return total
+
+    def estoque_em(self, db, dia: date, produto_id: int = None):
+        # Saldo de cada produto no fim do dia "dia"
+        fim = datetime.combine(dia + timedelta(days=1), time.min)
+        base = self._ultimo_checkpoint(fim, inclusivo=True, produto_id=produto_id)
+        movs = select(func.coalesce(func.sum(self.delta), 0.0)).where(self.mov.produto_id == self.produto.id, self.data >= func.coalesce(base.c.data, literal(INICIO, DateTime)), self.data < fim).scalar_subquery()
+        q = select(self.produto.id, self.produto.nome, func.coalesce(base.c.saldo, 0.0) + movs).outerjoin(base, base.c.produto_id == self.produto.id).order_by(self.produto.id)
+        if produto_id is not None: q = q.where(self.produto.id == produto_id)
+        return [{"produto_id": pid, "produto": nome, "estoque": saldo} for pid, nome, saldo in db.execute(q).all()]
@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Optional
+import qrcode
+from fpdf import FPDF
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from backend.models import Formula, Lote, OrdemProducao, Produto
+
+MAX_ETIQUETAS = 2000
+MIN_PARA_PARALELO = 50 # abaixo disso o custo de despachar para o pool não compensa
+SOBREPOSICAO = 0.05 # mm
+# Pool de processos para os QR codes: desligado por padrão (0). Com ETIQUETAS_WORKERS > 0
+# o pedido com paralelo=True usa o pool; quem cria a app chama encerrar_pool() ao sair.
+WORKERS = int(os.getenv("ETIQUETAS_WORKERS", "0"))
+
+_pool = None
+_pool_lock = Lock()
+
+def obter_pool():
+    global _pool
+    if WORKERS <= 0: return None
+    with _pool_lock:
+        if _pool is None: _pool = ProcessPoolExecutor(max_workers=WORKERS)
+    return _pool
+
+def encerrar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None: _pool.shutdown(cancel_futures=True); _pool = None
+
+def carregar_etiquetas(db: Session, ids: Optional[list] = None, lote_inicio: Optional[str] = None, lote_fim: Optional[str] = None):
+    # OP + fórmula + produto + validade do lote numa consulta só, uma linha por OP
+    # (se houver mais de um lote com o mesmo código, vale o primeiro cadastrado).
+    # Mais de MAX_ETIQUETAS OPs: ValueError, nunca um PDF cortado sem aviso.
+    validade = select(Lote.validade).where(Lote.codigo == OrdemProducao.lote_codigo, Lote.produto_id == Produto.id).order_by(Lote.id).limit(1).scalar_subquery()
+    q = db.query(OrdemProducao.id, OrdemProducao.lote_codigo, Produto.nome, validade.label("validade")).join(Formula, Formula.id == OrdemProducao.formula_id).join(Produto, Produto.id == Formula.produto_final_id)
+    if ids: q = q.filter(OrdemProducao.id.in_(ids))
+    if lote_inicio: q = q.filter(OrdemProducao.lote_codigo >= lote_inicio)
+    if lote_fim: q = q.filter(OrdemProducao.lote_codigo <= lote_fim)
+    linhas = q.order_by(OrdemProducao.lote_codigo, OrdemProducao.id).limit(MAX_ETIQUETAS + 1).all()
+    if len(linhas) > MAX_ETIQUETAS: raise ValueError(f"Mais de {MAX_ETIQUETAS} etiquetas; restrinja os ids ou a faixa de lotes")
+    return [{"id": l.id, "lote": l.lote_codigo, "produto": l.nome, "validade": l.validade or "???"} for l in linhas]
+
+def texto_qr(e):
+    return f"PROD:{e['produto']}\nLOTE:{e['lote']}\nVAL:{e['validade']}\nID:{e['id']}"
+
+def matriz_qr(texto: str):
+    # Só a matriz de módulos: nada de PNG nem arquivo temporário
+    qr = qrcode.QRCode()
+    qr.add_data(texto); qr.make(fit=True)
+    return qr.get_matrix()
+
+def desenhar_qr(pdf: FPDF, matriz, x, y, lado):
+    # Cada sequência de módulos escuros numa linha vira um retângulo vetorial
+    m = lado / len(matriz)
+    for i, linha in enumerate(matriz):
+        j = 0
+        while j < len(linha):
+            if linha[j]:
+                k = j
+                while k < len(linha) and linha[k]: k += 1
+                # Leve sobreposição evita frestas brancas de antialiasing entre linhas
+                pdf.rect(x + j * m, y + i * m, (k - j) * m + SOBREPOSICAO, m + SOBREPOSICAO, 'F')
+                j = k
+            else: j += 1
+
+def gerar_pdf_etiquetas(etiquetas, paralelo: bool = False) -> bytes:
+    textos = [texto_qr(e) for e in etiquetas]
+    pool = obter_pool() if paralelo and len(textos) >= MIN_PARA_PARALELO else None
+    if pool: matrizes = list(pool.map(matriz_qr, textos, chunksize=32))
+    else: matrizes = [matriz_qr(t) for t in textos]
+    pdf = FPDF('L', 'mm', (60, 100)); pdf.set_auto_page_break(False)
+    for e, matriz in zip(etiquetas, matrizes):
+        pdf.add_page(); pdf.set_margins(2, 2, 2)
+        pdf.set_font("Arial", 'B', 10); pdf.cell(0, 5, "DECANT COSMETICS", 0, 1, 'C'); pdf.ln(2)
+        pdf.set_font("Arial", 'B', 8); pdf.multi_cell(60, 4, f"{e['produto']}"); pdf.ln(2)
+        pdf.set_font("Arial", '', 8); pdf.cell(20, 4, "Lote:", 0, 0); pdf.set_font("Arial", 'B', 8); pdf.cell(40, 4, f"{e['lote']}", 0, 1)
+        pdf.set_font("Arial", '', 8); pdf.cell(20, 4, "Validade:", 0, 0); pdf.set_font("Arial", 'B', 8); pdf.cell(40, 4, f"{e['validade']}", 0, 1)
+        pdf.set_fill_color(0, 0, 0); desenhar_qr(pdf, matriz, 65, 15, 30)
+    return pdf.output(dest='S').encode('latin-1')
@@ -0,0 +1,38 @@
+import csv
+import io
+import zlib
+
+# --- EXPORTAÇÃO CSV EM STREAMING ---
+# Lê em lotes (yield_per) e devolve pedaços de CSV (opcionalmente gzip) conforme
+# o cliente consome: a memória fica constante seja qual for o tamanho da tabela.
+LINHAS_POR_LOTE = 2000
+
+def _formatar(valor):
+    if valor is None: return ""
+    if hasattr(valor, "isoformat"): return valor.isoformat(sep=" ") if hasattr(valor, "hour") else valor.isoformat()
+    return valor
+
+def gerar_csv(fabrica_sessao, stmt, cabecalho, compactar: bool = False, lote: int = LINHAS_POR_LOTE):
+    # A sessão é aberta aqui dentro: vive enquanto o streaming durar, não o request
+    db = fabrica_sessao()
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compactar else None
+    buf = io.StringIO(); w = csv.writer(buf)
+    def esvaziar():
+        dados = buf.getvalue().encode("utf-8"); buf.seek(0); buf.truncate()
+        return gz.compress(dados) if gz else dados
+    try:
+        buf.write("\ufeff") # BOM: Excel abre os acentos corretamente
+        w.writerow(cabecalho)
+        res = db.execute(stmt.execution_options(yield_per=lote))
+        for particao in res.partitions():
+            w.writerows([[_formatar(v) for v in linha] for linha in particao])
+            pedaco = esvaziar()
+            if pedaco: yield pedaco
+        pedaco = esvaziar()
+        if gz: pedaco += gz.flush()
+        if pedaco: yield pedaco
+    finally:
+        db.close()
+
+def nome_arquivo(entidade: str, compactar: bool) -> str:
+    return f"{entidade}.csv.gz" if compactar else f"{entidade}.csv"
@@ -0,0 +1,50 @@
+from sqlalchemy import bindparam, literal_column, select, update
+from sqlalchemy.orm import Session
+from backend.models import Lote
+
+# O "0" precisa ir literal no SQL para o SQLite casar a consulta com o índice parcial ix_lotes_fefo
+COM_SALDO = Lote.quantidade_atual > literal_column("0")
+LOTES_POR_BUSCA = 16
+
+def _lotes(db: Session, produto_id: int):
+    # Lotes com validade na ordem do índice (sem sort); validade desconhecida (NULL) só no fim.
+    # Duas consultas em vez de ORDER BY validade IS NULL: assim a primeira continua lendo o
+    # ix_lotes_fefo em ordem e para cedo.
+    base = select(Lote.id, Lote.quantidade_atual).where(Lote.produto_id == produto_id, COM_SALDO)
+    for q in (base.where(Lote.validade.is_not(None)).order_by(Lote.validade.asc(), Lote.id.asc()), base.where(Lote.validade.is_(None)).order_by(Lote.id.asc())):
+        res = db.execute(q.execution_options(yield_per=LOTES_POR_BUSCA))
+        try: yield from res
+        finally: res.close()
+
+def _planejar(db: Session, produto_id: int, quantidade: float):
+    # Percorre os lotes por validade e para de buscar assim que a quantidade está coberta
+    alocacoes = []; restante = quantidade
+    lotes = _lotes(db, produto_id)
+    try:
+        for lote_id, saldo in lotes:
+            if restante <= 0: break
+            usar = min(saldo, restante)
+            alocacoes.append((lote_id, usar)); restante -= usar
+    finally:
+        lotes.close()
+    return alocacoes
+
+def _aplicar(db: Session, alocacoes):
+    if not alocacoes: return
+    stmt = update(Lote).where(Lote.id == bindparam("lote_id")).values(quantidade_atual=Lote.quantidade_atual - bindparam("qtd"))
+    db.connection().execute(stmt, [{"lote_id": lote_id, "qtd": qtd} for lote_id, qtd in alocacoes])
+
+def alocar_fefo(db: Session, produto_id: int, quantidade: float):
+    # Consome os lotes que vencem primeiro; devolve [(lote_id, qtd)]
+    alocacoes = _planejar(db, produto_id, quantidade)
+    _aplicar(db, alocacoes)
+    return alocacoes
+
+def alocar_fefo_varios(db: Session, quantidades: dict):
+    # Forma em lote: planeja todos os produtos e grava as baixas num único executemany
+    por_produto = {produto_id: _planejar(db, produto_id, qtd) for produto_id, qtd in quantidades.items()}
+    _aplicar(db, [a for alocacoes in por_produto.values() for a in alocacoes])
+    return por_produto
+
+def alocacoes_json(por_produto: dict):
+    return {produto_id: [{"lote_id": lote_id, "quantidade": qtd} for lote_id, qtd in alocacoes] for produto_id, alocacoes in por_produto.items()}
@@ -0,0 +1,49 @@
+from collections import defaultdict
+from datetime import date, datetime
+from sqlalchemy import String, cast, extract, func, literal, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from backend.models import Lancamento, Movimentacao, PedidoCompra, ResumoFinanceiroMensal, Venda
+
+MESES = {1:"Jan", 2:"Fev", 3:"Mar", 4:"Abr", 5:"Mai", 6:"Jun", 7:"Jul", 8:"Ago", 9:"Set", 10:"Out", 11:"Nov", 12:"Dez"}
+
+def acumular(db: Session, data: date, tipo: str, valor: float):
+    # Upsert atômico: soma no balde (ano, mês, tipo) dentro da transação corrente
+    if not valor: return
+    t = ResumoFinanceiroMensal.__table__
+    stmt = insert(t).values(ano=data.year, mes=data.month, tipo=tipo, valor=valor)
+    db.execute(stmt.on_conflict_do_update(index_elements=[t.c.ano, t.c.mes, t.c.tipo], set_={"valor": t.c.valor + stmt.excluded.valor}))
+
+def acumular_lancamento(db: Session, l: Lancamento, sinal: int = 1):
+    # Só lançamentos pagos entram no resumo, no mês do pagamento
+    if l.pago and l.data_pagamento and l.tipo in ("Receita", "Despesa"):
+        acumular(db, l.data_pagamento, l.tipo.lower(), sinal * l.valor)
+
+def reconstruir_resumo_mensal(db: Session):
+    # Pedidos recebidos antes da coluna data_recebimento: usa a data da entrada no Kardex
+    data_mov = select(func.min(Movimentacao.data)).where(Movimentacao.origem == literal("Compra #") + cast(PedidoCompra.id, String)).scalar_subquery()
+    db.execute(update(PedidoCompra).where(PedidoCompra.status == "Recebido", PedidoCompra.data_recebimento.is_(None)).values(data_recebimento=func.coalesce(data_mov, datetime.utcnow())))
+
+    db.query(ResumoFinanceiroMensal).delete()
+    colunas = ["ano", "mes", "tipo", "valor"]
+    fontes = [
+        (Venda.data_venda, literal("venda"), Venda.valor_total, []),
+        (PedidoCompra.data_recebimento, literal("compra"), PedidoCompra.quantidade * PedidoCompra.valor_unitario, [PedidoCompra.status == "Recebido"]),
+        (Lancamento.data_pagamento, func.lower(Lancamento.tipo), Lancamento.valor, [Lancamento.pago == True, Lancamento.tipo.in_(["Receita", "Despesa"])]),
+    ]
+    for data, tipo, valor, filtros in fontes:
+        ano, mes = extract("year", data), extract("month", data)
+        q = select(ano, mes, tipo, func.sum(valor)).where(data.isnot(None), *filtros).group_by(ano, mes, tipo)
+        db.execute(insert(ResumoFinanceiroMensal).from_select(colunas, q))
+    db.commit()
+
+def resumo_dashboard(db: Session):
+    tot = defaultdict(float); saldo = defaultdict(float)
+    for r in db.query(ResumoFinanceiroMensal).all():
+        tot[r.tipo] += r.valor
+        if r.tipo == "venda": saldo[(r.ano, r.mes)] += r.valor
+        elif r.tipo == "despesa": saldo[(r.ano, r.mes)] -= r.valor
+    receita_total = tot["venda"] + tot["receita"]; custo_total = tot["compra"] + tot["despesa"]; lucro_liquido = receita_total - custo_total
+    margem = (lucro_liquido / receita_total * 100) if receita_total > 0 else 0
+    graf = [{"Mês": f"{MESES[m]}/{a}", "Valor": v, "Tipo": "Saldo"} for (a, m), v in sorted(saldo.items()) if v != 0]
+    return {"receita": receita_total, "despesas": custo_total, "lucro": lucro_liquido, "margem": margem, "grafico": graf}
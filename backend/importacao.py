@@ -0,0 +1,104 @@
+import codecs
+import csv
+import json
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+# --- IMPORTAÇÃO EM MASSA (CSV / JSON-lines em streaming) ---
+# O corpo é lido conforme chega; a cada LINHAS_POR_LOTE registros o lote é validado
+# com o mesmo schema do POST unitário e gravado por `gravar` (executemany) numa
+# transação própria. Linhas inválidas viram erro com o número da linha no arquivo,
+# as válidas do mesmo lote seguem.
+LINHAS_POR_LOTE = 5000
+MAX_ERROS = 1000  # erros detalhados na resposta; o total vem em "rejeitadas"
+
+async def _linhas(corpo):
+    # bytes em pedaços -> linhas de texto (utf-8, com ou sem BOM)
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    resto = ""
+    async for bloco in corpo:
+        partes = (resto + decodificador.decode(bloco)).split("\n")
+        resto = partes.pop()
+        for parte in partes: yield parte.rstrip("\r")
+    resto += decodificador.decode(b"", final=True)
+    if resto.strip(): yield resto.rstrip("\r")
+
+async def _registros(corpo, formato):
+    # CSV: junta linhas físicas até fechar as aspas (campo entre aspas pode ter quebra de linha).
+    # JSON-lines: uma linha, um registro (quebras dentro de strings vêm escapadas)
+    numero, inicio, pendente = 0, 0, None
+    async for linha in _linhas(corpo):
+        numero += 1
+        if pendente is None: pendente, inicio = linha, numero
+        else: pendente += "\n" + linha
+        if formato != "csv" or pendente.count('"') % 2 == 0:
+            if pendente.strip(): yield inicio, pendente
+            pendente = None
+    if pendente is not None: yield inicio, pendente
+
+def _csv(cabecalho, registros):
+    linhas = csv.reader([texto for _, texto in registros])
+    for (numero, _), valores in zip(registros, linhas):
+        if len(valores) != len(cabecalho): yield numero, f"esperadas {len(cabecalho)} colunas, vieram {len(valores)}"
+        else: yield numero, {c: v for c, v in zip(cabecalho, valores) if v != ""}  # vazio = usa o padrão do schema
+
+def _jsonl(registros):
+    for numero, texto in registros:
+        try: dados = json.loads(texto)
+        except ValueError as e: yield numero, f"JSON inválido: {e}"; continue
+        yield numero, dados if isinstance(dados, dict) else "cada linha deve ser um objeto JSON"
+
+def filtrar(registros, verificar):
+    # verificar(registro) -> mensagem de erro ou None; devolve (aceitos, [(índice, mensagem)])
+    aceitos, recusados = [], []
+    for i, r in enumerate(registros):
+        erro = verificar(r)
+        if erro: recusados.append((i, erro))
+        else: aceitos.append(r)
+    return aceitos, recusados
+
+def _mensagem(erro: ValidationError):
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in erro.errors())
+
+class Importador:
+    def __init__(self, fabrica_sessao, schema, gravar, lote: int = LINHAS_POR_LOTE):
+        # gravar(db, registros) -> [(índice no lote, mensagem)] das linhas recusadas por regra de negócio
+        self.fabrica_sessao = fabrica_sessao
+        self.schema = schema
+        self.gravar = gravar
+        self.lote = lote
+
+    async def importar(self, corpo, formato: str = "csv"):
+        resultado = {"recebidas": 0, "importadas": 0, "rejeitadas": 0, "erros": []}
+        cabecalho, pendentes = None, []
+        async for numero, texto in _registros(corpo, formato):
+            if formato == "csv" and cabecalho is None:
+                cabecalho = [c.strip() for c in next(csv.reader([texto]))]; continue
+            pendentes.append((numero, texto))
+            if len(pendentes) >= self.lote:
+                await run_in_threadpool(self._processar, cabecalho, pendentes, formato, resultado); pendentes = []
+        if pendentes: await run_in_threadpool(self._processar, cabecalho, pendentes, formato, resultado)
+        return resultado
+
+    def _processar(self, cabecalho, registros, formato, resultado):
+        linhas, validos, erros = [], [], []
+        for numero, dados in (_csv(cabecalho, registros) if formato == "csv" else _jsonl(registros)):
+            if isinstance(dados, str): erros.append((numero, dados)); continue
+            try: validos.append(self.schema(**dados).dict()); linhas.append(numero)
+            except ValidationError as e: erros.append((numero, _mensagem(e)))
+        if validos:
+            db = self.fabrica_sessao()
+            try:
+                recusados = dict(self.gravar(db, validos))
+                db.commit()
+                erros += [(linhas[i], msg) for i, msg in recusados.items()]
+                resultado["importadas"] += len(validos) - len(recusados)
+            except Exception as e:
+                db.rollback()
+                erros += [(n, f"lote não gravado: {e}") for n in linhas]
+            finally:
+                db.close()
+        resultado["recebidas"] += len(registros)
+        resultado["rejeitadas"] += len(erros)
+        espaco = MAX_ERROS - len(resultado["erros"])
+        resultado["erros"] += [{"linha": n, "erro": msg} for n, msg in sorted(erros)[:max(espaco, 0)]]
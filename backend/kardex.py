@@ -0,0 +1,31 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from sqlalchemy import case, tuple_
+from sqlalchemy.orm import Session
+from backend.estoque_historico import HistoricoEstoque
+from backend.models import EstoqueCheckpoint, Movimentacao, Produto
+from backend.paginacao import codificar_cursor, decodificar_cursor
+
+LIMITE_PADRAO = 500
+LIMITE_MAXIMO = 5000
+
+# Quantidade com sinal: as saídas são gravadas com quantidade positiva e tipo "Saida"
+DELTA_MOVIMENTACAO = case((Movimentacao.tipo == "Saida", -Movimentacao.quantidade), else_=Movimentacao.quantidade)
+historico_estoque = HistoricoEstoque(Movimentacao, Movimentacao.data, DELTA_MOVIMENTACAO, EstoqueCheckpoint, Produto)
+
+def pagina_kardex(db: Session, produto_id: Optional[int] = None, tipo: Optional[str] = None, inicio: Optional[date] = None, fim: Optional[date] = None, after: Optional[str] = None, limit: int = LIMITE_PADRAO):
+    # Uma única consulta com JOIN no produto, ordenada por (data, id) decrescente
+    q = db.query(Movimentacao.id, Movimentacao.data, Movimentacao.tipo, Movimentacao.quantidade, Movimentacao.origem, Produto.nome).outerjoin(Produto, Produto.id == Movimentacao.produto_id)
+    if produto_id is not None: q = q.filter(Movimentacao.produto_id == produto_id)
+    if tipo: q = q.filter(Movimentacao.tipo == tipo)
+    if inicio: q = q.filter(Movimentacao.data >= datetime.combine(inicio, time.min))
+    if fim: q = q.filter(Movimentacao.data < datetime.combine(fim + timedelta(days=1), time.min))
+    if after:
+        data, id = decodificar_cursor(after)
+        q = q.filter(tuple_(Movimentacao.data, Movimentacao.id) < tuple_(data, id))
+    linhas = q.order_by(Movimentacao.data.desc(), Movimentacao.id.desc()).limit(limit).all()
+    proximo = codificar_cursor(linhas[-1].data, linhas[-1].id) if len(linhas) == limit else None
+    return linhas, proximo
+
+def formatar_linha(m):
+    return {"Data": m.data.strftime("%d/%m/%Y"), "Produto": m.nome or "?", "Tipo": m.tipo, "Qtd": m.quantidade, "Origem": m.origem}
@@ -1,27 +1,59 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Boolean, Date, DateTime, extract
+import threading
+import time
+from collections import defaultdict
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Date, DateTime, Index, bindparam, extract, func, insert, literal_column, select, text, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from passlib.context import CryptContext
 from fastapi.middleware.cors import CORSMiddleware
 import io
-from starlette.responses import StreamingResponse
+from starlette.responses import StreamingResponse, FileResponse
 
 # --- IMPORTAÇÕES PARA PDF AVANÇADO (RELATÓRIOS) ---
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+try:
+    from backend.database import aplicar_migracoes, caminho_arquivo, criar_engine, garantir_indices, normalizar_coluna_data
+    from backend.exportacao import gerar_csv, nome_arquivo
+    from backend.paginacao import ParametrosPagina
+    from backend.versoes import ControleVersoes
+    from backend.mrp import GrafoBOM
+    from backend.diario import DiarioMovimentos
+    from backend.sessoes import Sessoes
+    from backend.backup import Backups
+    from backend.importacao import Importador, filtrar
+    from backend.estoque_historico import HistoricoEstoque
+    from backend.ultima_compra import UltimaCompra
+    from backend.relatorios_jobs import FilaRelatorios
+    from backend.relatorios_pdf import renderizar_para_arquivo
+except ImportError: # executando de dentro da pasta backend/
+    from database import aplicar_migracoes, caminho_arquivo, criar_engine, garantir_indices, normalizar_coluna_data
+    from exportacao import gerar_csv, nome_arquivo
+    from paginacao import ParametrosPagina
+    from versoes import ControleVersoes
+    from mrp import GrafoBOM
+    from diario import DiarioMovimentos
+    from sessoes import Sessoes
+    from backup import Backups
+    from importacao import Importador, filtrar
+    from estoque_historico import HistoricoEstoque
+    from ultima_compra import UltimaCompra
+    from relatorios_jobs import FilaRelatorios
+    from relatorios_pdf import renderizar_para_arquivo
 
 # --- CONFIGURAÇÃO BANCO E APP ---
 DATABASE_URL = "sqlite:///./decant_erp.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = criar_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine_leitura = criar_engine(DATABASE_URL, somente_leitura=True)
+SessionLeitura = sessionmaker(autocommit=False, autoflush=False, bind=engine_leitura)
+backups = Backups(caminho_arquivo(DATABASE_URL)) # snapshots online, rotativos em backups/
 Base = declarative_base()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 app = FastAPI()
@@ -34,11 +66,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+fila_relatorios = FilaRelatorios(renderizar_para_arquivo)
+versoes = ControleVersoes(SessionLocal, engine) # ETag das listagens
+
 def get_db():
     db = SessionLocal()
     try: yield db
     finally: db.close()
 
+def get_db_leitura():
+    # Relatórios: conexão somente leitura (não disputa o lock de escrita do PDV)
+    db = SessionLeitura()
+    try: yield db
+    finally: db.close()
+
 # --- MODELOS (TABELAS) ---
 class Usuario(Base):
     __tablename__ = "usuarios"
@@ -74,13 +115,13 @@ class Formula(Base):
     __tablename__ = "formulas"
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String)
-    produto_final_id = Column(Integer, ForeignKey("produtos.id"))
+    produto_final_id = Column(Integer, ForeignKey("produtos.id"), index=True)
     itens = relationship("FormulaItem", back_populates="formula")
 
 class FormulaItem(Base):
     __tablename__ = "formula_itens"
     id = Column(Integer, primary_key=True, index=True)
-    formula_id = Column(Integer, ForeignKey("formulas.id"))
+    formula_id = Column(Integer, ForeignKey("formulas.id"), index=True)
     materia_prima_id = Column(Integer, ForeignKey("produtos.id"))
     quantidade = Column(Float)
     formula = relationship("Formula", back_populates="itens")
@@ -96,6 +137,13 @@ class Venda(Base):
     metodo_pagamento = Column(String)
     grupo_id = Column(String)
 
+class ClienteUltimaCompra(Base):
+    # Resumo mantido pelo PDV: última compra de cada cliente (alimenta o CRM)
+    __tablename__ = "clientes_ultima_compra"
+    cliente_id = Column(Integer, ForeignKey("clientes.id"), primary_key=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id"))
+    data_ultima_compra = Column(DateTime, index=True)
+
 class LancamentoFinanceiro(Base):
     __tablename__ = "financeiro"
     id = Column(Integer, primary_key=True, index=True)
@@ -103,9 +151,10 @@ class LancamentoFinanceiro(Base):
     tipo = Column(String)
     categoria = Column(String)
     valor = Column(Float)
-    data_vencimento = Column(String)
+    data_vencimento = Column(Date)
     pago = Column(Boolean, default=False)
     data_lancamento = Column(Date, default=date.today) # Novo campo útil para filtros
+    __table_args__ = (Index("ix_financeiro_vencimento_categoria", "data_vencimento", "categoria"),)
 
 class Compra(Base):
     __tablename__ = "compras"
@@ -141,6 +190,15 @@ class Kardex(Base):
     tipo_movimento = Column(String)
     quantidade = Column(Float)
     data_movimento = Column(DateTime, default=datetime.now)
+    # Extrato por produto com saldo corrente (janela por data, id); faixa de datas dos checkpoints
+    __table_args__ = (Index("ix_kardex_produto_data_id", "produto_id", "data_movimento", "id"), Index("ix_kardex_data_id", "data_movimento", "id"))
+
+class EstoqueCheckpoint(Base):
+    # Saldo por produto com os movimentos anteriores a "data" (gerado todo início de mês)
+    __tablename__ = "estoque_checkpoints"
+    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    data = Column(DateTime, primary_key=True)
+    saldo = Column(Float, default=0.0)
 
 class Lote(Base):
     __tablename__ = "lotes"
@@ -149,11 +207,22 @@ class Lote(Base):
     codigo_lote = Column(String)
     quantidade_inicial = Column(Float)
     quantidade_atual = Column(Float)
-    validade = Column(String)
+    validade = Column(Date)
     data_entrada = Column(DateTime, default=datetime.now)
+    __table_args__ = (Index("ix_lotes_validade_saldo", "validade", sqlite_where=text("quantidade_atual > 0")),)
 
 Base.metadata.create_all(bind=engine)
 
+# --- MIGRAÇÕES (PRAGMA user_version guarda a última aplicada) ---
+def _vencimento_iso(conn):
+    # financeiro.data_vencimento era String: normaliza para ISO (YYYY-MM-DD), formato do tipo Date
+    conn.execute(text("UPDATE financeiro SET data_vencimento = substr(data_vencimento, 7, 4) || '-' || substr(data_vencimento, 4, 2) || '-' || substr(data_vencimento, 1, 2) WHERE data_vencimento LIKE '__/__/____'"))
+    conn.execute(text("UPDATE financeiro SET data_vencimento = substr(data_vencimento, 1, 10) WHERE length(data_vencimento) > 10"))
+
+# 1 = financeiro.data_vencimento, 2 = lotes.validade (String -> Date); novas migrações entram no fim da lista
+aplicar_migracoes(engine, [_vencimento_iso, lambda conn: normalizar_coluna_data(conn, "lotes", "validade")])
+garantir_indices(Base.metadata, engine)
+
 # --- SCHEMAS ---
 class UsuarioBase(BaseModel):
     username: str
@@ -197,7 +266,7 @@ class LancamentoBase(BaseModel):
     tipo: str
     categoria: str
     valor: float
-    data_vencimento: str
+    data_vencimento: date
     pago: bool
 
 class CompraBase(BaseModel):
@@ -211,46 +280,80 @@ class CotacaoBase(BaseModel):
     fornecedor_id: int
     preco: float
 
+class EstoqueInicial(BaseModel):
+    produto_id: int
+    quantidade: float
+    lote: str = "INI-IMP"
+    validade: Optional[date] = None
+
 class FornecedorBase(BaseModel):
     nome: str
     prazo_entrega_dias: int
 
+class PlanoItem(BaseModel):
+    formula_id: int
+    quantidade: float
+
+class PlanoLote(BaseModel):
+    itens: List[PlanoItem]
+
 class ProducaoConfirmacao(BaseModel):
     formula_id: int
     quantidade: float
     lote_final: str
-    validade_final: str
+    validade_final: date
 
 class ProcessarCompra(BaseModel):
     lote: str
-    validade: str
+    validade: date
+
+sessoes = Sessoes(pwd_context) # token assinado emitido no login; bcrypt só ali, num pool próprio
+somente_diretor = sessoes.exigir_cargo("Diretor") # usuários e /sistema/* (backup, reset)
 
-def verificar_senha(senha_plana, senha_hash):
-    return pwd_context.verify(senha_plana, senha_hash)
+diario = DiarioMovimentos(SessionLocal, Kardex, ("produto_id", "tipo_movimento", "quantidade"), "data_movimento")
 
 def registrar_kardex(db: Session, prod_id: int, tipo: str, qtd: float):
-    k = Kardex(produto_id=prod_id, tipo_movimento=tipo, quantidade=qtd)
-    db.add(k); db.commit()
+    # Vai para o buffer do diário; o INSERT (executemany) acontece no commit de quem chama
+    diario.registrar(db, prod_id, tipo, qtd)
+
+ultima_compra = UltimaCompra(ClienteUltimaCompra, Venda) # resumo do CRM, mantido pelo PDV
+
+historico_estoque = HistoricoEstoque(Kardex, Kardex.data_movimento, Kardex.quantidade, EstoqueCheckpoint, Produto)
+
+# Bancos anteriores ao resumo de última compra: preenche uma vez a partir das vendas
+with SessionLocal() as _db:
+    if not _db.query(ClienteUltimaCompra).first() and _db.query(Venda).first():
+        ultima_compra.reconstruir(_db)
+    historico_estoque.gerar_pendentes(_db) # checkpoints mensais de estoque que faltarem
 
 # --- ENDPOINTS ---
 
 @app.post("/auth/login/")
-def login(u: UsuarioBase, db: Session = Depends(get_db)):
-    if u.username == "admin" and u.senha == "123":
-        return {"msg": "OK", "cargo": "Diretor", "usuario": "admin"}
-    user = db.query(Usuario).filter(Usuario.username == u.username).first()
-    if not user or not verificar_senha(u.senha, user.senha_hash):
+async def login(u: UsuarioBase, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(lambda: db.query(Usuario).filter(Usuario.username == u.username).first())
+    if not user or not await sessoes.verificar_senha(u.senha, user.senha_hash):
+        # admin/123 só serve para a instalação: enquanto não houver nenhum usuário cadastrado
+        if u.username == "admin" and u.senha == "123" and not await run_in_threadpool(lambda: db.query(Usuario.id).first()):
+            return {"msg": "OK", "cargo": "Diretor", "usuario": "admin", **sessoes.emitir("admin", "Diretor")}
         raise HTTPException(401, "Credenciais inválidas")
-    return {"msg": "OK", "cargo": user.cargo, "usuario": user.username}
+    return {"msg": "OK", "cargo": user.cargo, "usuario": user.username, **sessoes.emitir(user.username, user.cargo)}
 
-@app.post("/usuarios/")
-def criar_usuario(u: UsuarioBase, db: Session = Depends(get_db)):
-    hash_s = pwd_context.hash(u.senha)
-    novo = Usuario(username=u.username, senha_hash=hash_s, cargo=u.cargo)
-    db.add(novo); db.commit(); db.refresh(novo)
+@app.get("/auth/sessao/")
+async def sessao_atual(claims: dict = Depends(sessoes.usuario_atual)):
+    return {"usuario": claims["sub"], "cargo": claims["cargo"], "expira_em": claims["exp"]}
+
+@app.post("/auth/logout/")
+async def logout(claims: dict = Depends(sessoes.usuario_atual)):
+    sessoes.revogar(claims)
+    return {"msg": "Sessão encerrada"}
+
+@app.post("/usuarios/", dependencies=[Depends(somente_diretor)])
+async def criar_usuario(u: UsuarioBase, db: Session = Depends(get_db)):
+    novo = Usuario(username=u.username, senha_hash=await sessoes.criar_hash(u.senha), cargo=u.cargo)
+    db.add(novo); await run_in_threadpool(db.commit); await run_in_threadpool(db.refresh, novo)
     return novo
 
-@app.get("/usuarios/")
+@app.get("/usuarios/", dependencies=[Depends(somente_diretor), Depends(versoes.etag("usuarios"))])
 def listar_usuarios(db: Session = Depends(get_db)):
     return db.query(Usuario).all()
 
@@ -258,10 +361,10 @@ def listar_usuarios(db: Session = Depends(get_db)):
 def criar_produto(p: ProdutoBase, db: Session = Depends(get_db)):
     db_p = Produto(nome=p.nome, tipo=p.tipo, unidade=p.unidade, estoque_atual=p.estoque_atual, custo=p.custo, localizacao=p.localizacao)
     db.add(db_p); db.commit(); db.refresh(db_p)
-    registrar_kardex(db, db_p.id, "Estoque Inicial", p.estoque_atual)
+    registrar_kardex(db, db_p.id, "Estoque Inicial", p.estoque_atual); db.commit(); db.refresh(db_p)
     return db_p
 
-@app.get("/produtos/")
+@app.get("/produtos/", dependencies=[Depends(versoes.etag("produtos"))])
 def listar_produtos(db: Session = Depends(get_db)):
     return db.query(Produto).all()
 
@@ -271,33 +374,79 @@ def criar_cliente(c: ClienteBase, db: Session = Depends(get_db)):
     db.add(novo); db.commit(); db.refresh(novo)
     return novo
 
-@app.get("/clientes/")
+@app.get("/clientes/", dependencies=[Depends(versoes.etag("clientes"))])
 def listar_clientes(db: Session = Depends(get_db)):
     return db.query(Cliente).all()
 
+# --- IMPORTAÇÃO EM MASSA (executemany Core por lote; cada função devolve as linhas recusadas) ---
+def ids_existentes(db: Session, modelo, ids):
+    return set(db.scalars(select(modelo.id).where(modelo.id.in_(ids))))
+
+def importar_produtos(db: Session, regs):
+    ids = db.scalars(insert(Produto.__table__).returning(Produto.id, sort_by_parameter_order=True), regs).all()
+    for pid, r in zip(ids, regs):
+        if r["estoque_atual"] > 0: registrar_kardex(db, pid, "Estoque Inicial", r["estoque_atual"])
+    return []
+
+def importar_clientes(db: Session, regs):
+    db.execute(insert(Cliente.__table__), regs)
+    return []
+
+def importar_cotacoes(db: Session, regs):
+    produtos = ids_existentes(db, Produto, {r["produto_id"] for r in regs})
+    fornecedores = ids_existentes(db, Fornecedor, {r["fornecedor_id"] for r in regs})
+    aceitos, recusados = filtrar(regs, lambda r: "produto_id inexistente" if r["produto_id"] not in produtos else "fornecedor_id inexistente" if r["fornecedor_id"] not in fornecedores else None)
+    if aceitos: db.execute(insert(Cotacao.__table__), aceitos)
+    return recusados
+
+def importar_estoque(db: Session, regs):
+    produtos = ids_existentes(db, Produto, {r["produto_id"] for r in regs})
+    aceitos, recusados = filtrar(regs, lambda r: "produto_id inexistente" if r["produto_id"] not in produtos else "quantidade deve ser positiva" if r["quantidade"] <= 0 else None)
+    if aceitos:
+        db.execute(update(Produto.__table__).where(Produto.id == bindparam("pid")).values(estoque_atual=Produto.estoque_atual + bindparam("qtd")), [{"pid": r["produto_id"], "qtd": r["quantidade"]} for r in aceitos])
+        db.execute(insert(Lote.__table__), [{"produto_id": r["produto_id"], "codigo_lote": r["lote"], "quantidade_inicial": r["quantidade"], "quantidade_atual": r["quantidade"], "validade": r["validade"]} for r in aceitos])
+        for r in aceitos: registrar_kardex(db, r["produto_id"], "Estoque Inicial", r["quantidade"])
+    return recusados
+
+IMPORTADORES = {
+    "produtos": Importador(SessionLocal, ProdutoBase, importar_produtos),
+    "clientes": Importador(SessionLocal, ClienteBase, importar_clientes),
+    "cotacoes": Importador(SessionLocal, CotacaoBase, importar_cotacoes),
+    "estoque": Importador(SessionLocal, EstoqueInicial, importar_estoque),
+}
+
+@app.post("/importar/{entidade}/", dependencies=[Depends(sessoes.usuario_atual)])
+async def importar(entidade: str, request: Request, formato: Optional[str] = Query(None, pattern="^(csv|jsonl)$")):
+    # Corpo cru (curl --data-binary @arquivo.csv); sem ?formato= decide pelo Content-Type
+    if entidade not in IMPORTADORES: raise HTTPException(404, f"Entidade inválida ({', '.join(IMPORTADORES)})")
+    formato = formato or ("jsonl" if "json" in request.headers.get("content-type", "") else "csv")
+    return await IMPORTADORES[entidade].importar(request.stream(), formato)
+
 @app.post("/vendas/pdv/")
 def registrar_venda_pdv(v: VendaCreate, db: Session = Depends(get_db)):
-    grupo = datetime.now().strftime("%Y%m%d%H%M%S")
+    agora = datetime.now()
+    grupo = agora.strftime("%Y%m%d%H%M%S")
     for item in v.itens:
         prod = db.query(Produto).filter(Produto.id == item.produto_id).first()
         if prod:
             if prod.estoque_atual >= item.quantidade:
                 prod.estoque_atual -= item.quantidade
                 registrar_kardex(db, prod.id, "Venda", -item.quantidade)
-                nova_venda = Venda(cliente_id=v.cliente_id, produto_id=item.produto_id, quantidade=item.quantidade, valor_total=item.valor_total, metodo_pagamento=v.metodo_pagamento, grupo_id=grupo)
+                nova_venda = Venda(cliente_id=v.cliente_id, produto_id=item.produto_id, quantidade=item.quantidade, valor_total=item.valor_total, metodo_pagamento=v.metodo_pagamento, grupo_id=grupo, data_venda=agora)
                 db.add(nova_venda)
-                lf = LancamentoFinanceiro(descricao=f"Venda PDV {prod.nome}", tipo="Receita", categoria="Vendas", valor=item.valor_total, data_vencimento=str(date.today()), pago=True)
+                lf = LancamentoFinanceiro(descricao=f"Venda PDV {prod.nome}", tipo="Receita", categoria="Vendas", valor=item.valor_total, data_vencimento=date.today(), pago=True)
                 db.add(lf)
             else:
                 raise HTTPException(400, f"Sem estoque para {prod.nome}")
+    if v.itens: ultima_compra.registrar(db, v.cliente_id, v.itens[-1].produto_id, agora)
     db.commit()
     return {"msg": "Venda OK", "grupo_id": grupo}
 
-@app.get("/vendas/")
-def listar_vendas(db: Session = Depends(get_db)):
-    return db.query(Venda).order_by(Venda.id.desc()).all()
+@app.get("/vendas/", dependencies=[Depends(versoes.etag("vendas"))])
+def listar_vendas(p: ParametrosPagina = Depends(), db: Session = Depends(get_db)):
+    return p.listar(db, Venda, decrescente=True)
 
-@app.get("/financeiro/lancamentos/")
+@app.get("/financeiro/lancamentos/", dependencies=[Depends(versoes.etag("financeiro"))])
 def listar_financeiro(db: Session = Depends(get_db)):
     return db.query(LancamentoFinanceiro).order_by(LancamentoFinanceiro.id.desc()).all()
 
@@ -315,40 +464,71 @@ def pagar_conta(id: int, db: Session = Depends(get_db)):
         db.commit()
     return {"msg": "Pago"}
 
+MESES = {1:"Jan", 2:"Fev", 3:"Mar", 4:"Abr", 5:"Mai", 6:"Jun", 7:"Jul", 8:"Ago", 9:"Set", 10:"Out", 11:"Nov", 12:"Dez"}
+
+def kpis_financeiro(db: Session):
+    # Um GROUP BY no banco em vez de carregar todos os lançamentos
+    totais = dict(db.query(LancamentoFinanceiro.tipo, func.sum(LancamentoFinanceiro.valor)).filter(LancamentoFinanceiro.tipo.in_(["Receita", "Despesa"])).group_by(LancamentoFinanceiro.tipo).all())
+    receita, despesas = totais.get("Receita") or 0, totais.get("Despesa") or 0
+    return {"receita": receita, "despesas": despesas, "lucro": receita - despesas, "margem": ((receita-despesas)/receita*100) if receita > 0 else 0}
+
+def grafico_financeiro(db: Session, meses: int = 6):
+    # Entradas x saídas por mês de vencimento (faixa no índice de data_vencimento)
+    hoje = date.today()
+    ano, mes = hoje.year, hoje.month - (meses - 1)
+    while mes < 1: ano, mes = ano - 1, mes + 12
+    ano_c, mes_c = extract('year', LancamentoFinanceiro.data_vencimento), extract('month', LancamentoFinanceiro.data_vencimento)
+    linhas = db.query(ano_c, mes_c, LancamentoFinanceiro.tipo, func.sum(LancamentoFinanceiro.valor)).filter(LancamentoFinanceiro.data_vencimento >= date(ano, mes, 1), LancamentoFinanceiro.tipo.in_(["Receita", "Despesa"])).group_by(ano_c, mes_c, LancamentoFinanceiro.tipo).order_by(ano_c, mes_c).all()
+    return [{"Mês": f"{MESES[int(m)]}/{int(a)}", "Valor": v, "Tipo": "Entradas" if t == "Receita" else "Saídas"} for a, m, t, v in linhas]
+
 @app.get("/financeiro/dashboard/")
-def dashboard(db: Session = Depends(get_db)):
-    lancamentos = db.query(LancamentoFinanceiro).all()
-    receita = sum([l.valor for l in lancamentos if l.tipo == 'Receita'])
-    despesas = sum([l.valor for l in lancamentos if l.tipo == 'Despesa'])
-    vendas = db.query(Venda).all() 
-    grafico = [
-        {"Mês": "Jan", "Valor": receita, "Tipo": "Entradas"},
-        {"Mês": "Jan", "Valor": despesas, "Tipo": "Saídas"}
-    ]
-    return {"receita": receita, "despesas": despesas, "lucro": receita - despesas, "margem": ((receita-despesas)/receita*100) if receita > 0 else 0, "grafico": grafico}
+def dashboard(db: Session = Depends(get_db_leitura)):
+    return {**kpis_financeiro(db), "grafico": grafico_financeiro(db)}
+
+# --- DASHBOARD: TODOS OS PAINÉIS EM UMA CHAMADA ---
+DASHBOARD_TTL = float(os.getenv("DASHBOARD_TTL_SEGUNDOS", "5"))
+_dashboard_cache = {"expira": 0.0, "dados": None}
+_dashboard_lock = threading.Lock()
+
+def montar_bootstrap(db: Session):
+    ultimas = db.query(Venda.id, Venda.valor_total, Venda.data_venda, Cliente.nome, Cliente.email).outerjoin(Cliente, Cliente.id == Venda.cliente_id).order_by(Venda.id.desc()).limit(5).all()
+    produtos = db.query(Produto.id, Produto.nome, Produto.tipo, Produto.estoque_atual).order_by(Produto.id).all()
+    return {
+        "kpis": kpis_financeiro(db),
+        "grafico": grafico_financeiro(db),
+        "ultimas_vendas": [{"id": v.id, "cliente": v.nome or "Cliente", "email": v.email or "-", "valor_total": v.valor_total, "data_venda": v.data_venda} for v in ultimas],
+        "produtos": [dict(p._mapping) for p in produtos],
+    }
+
+@app.get("/dashboard/bootstrap/")
+def dashboard_bootstrap(db: Session = Depends(get_db_leitura)):
+    # Resposta compartilhada por alguns segundos: N dashboards abertos = 1 consulta por TTL
+    with _dashboard_lock:
+        if _dashboard_cache["expira"] < time.monotonic():
+            _dashboard_cache["dados"] = montar_bootstrap(db)
+            _dashboard_cache["expira"] = time.monotonic() + DASHBOARD_TTL
+        return _dashboard_cache["dados"]
 
 # --- NOVO: Endpoint DRE (Demonstração do Resultado do Exercício) ---
 @app.get("/relatorios/dre")
-def relatorio_dre(inicio: str, fim: str, db: Session = Depends(get_db)):
+def relatorio_dre(inicio: str, fim: str, db: Session = Depends(get_db_leitura)):
     # Converte strings de data para objetos date
     dt_ini = datetime.strptime(inicio, "%Y-%m-%d").date()
     dt_fim = datetime.strptime(fim, "%Y-%m-%d").date()
     
     # Filtra lançamentos financeiros pela data (assumindo vencimento como data base simplificada)
     # Em um sistema real, usaria data_competencia
-    lancamentos = db.query(LancamentoFinanceiro).all() 
-    
-    # Filtra na lista (python) por segurança de formato de data
-    filtrados = [l for l in lancamentos if dt_ini <= datetime.strptime(l.data_vencimento, "%Y-%m-%d").date() <= dt_fim]
+    # Uma consulta agrupada por categoria sobre o índice (data_vencimento, categoria)
+    totais = dict(db.query(LancamentoFinanceiro.categoria, func.sum(LancamentoFinanceiro.valor)).filter(LancamentoFinanceiro.data_vencimento.between(dt_ini, dt_fim)).group_by(LancamentoFinanceiro.categoria).all())
     
-    receita_bruta = sum(l.valor for l in filtrados if l.categoria == 'Vendas')
-    impostos = sum(l.valor for l in filtrados if l.categoria == 'Impostos')
+    receita_bruta = totais.get('Vendas', 0)
+    impostos = totais.get('Impostos', 0)
     receita_liquida = receita_bruta - impostos
     
-    custos_variaveis = sum(l.valor for l in filtrados if l.categoria in ['Matéria Prima', 'Despesa Variável'])
+    custos_variaveis = totais.get('Matéria Prima', 0) + totais.get('Despesa Variável', 0)
     margem_contribuicao = receita_liquida - custos_variaveis
     
-    despesas_fixas = sum(l.valor for l in filtrados if l.categoria == 'Custos Fixos')
+    despesas_fixas = totais.get('Custos Fixos', 0)
     lucro_liquido = margem_contribuicao - despesas_fixas
     
     return {
@@ -361,100 +541,98 @@ def relatorio_dre(inicio: str, fim: str, db: Session = Depends(get_db)):
         "lucro_liquido": lucro_liquido
     }
 
+@app.get("/estoque/em/")
+def estoque_em(data: date, produto_id: Optional[int] = None, db: Session = Depends(get_db_leitura)):
+    # Estoque no fim do dia: checkpoint mensal mais próximo + movimentos posteriores
+    return historico_estoque.estoque_em(db, data, produto_id)
+
+@app.get("/estoque/extrato/{produto_id}")
+def extrato_produto(produto_id: int, limit: int = Query(500, ge=1, le=5000), db: Session = Depends(get_db_leitura)):
+    # Movimentos do Kardex com o saldo corrente após cada um
+    return diario.extrato(db, produto_id, limit)
+
+@app.get("/estoque/saldos")
+def saldos_kardex(produto_id: Optional[List[int]] = Query(None), db: Session = Depends(get_db_leitura)):
+    # Saldo por produto somando o Kardex (confere com estoque_atual); ?produto_id=1&produto_id=2 filtra
+    return [{"produto_id": pid, "saldo": saldo} for pid, saldo in sorted(diario.saldos(db, produto_id).items())]
+
+# --- EXPORTAÇÃO CSV (streaming) ---
+def consulta_exportacao(entidade: str, inicio: Optional[date], fim: Optional[date]):
+    if entidade == "vendas":
+        stmt = select(Venda.id, Venda.data_venda, Venda.grupo_id, Venda.cliente_id, Cliente.nome, Venda.produto_id, Produto.nome, Venda.quantidade, Venda.valor_total, Venda.metodo_pagamento).outerjoin(Cliente, Cliente.id == Venda.cliente_id).outerjoin(Produto, Produto.id == Venda.produto_id).order_by(Venda.id)
+        cab, col = ["id", "data", "grupo", "cliente_id", "cliente", "produto_id", "produto", "quantidade", "valor_total", "metodo_pagamento"], Venda.data_venda
+    elif entidade == "kardex":
+        stmt = select(Kardex.id, Kardex.data_movimento, Kardex.produto_id, Produto.nome, Kardex.tipo_movimento, Kardex.quantidade).outerjoin(Produto, Produto.id == Kardex.produto_id).order_by(Kardex.data_movimento, Kardex.id)
+        cab, col = ["id", "data", "produto_id", "produto", "tipo", "quantidade"], Kardex.data_movimento
+    elif entidade == "lancamentos":
+        stmt = select(LancamentoFinanceiro.id, LancamentoFinanceiro.data_vencimento, LancamentoFinanceiro.descricao, LancamentoFinanceiro.tipo, LancamentoFinanceiro.categoria, LancamentoFinanceiro.valor, LancamentoFinanceiro.pago, LancamentoFinanceiro.data_lancamento).order_by(LancamentoFinanceiro.data_vencimento, LancamentoFinanceiro.id)
+        cab = ["id", "data_vencimento", "descricao", "tipo", "categoria", "valor", "pago", "data_lancamento"]
+        if inicio: stmt = stmt.where(LancamentoFinanceiro.data_vencimento >= inicio)
+        if fim: stmt = stmt.where(LancamentoFinanceiro.data_vencimento <= fim)
+        return stmt, cab
+    else: raise HTTPException(404, "Entidade inválida (vendas, kardex, lancamentos)")
+    if inicio: stmt = stmt.where(col >= datetime.combine(inicio, datetime.min.time()))
+    if fim: stmt = stmt.where(col < datetime.combine(fim + timedelta(days=1), datetime.min.time()))
+    return stmt, cab
+
+@app.get("/export/{entidade}.csv")
+def exportar_csv(entidade: str, inicio: Optional[date] = None, fim: Optional[date] = None, gzip: bool = False):
+    stmt, cab = consulta_exportacao(entidade, inicio, fim)
+    headers = {"Content-Disposition": f'attachment; filename="{nome_arquivo(entidade, gzip)}"'}
+    return StreamingResponse(gerar_csv(SessionLeitura, stmt, cab, gzip), media_type="application/gzip" if gzip else "text/csv; charset=utf-8", headers=headers)
+
+# --- RELATÓRIOS PDF (renderizados no pool de processos) ---
+def dados_relatorio(tipo: str, inicio: Optional[str], fim: Optional[str], db: Session):
+    # Monta as linhas já com JOIN: o processo que renderiza não toca no banco
+    if tipo == "vendas":
+        if not inicio or not fim: raise HTTPException(400, "Informe inicio e fim")
+        dt_ini = datetime.strptime(inicio, "%Y-%m-%d")
+        dt_fim = datetime.strptime(fim, "%Y-%m-%d")
+        linhas = db.query(Venda.id, Cliente.nome, Produto.nome, Venda.quantidade, Venda.valor_total).outerjoin(Cliente, Cliente.id == Venda.cliente_id).outerjoin(Produto, Produto.id == Venda.produto_id).filter(Venda.data_venda >= dt_ini, Venda.data_venda <= dt_fim).order_by(Venda.id).all()
+        return (inicio, fim, [tuple(l) for l in linhas])
+    if tipo == "estoque":
+        linhas = db.query(Produto.nome, Produto.localizacao, Produto.estoque_atual, Produto.custo).order_by(Produto.id).all()
+        return ([tuple(l) for l in linhas],)
+    raise HTTPException(400, "Tipo de relatório inválido (vendas, estoque)")
+
+@app.post("/relatorios/jobs/")
+def criar_job_relatorio(tipo: str, inicio: Optional[str] = None, fim: Optional[str] = None, db: Session = Depends(get_db_leitura)):
+    job_id = fila_relatorios.submeter(tipo, dados_relatorio(tipo, inicio, fim, db))
+    return fila_relatorios.consultar(job_id)
+
+@app.get("/relatorios/jobs/{job_id}")
+def status_job_relatorio(job_id: str):
+    job = fila_relatorios.consultar(job_id)
+    if not job: raise HTTPException(404, "Job não encontrado ou expirado")
+    return job
+
+@app.get("/relatorios/jobs/{job_id}/download")
+def baixar_job_relatorio(job_id: str):
+    job = fila_relatorios.consultar(job_id)
+    if not job: raise HTTPException(404, "Job não encontrado ou expirado")
+    if job["status"] != "concluido": raise HTTPException(409, f"Relatório ainda não disponível ({job['status']})")
+    caminho = fila_relatorios.arquivo(job_id)
+    if caminho is None: raise HTTPException(404, "Arquivo do relatório não encontrado ou expirado")
+    return FileResponse(caminho, media_type="application/pdf", filename=f"relatorio_{job['tipo']}.pdf")
+
+def pdf_da_fila(job_id: str):
+    try: caminho = fila_relatorios.aguardar(job_id)
+    except Exception as e: raise HTTPException(500, f"Falha ao gerar relatório: {e}")
+    if caminho is None: raise HTTPException(404, "Relatório não encontrado ou expirado")
+    return FileResponse(caminho, media_type="application/pdf")
+
 # --- NOVO: Endpoint PDF de Vendas por Período ---
 @app.get("/relatorios/vendas_pdf")
-def relatorio_vendas_pdf(inicio: str, fim: str, db: Session = Depends(get_db)):
-    dt_ini = datetime.strptime(inicio, "%Y-%m-%d")
-    dt_fim = datetime.strptime(fim, "%Y-%m-%d")
-    
-    # Busca vendas no período
-    vendas = db.query(Venda).filter(Venda.data_venda >= dt_ini, Venda.data_venda <= dt_fim).all()
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Título
-    elements.append(Paragraph(f"Relatório de Vendas: {inicio} a {fim}", styles['Title']))
-    elements.append(Spacer(1, 12))
-    
-    # Tabela
-    data = [["ID", "Cliente", "Produto", "Qtd", "Valor (R$)"]] # Cabeçalho
-    total = 0
-    for v in vendas:
-        cli = db.query(Cliente).filter(Cliente.id == v.cliente_id).first()
-        prod = db.query(Produto).filter(Produto.id == v.produto_id).first()
-        data.append([
-            str(v.id),
-            cli.nome if cli else "Desconhecido",
-            prod.nome if prod else "?",
-            str(v.quantidade),
-            f"{v.valor_total:.2f}"
-        ])
-        total += v.valor_total
-    
-    data.append(["", "", "TOTAL:", "", f"{total:.2f}"])
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-    ]))
-    elements.append(t)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type="application/pdf")
+def relatorio_vendas_pdf(inicio: str, fim: str, db: Session = Depends(get_db_leitura)):
+    # Mantido para compatibilidade: usa a fila e espera o resultado
+    job_id = fila_relatorios.submeter("vendas", dados_relatorio("vendas", inicio, fim, db))
+    return pdf_da_fila(job_id)
 
 # --- NOVO: Endpoint PDF Estoque Valorado ---
 @app.get("/relatorios/estoque_pdf")
-def relatorio_estoque_pdf(db: Session = Depends(get_db)):
-    prods = db.query(Produto).all()
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    elements.append(Paragraph("Relatório de Estoque Valorado", styles['Title']))
-    elements.append(Spacer(1, 12))
-    
-    data = [["Produto", "Local", "Qtd", "Custo", "Total"]]
-    total_geral = 0
-    for p in prods:
-        subtotal = p.estoque_atual * p.custo
-        total_geral += subtotal
-        data.append([
-            p.nome,
-            p.localizacao,
-            f"{p.estoque_atual:.2f}",
-            f"R$ {p.custo:.2f}",
-            f"R$ {subtotal:.2f}"
-        ])
-    
-    data.append(["", "", "", "TOTAL:", f"R$ {total_geral:.2f}"])
-    
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    elements.append(t)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type="application/pdf")
+def relatorio_estoque_pdf(db: Session = Depends(get_db_leitura)):
+    job_id = fila_relatorios.submeter("estoque", dados_relatorio("estoque", None, None, db))
+    return pdf_da_fila(job_id)
 
 # --- ENDPOINTS ANTIGOS MANTIDOS ---
 @app.post("/formulas/")
@@ -469,7 +647,7 @@ def add_item_formula(i: FormulaItemBase, db: Session = Depends(get_db)):
     db.add(novo); db.commit()
     return novo
 
-@app.get("/formulas/")
+@app.get("/formulas/", dependencies=[Depends(versoes.etag("formulas", "formula_itens"))])
 def listar_formulas(db: Session = Depends(get_db)):
     return db.query(Formula).all()
 
@@ -481,44 +659,39 @@ def deletar_item_formula(id: int, db: Session = Depends(get_db)):
 
 @app.post("/planejamento/calcular/")
 def calcular_mrp(formula_id: int, quantidade_producao: float, db: Session = Depends(get_db)):
-    itens = db.query(FormulaItem).filter(FormulaItem.formula_id == formula_id).all()
-    resultado = []
-    custo_total = 0
-    for item in itens:
-        mp = db.query(Produto).filter(Produto.id == item.materia_prima_id).first()
-        necessario = item.quantidade * quantidade_producao
-        custo_parcial = necessario * mp.custo
-        custo_total += custo_parcial
-        resultado.append({
-            "id": item.id,
-            "ingrediente": mp.nome,
-            "unidade": mp.unidade,
-            "necessario": necessario,
-            "custo_unit": mp.custo,
-            "subtotal": custo_parcial
-        })
-    return {"materiais": resultado, "custo_total": custo_total}
+    # Explosão multinível (semiacabados com fórmula própria) sobre o grafo pré-carregado
+    try: return GrafoBOM.carregar_subgrafo(db, Formula, FormulaItem, Produto, formula_id).calcular(formula_id, quantidade_producao)
+    except ValueError as e: raise HTTPException(400, str(e))
+
+@app.post("/planejamento/lote/")
+def calcular_mrp_lote(plano: PlanoLote, db: Session = Depends(get_db_leitura)):
+    # Plano da semana inteiro de uma vez: totais, faltas e disputa entre fórmulas
+    try: return GrafoBOM.carregar(db, Formula, FormulaItem, Produto).planejar([(i.formula_id, i.quantidade) for i in plano.itens])
+    except ValueError as e: raise HTTPException(400, str(e))
 
 @app.post("/producao/confirmar_lote/")
 def confirmar_producao(p: ProducaoConfirmacao, db: Session = Depends(get_db)):
+    # Uma transação só: materiais carregados numa consulta, baixas em executemany, Kardex no
+    # buffer do diário (executemany no commit) e um único commit no fim; erro desfaz a OP inteira
     formula = db.query(Formula).filter(Formula.id == p.formula_id).first()
-    produto_final = db.query(Produto).filter(Produto.id == formula.produto_final_id).first()
-    itens = db.query(FormulaItem).filter(FormulaItem.formula_id == p.formula_id).all()
-    for item in itens:
-        mp = db.query(Produto).filter(Produto.id == item.materia_prima_id).first()
-        qtd_necessaria = item.quantidade * p.quantidade
-        mp.estoque_atual -= qtd_necessaria
-        registrar_kardex(db, mp.id, f"Produção Lote {p.lote_final}", -qtd_necessaria)
-    produto_final.estoque_atual += p.quantidade
-    registrar_kardex(db, produto_final.id, f"Entrada Produção {p.lote_final}", p.quantidade)
-    hist = ProducaoHistorico(formula_id=p.formula_id, produto_nome=produto_final.nome, quantidade_produzida=p.quantidade, lote_gerado=p.lote_final)
-    db.add(hist)
-    novo_lote = Lote(produto_id=produto_final.id, codigo_lote=p.lote_final, quantidade_inicial=p.quantidade, quantidade_atual=p.quantidade, validade=p.validade_final)
-    db.add(novo_lote)
+    if not formula: raise HTTPException(404, "Fórmula não encontrada")
+    itens = db.query(FormulaItem.materia_prima_id, FormulaItem.quantidade).filter(FormulaItem.formula_id == p.formula_id).all()
+    consumo = defaultdict(float)
+    for mp_id, qtd in itens: consumo[mp_id] += (qtd or 0) * p.quantidade
+    ids = set(consumo) | {formula.produto_final_id}
+    produtos = dict(db.query(Produto.id, Produto.nome).filter(Produto.id.in_(ids)).all())
+    faltando = ids - produtos.keys()
+    if faltando: raise HTTPException(400, f"Produtos não encontrados: {sorted(faltando)}")
+    movimentos = [{"produto_id": mp_id, "qtd": -qtd} for mp_id, qtd in consumo.items()] + [{"produto_id": formula.produto_final_id, "qtd": p.quantidade}]
+    db.execute(update(Produto.__table__).where(Produto.id == bindparam("produto_id")).values(estoque_atual=Produto.estoque_atual + bindparam("qtd")), movimentos)
+    for mp_id, qtd in consumo.items(): registrar_kardex(db, mp_id, f"Produção Lote {p.lote_final}", -qtd)
+    registrar_kardex(db, formula.produto_final_id, f"Entrada Produção {p.lote_final}", p.quantidade)
+    db.add(ProducaoHistorico(formula_id=p.formula_id, produto_nome=produtos[formula.produto_final_id], quantidade_produzida=p.quantidade, lote_gerado=p.lote_final))
+    db.add(Lote(produto_id=formula.produto_final_id, codigo_lote=p.lote_final, quantidade_inicial=p.quantidade, quantidade_atual=p.quantidade, validade=p.validade_final))
     db.commit()
     return {"msg": "Produção Confirmada"}
 
-@app.get("/producao/historico/")
+@app.get("/producao/historico/", dependencies=[Depends(versoes.etag("producao_historico"))])
 def historico_producao(db: Session = Depends(get_db)):
     return db.query(ProducaoHistorico).order_by(ProducaoHistorico.id.desc()).all()
 
@@ -528,7 +701,7 @@ def criar_pedido_compra(c: CompraBase, db: Session = Depends(get_db)):
     db.add(novo); db.commit()
     return novo
 
-@app.get("/compras")
+@app.get("/compras", dependencies=[Depends(versoes.etag("compras"))])
 def listar_compras(db: Session = Depends(get_db)):
     return db.query(Compra).order_by(Compra.id.desc()).all()
 
@@ -543,7 +716,7 @@ def receber_compra(id: int, dados: ProcessarCompra, db: Session = Depends(get_db
         registrar_kardex(db, prod.id, f"Compra #{id}", compra.quantidade)
         lote = Lote(produto_id=prod.id, codigo_lote=dados.lote, quantidade_inicial=compra.quantidade, quantidade_atual=compra.quantidade, validade=dados.validade)
         db.add(lote)
-        fin = LancamentoFinanceiro(descricao=f"Compra MP Pedido #{id}", tipo="Despesa", categoria="Matéria Prima", valor=compra.quantidade*compra.valor_unitario, data_vencimento=str(date.today()))
+        fin = LancamentoFinanceiro(descricao=f"Compra MP Pedido #{id}", tipo="Despesa", categoria="Matéria Prima", valor=compra.quantidade*compra.valor_unitario, data_vencimento=date.today())
         db.add(fin)
         db.commit()
     return {"ok": True}
@@ -603,7 +776,7 @@ def criar_fornecedor(f: FornecedorBase, db: Session = Depends(get_db)):
     db.add(novo); db.commit(); db.refresh(novo)
     return novo
 
-@app.get("/fornecedores/")
+@app.get("/fornecedores/", dependencies=[Depends(versoes.etag("fornecedores"))])
 def listar_fornecedores(db: Session = Depends(get_db)):
     return db.query(Fornecedor).all()
 
@@ -613,7 +786,7 @@ def criar_cotacao(c: CotacaoBase, db: Session = Depends(get_db)):
     db.add(novo); db.commit()
     return novo
 
-@app.get("/cotacoes/")
+@app.get("/cotacoes/", dependencies=[Depends(versoes.etag("cotacoes"))])
 def listar_cotacoes(db: Session = Depends(get_db)):
     return db.query(Cotacao).all()
 
@@ -622,7 +795,7 @@ def ver_kardex(db: Session = Depends(get_db)):
     return db.query(Kardex).order_by(Kardex.id.desc()).all()
 
 @app.get("/relatorios/estoque/")
-def relatorio_estoque(db: Session = Depends(get_db)):
+def relatorio_estoque(db: Session = Depends(get_db_leitura)):
     prods = db.query(Produto).all()
     itens = []
     for p in prods:
@@ -630,38 +803,50 @@ def relatorio_estoque(db: Session = Depends(get_db)):
     return {"itens": itens}
 
 @app.get("/relatorios/lotes_vencimento/")
-def relatorio_lotes(db: Session = Depends(get_db)):
-    return db.query(Lote).all()
+def relatorio_lotes(dias: Optional[int] = Query(None, ge=0), db: Session = Depends(get_db_leitura)):
+    # Lotes com saldo vencendo em até N dias (vencidos inclusos): JOIN único pelo índice parcial de validade
+    hoje = date.today()
+    q = db.query(Lote.id, Lote.codigo_lote, Lote.validade, Lote.quantidade_atual, Produto.id.label("produto_id"), Produto.nome).join(Produto, Produto.id == Lote.produto_id).filter(Lote.quantidade_atual > literal_column("0"))
+    if dias is not None: q = q.filter(Lote.validade <= hoje + timedelta(days=dias))
+    return [{"id": l.id, "produto_id": l.produto_id, "produto": l.nome, "codigo_lote": l.codigo_lote, "validade": l.validade, "dias_para_vencer": (l.validade - hoje).days if l.validade else None, "quantidade_atual": l.quantidade_atual} for l in q.order_by(Lote.validade.asc()).all()]
 
 @app.get("/crm/oportunidades")
-def crm_oportunidades(db: Session = Depends(get_db)):
-    clientes = db.query(Cliente).all()
-    resultado = []
-    for c in clientes:
-        ultima_venda = db.query(Venda).filter(Venda.cliente_id == c.id).order_by(Venda.data_venda.desc()).first()
-        if ultima_venda:
-            dias = (datetime.now() - ultima_venda.data_venda).days
-            if dias > 25: 
-                prod = db.query(Produto).filter(Produto.id == ultima_venda.produto_id).first()
-                resultado.append({
-                    "Cliente": c.nome,
-                    "Telefone": c.telefone,
-                    "Último Produto": prod.nome,
-                    "Dias sem Comprar": dias,
-                    "Status": "Risco de Perda"
-                })
-    return resultado
-
-@app.get("/sistema/backup/")
+def crm_oportunidades(dias_min: int = 26, dias_max: Optional[int] = None, offset: int = 0, limit: int = 200, db: Session = Depends(get_db)):
+    # Uma varredura por intervalo no índice de data_ultima_compra
+    agora = datetime.now()
+    q = db.query(ClienteUltimaCompra.data_ultima_compra, Cliente.nome, Cliente.telefone, Produto.nome.label("produto")).join(Cliente, Cliente.id == ClienteUltimaCompra.cliente_id).join(Produto, Produto.id == ClienteUltimaCompra.produto_id)
+    q = q.filter(ClienteUltimaCompra.data_ultima_compra <= agora - timedelta(days=dias_min))
+    if dias_max is not None: q = q.filter(ClienteUltimaCompra.data_ultima_compra > agora - timedelta(days=dias_max + 1))
+    linhas = q.order_by(ClienteUltimaCompra.data_ultima_compra.desc(), ClienteUltimaCompra.cliente_id.desc()).offset(offset).limit(limit).all()
+    return [{
+        "Cliente": l.nome,
+        "Telefone": l.telefone,
+        "Último Produto": l.produto,
+        "Dias sem Comprar": (agora - l.data_ultima_compra).days,
+        "Status": "Risco de Perda"
+    } for l in linhas]
+
+@app.get("/sistema/backup/", dependencies=[Depends(somente_diretor)])
 def baixar_backup():
-    if os.path.exists("decant_erp.db"):
-        return StreamingResponse(open("decant_erp.db", "rb"), media_type="application/octet-stream")
-    raise HTTPException(404, "Banco não encontrado")
+    # Snapshot consistente pela API de backup do sqlite, compactado durante o envio
+    if not os.path.exists(backups.banco): raise HTTPException(404, "Banco não encontrado")
+    headers = {"Content-Disposition": f'attachment; filename="{backups.nome()}"'}
+    return StreamingResponse(backups.stream(), media_type="application/gzip", headers=headers)
+
+@app.get("/sistema/backups/", dependencies=[Depends(somente_diretor)])
+def listar_backups():
+    return backups.listar()
+
+@app.post("/sistema/backups/", dependencies=[Depends(somente_diretor)])
+def criar_backup():
+    caminho = backups.criar()
+    return {"arquivo": os.path.basename(caminho), "verificacao": backups.verificar(caminho)["detalhe"]}
 
-@app.delete("/sistema/resetar_dados/")
+@app.delete("/sistema/resetar_dados/", dependencies=[Depends(somente_diretor)])
 def resetar_tudo(db: Session = Depends(get_db)):
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    versoes.invalidar(Base.metadata.tables) # drop/create não passam pelos listeners da sessão
     hash_admin = pwd_context.hash("123")
     admin = Usuario(username="admin", senha_hash=hash_admin, cargo="Diretor")
     db.add(admin)
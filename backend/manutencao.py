@@ -0,0 +1,31 @@
+import argparse
+from datetime import datetime
+from backend.database import SessionLocal, engine, Base, garantir_colunas, garantir_indices
+from backend.crm import reconstruir_ultima_compra
+from backend.financeiro import reconstruir_resumo_mensal
+from backend.kardex import historico_estoque
+
+# Uso: python -m backend.manutencao <comando>
+COMANDOS = {
+    "resumo-financeiro": reconstruir_resumo_mensal,
+    "ultima-compra": reconstruir_ultima_compra,
+    # agendar no início de cada mês; em UTC, como as datas do diário de movimentações
+    "checkpoint-estoque": lambda db: historico_estoque.gerar_pendentes(db, datetime.utcnow()),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção do banco do Decant ERP")
+    parser.add_argument("comando", choices=list(COMANDOS))
+    args = parser.parse_args()
+    Base.metadata.create_all(bind=engine)
+    garantir_colunas(Base.metadata, engine)
+    garantir_indices(Base.metadata, engine)
+    db = SessionLocal()
+    try:
+        COMANDOS[args.comando](db)
+        print(f"{args.comando}: OK")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Date, Index, text
 from sqlalchemy.orm import relationship
 from backend.database import Base
 from datetime import datetime
@@ -21,6 +21,14 @@ class Lancamento(Base):
     pago = Column(Boolean, default=False)
     data_pagamento = Column(Date, nullable=True)
 
+class ResumoFinanceiroMensal(Base):
+    # Totais por (ano, mês, tipo) mantidos na mesma transação dos lançamentos de origem
+    __tablename__ = "financeiro_mensal"
+    ano = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    tipo = Column(String, primary_key=True) # venda, compra, receita, despesa
+    valor = Column(Float, default=0.0)
+
 class Produto(Base):
     __tablename__ = "produtos"
     id = Column(Integer, primary_key=True, index=True)
@@ -35,9 +43,14 @@ class Lote(Base):
     id = Column(Integer, primary_key=True, index=True)
     produto_id = Column(Integer, ForeignKey("produtos.id"))
     codigo = Column(String)
-    validade = Column(String)
+    validade = Column(Date)
     quantidade_atual = Column(Float)
     data_entrada = Column(DateTime, default=datetime.utcnow)
+    # FEFO e relatório de vencimento: índices parciais só com lotes que ainda têm saldo
+    __table_args__ = (
+        Index("ix_lotes_fefo", "produto_id", "validade", sqlite_where=text("quantidade_atual > 0")),
+        Index("ix_lotes_validade_saldo", "validade", sqlite_where=text("quantidade_atual > 0")),
+    )
 
 class Movimentacao(Base):
     __tablename__ = "movimentacoes"
@@ -48,6 +61,18 @@ class Movimentacao(Base):
     origem = Column(String)
     data = Column(DateTime, default=datetime.utcnow)
     usuario = Column(String)
+    # Paginação keyset do Kardex por (data, id), com ou sem filtro de produto
+    __table_args__ = (
+        Index("ix_movimentacoes_data_id", "data", "id"),
+        Index("ix_movimentacoes_produto_data_id", "produto_id", "data", "id"),
+    )
+
+class EstoqueCheckpoint(Base):
+    # Saldo por produto com os movimentos anteriores a "data" (gerado todo início de mês)
+    __tablename__ = "estoque_checkpoints"
+    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    data = Column(DateTime, primary_key=True)
+    saldo = Column(Float, default=0.0)
 
 class Fornecedor(Base):
     __tablename__ = "fornecedores"
@@ -62,6 +87,13 @@ class Cliente(Base):
     email = Column(String)
     telefone = Column(String)
 
+class ClienteUltimaCompra(Base):
+    # Resumo mantido pelo PDV: última compra de cada cliente (alimenta o CRM)
+    __tablename__ = "clientes_ultima_compra"
+    cliente_id = Column(Integer, ForeignKey("clientes.id"), primary_key=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id"))
+    data_ultima_compra = Column(DateTime, index=True)
+
 class Cotacao(Base):
     __tablename__ = "cotacoes"
     id = Column(Integer, primary_key=True, index=True)
@@ -73,13 +105,13 @@ class Formula(Base):
     __tablename__ = "formulas"
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String)
-    produto_final_id = Column(Integer, ForeignKey("produtos.id"))
+    produto_final_id = Column(Integer, ForeignKey("produtos.id"), index=True)
     itens = relationship("FormulaItem", back_populates="formula")
 
 class FormulaItem(Base):
     __tablename__ = "formula_itens"
     id = Column(Integer, primary_key=True, index=True)
-    formula_id = Column(Integer, ForeignKey("formulas.id"))
+    formula_id = Column(Integer, ForeignKey("formulas.id"), index=True)
     materia_prima_id = Column(Integer, ForeignKey("produtos.id"))
     quantidade = Column(Float)
     formula = relationship("Formula", back_populates="itens")
@@ -93,6 +125,7 @@ class PedidoCompra(Base):
     quantidade = Column(Float)
     valor_unitario = Column(Float)
     status = Column(String)
+    data_recebimento = Column(DateTime, nullable=True)
 
 class OrdemProducao(Base):
     __tablename__ = "ordens_producao"
@@ -112,4 +145,4 @@ class Venda(Base):
     valor_total = Column(Float)
     metodo_pagamento = Column(String) # NOVO: Pix, Crédito, Débito
     venda_agrupada_id = Column(String) # NOVO: ID único do Carrinho
-    data_venda = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    data_venda = Column(DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
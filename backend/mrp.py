@@ -0,0 +1,157 @@
+from collections import defaultdict
+import numpy as np
+
+# --- EXPLOSÃO MULTINÍVEL DA ESTRUTURA (BOM) ---
+# Um ingrediente que também tem Formula (ex.: base de fragrância) é explodido nos
+# seus próprios itens. O grafo (inteiro ou só o alcançável a partir de uma fórmula)
+# é carregado em poucas consultas e percorrido em memória: nada de query por item.
+class GrafoBOM:
+    def __init__(self, formulas, itens, produtos):
+        self.produto_da_formula = {fid: pid for fid, pid, _ in formulas}
+        self.nome_formula = {fid: nome for fid, _, nome in formulas}
+        self.formula_do_produto = {}  # produto -> fórmula que o produz (a de menor id)
+        for fid, pid, _ in sorted(formulas): self.formula_do_produto.setdefault(pid, fid)
+        self.itens = defaultdict(list)  # fórmula -> [(item_id, materia_prima_id, qtd por unidade)]
+        for iid, fid, mp, qtd in itens: self.itens[fid].append((iid, mp, qtd or 0.0))
+        self.produtos = produtos  # id -> linha (nome, unidade, estoque_atual, custo)
+        self._unitario = {}
+
+    @classmethod
+    def _montar(cls, db, Produto, formulas, itens):
+        ids = {pid for _, pid, _ in formulas} | {mp for _, _, mp, _ in itens}
+        produtos = {p.id: p for p in db.query(Produto.id, Produto.nome, Produto.unidade, Produto.estoque_atual, Produto.custo).filter(Produto.id.in_(ids))} if ids else {}
+        return cls(formulas, itens, produtos)
+
+    @classmethod
+    def carregar(cls, db, Formula, FormulaItem, Produto):
+        # Grafo inteiro (plano em lote). Recebe os modelos: main.py e backend/main.py têm
+        # tabelas próprias com as mesmas colunas
+        formulas = db.query(Formula.id, Formula.produto_final_id, Formula.nome).all()
+        itens = db.query(FormulaItem.id, FormulaItem.formula_id, FormulaItem.materia_prima_id, FormulaItem.quantidade).all()
+        return cls._montar(db, Produto, formulas, itens)
+
+    @classmethod
+    def carregar_subgrafo(cls, db, Formula, FormulaItem, Produto, formula_id):
+        # Só o que é alcançável a partir de formula_id (cálculo de uma fórmula): por nível da
+        # BOM, uma consulta de itens e uma das fórmulas que produzem esses ingredientes
+        colunas_formula = (Formula.id, Formula.produto_final_id, Formula.nome)
+        formulas = {f.id: f for f in db.query(*colunas_formula).filter(Formula.id == formula_id)}
+        itens, fronteira, vistos = [], set(formulas), set()
+        carregadas = set(fronteira)
+        while fronteira:
+            nivel = db.query(FormulaItem.id, FormulaItem.formula_id, FormulaItem.materia_prima_id, FormulaItem.quantidade).filter(FormulaItem.formula_id.in_(fronteira)).all()
+            itens += nivel
+            novos = {mp for _, _, mp, _ in nivel} - vistos
+            vistos |= novos
+            if not novos: break
+            escolhida = {}  # produto -> fórmula que o produz (a de menor id, como no grafo inteiro)
+            for f in sorted(db.query(*colunas_formula).filter(Formula.produto_final_id.in_(novos))):
+                escolhida.setdefault(f.produto_final_id, f.id)
+                formulas.setdefault(f.id, f)
+            fronteira = set(escolhida.values()) - carregadas
+            carregadas |= fronteira
+        return cls._montar(db, Produto, list(formulas.values()), itens)
+
+    def _nome(self, pid):
+        p = self.produtos.get(pid)
+        return p.nome if p else f"#{pid}"
+
+    def ordem_topologica(self, formula_id):
+        # DFS a partir da fórmula: devolve os componentes com pais antes dos filhos
+        # e acusa ciclo (A usa B que usa A) em vez de recursar para sempre
+        raiz = self.produto_da_formula.get(formula_id)
+        estado, pilha, ordem = {raiz: 1}, [raiz], []
+        def visitar(pid):
+            if estado.get(pid) == 1:
+                ciclo = pilha[pilha.index(pid):] + [pid]
+                raise ValueError("Ciclo na estrutura: " + " -> ".join(self._nome(p) for p in ciclo))
+            if estado.get(pid) == 2: return
+            estado[pid] = 1; pilha.append(pid)
+            for _, mp, _ in self.itens.get(self.formula_do_produto.get(pid), []): visitar(mp)
+            pilha.pop(); estado[pid] = 2; ordem.append(pid)
+        for _, mp, _ in self.itens.get(formula_id, []): visitar(mp)
+        return ordem[::-1]
+
+    def unitario(self, formula_id, _em_curso=()):
+        # Matérias-primas (folhas) por 1 unidade produzida, sem abater estoque; memoizado por fórmula
+        if formula_id in self._unitario: return self._unitario[formula_id]
+        if formula_id in _em_curso: self.ordem_topologica(formula_id)  # levanta o erro com o caminho do ciclo
+        em_curso = _em_curso + (formula_id,)
+        total = defaultdict(float)
+        for _, mp, qtd in self.itens.get(formula_id, []):
+            sub = self.formula_do_produto.get(mp)
+            if sub is None: total[mp] += qtd
+            else:
+                for folha, q in self.unitario(sub, em_curso).items(): total[folha] += qtd * q
+        self._unitario[formula_id] = dict(total)
+        return self._unitario[formula_id]
+
+    def explodir(self, formula_id, quantidade):
+        # Necessidade bruta -> líquida nível a nível: em ordem topológica cada componente
+        # já recebeu a demanda de todos os pais quando é abatido do estoque, e só o
+        # líquido de um semiacabado desce para os seus ingredientes
+        ordem = self.ordem_topologica(formula_id)
+        nivel, bruto = {}, defaultdict(float)
+        for _, mp, qtd in self.itens.get(formula_id, []):
+            nivel[mp] = 1; bruto[mp] += qtd * quantidade
+        linhas = []
+        for pid in ordem:
+            p = self.produtos.get(pid)
+            if p is None: continue
+            estoque = max(p.estoque_atual or 0.0, 0.0)
+            liquido = max(bruto[pid] - estoque, 0.0)
+            sub = self.formula_do_produto.get(pid)
+            for _, mp, qtd in self.itens.get(sub, []):
+                nivel[mp] = max(nivel.get(mp, 0), nivel[pid] + 1)
+                bruto[mp] += qtd * liquido
+            linhas.append({"nivel": nivel[pid], "produto_id": pid, "ingrediente": p.nome, "unidade": p.unidade, "bruto": bruto[pid], "estoque": p.estoque_atual, "liquido": liquido, "acao": "Produzir" if sub is not None else "Comprar", "custo_unit": p.custo, "subtotal": liquido * (p.custo or 0.0), "status": "OK" if liquido <= 0 else "FALTA"})
+        return sorted(linhas, key=lambda l: l["nivel"])
+
+    def calcular(self, formula_id, quantidade):
+        # Resposta do /planejamento/calcular/: "materiais" segue sendo o 1º nível (com id do
+        # FormulaItem, usado na edição da ficha); "explosao" traz todos os níveis
+        materiais = []; custo_total = 0.0
+        for iid, mp, qtd in self.itens.get(formula_id, []):
+            p = self.produtos.get(mp)
+            if p is None: continue
+            necessario = qtd * quantidade; custo = (p.custo or 0.0) * necessario; custo_total += custo
+            materiais.append({"id": iid, "ingrediente": p.nome, "necessario": necessario, "unidade": p.unidade, "estoque": p.estoque_atual, "custo_unit": p.custo, "subtotal": custo, "status": "OK" if p.estoque_atual >= necessario else "FALTA"})
+        return {"producao": quantidade, "materiais": materiais, "custo_total": custo_total, "explosao": self.explodir(formula_id, quantidade)}
+
+    # --- PLANO EM LOTE (vetorizado) ---
+    def planejar(self, plano):
+        # plano: [(formula_id, quantidade)]. Monta a matriz fórmula x matéria-prima com as
+        # necessidades unitárias já explodidas até as folhas; necessidade total, falta e
+        # custo saem de produtos matriciais em vez de uma chamada por fórmula.
+        # Semiacabados em estoque não são abatidos aqui (plano bruto, conservador).
+        quantidades = defaultdict(float)
+        for fid, qtd in plano:
+            if fid not in self.produto_da_formula: raise ValueError(f"Fórmula {fid} não encontrada")
+            quantidades[fid] += qtd
+        formulas = list(quantidades)
+        unitarios = [self.unitario(fid) for fid in formulas]
+        materiais = sorted({mp for u in unitarios for mp in u})
+        col = {mp: j for j, mp in enumerate(materiais)}
+        U = np.zeros((len(formulas), len(materiais)))
+        for i, u in enumerate(unitarios):
+            for mp, q in u.items(): U[i, col[mp]] = q
+        q = np.array([quantidades[fid] for fid in formulas])
+        produtos = [self.produtos.get(mp) for mp in materiais]
+        estoque = np.array([max(p.estoque_atual or 0.0, 0.0) if p else 0.0 for p in produtos])
+        custo = np.array([(p.custo or 0.0) if p else 0.0 for p in produtos])
+        total = q @ U
+        falta = np.maximum(total - estoque, 0.0)
+        custo_formula = q * (U @ custo)
+        # Disputa: quanto cada fórmula consome das matérias-primas que vão faltar
+        faltantes = np.nonzero(falta > 1e-9)[0]
+        demanda = U[:, faltantes] * q[:, None]
+        linhas = []
+        for j, mp in enumerate(materiais):
+            p = produtos[j]
+            linhas.append({"produto_id": mp, "ingrediente": p.nome if p else f"#{mp}", "unidade": p.unidade if p else None, "necessario": float(total[j]), "estoque": float(estoque[j]), "falta": float(falta[j]), "custo_unit": float(custo[j]), "subtotal": float(total[j] * custo[j]), "status": "FALTA" if falta[j] > 1e-9 else "OK"})
+        ids = np.array(formulas)
+        for k, j in enumerate(faltantes):
+            usa = np.nonzero(demanda[:, k])[0]
+            linhas[j]["consumo_por_formula"] = dict(zip(ids[usa].tolist(), demanda[usa, k].tolist()))  # {formula_id: quantidade}
+        itens = [{"formula_id": fid, "formula": self.nome_formula.get(fid), "quantidade": float(q[i]), "custo": float(custo_formula[i])} for i, fid in enumerate(formulas)]
+        return {"itens": itens, "materiais": linhas, "custo_total": float(custo_formula.sum())}
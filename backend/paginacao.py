@@ -0,0 +1,62 @@
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Query, Response
+
+# --- CURSOR KEYSET ---
+# O cursor é a chave de ordenação da última linha entregue: "<data iso>_<id>"
+def codificar_cursor(data: datetime, id: int) -> str:
+    return f"{data.isoformat()}_{id}"
+
+def decodificar_cursor(cursor: str):
+    try:
+        data, id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(data), int(id)
+    except ValueError:
+        raise ValueError(f"Cursor inválido: {cursor}")
+
+# --- RESPOSTA EM STREAMING ---
+def stream_json(linhas):
+    # Serializa linha a linha em vez de montar a lista inteira em memória
+    yield "["
+    for i, linha in enumerate(linhas):
+        yield ("," if i else "") + json.dumps(linha, ensure_ascii=False, default=str)
+    yield "]"
+
+# --- PAGINAÇÃO POR ID + PROJEÇÃO DE CAMPOS ---
+LIMITE_MAXIMO_LISTA = 5000
+
+def colunas_projecao(modelo, fields: Optional[str]):
+    # "fields=id,nome" -> só essas colunas no SELECT
+    if not fields: return None
+    nomes = [f.strip() for f in fields.split(",") if f.strip()]
+    colunas = modelo.__table__.columns
+    invalidos = [n for n in nomes if n not in colunas]
+    if invalidos: raise ValueError(f"Campos inválidos: {', '.join(invalidos)}. Disponíveis: {', '.join(colunas.keys())}")
+    return nomes
+
+def pagina_por_id(db, modelo, after: Optional[int] = None, limit: Optional[int] = None, fields: Optional[str] = None, decrescente: bool = False):
+    # Keyset pelo id (PK): sem limit devolve tudo, como antes; com limit, o cursor é o último id
+    nomes = colunas_projecao(modelo, fields)
+    q = db.query(*[modelo.__table__.columns[n] for n in nomes], modelo.id.label("_cursor")) if nomes else db.query(modelo)
+    if after is not None: q = q.filter(modelo.id < after if decrescente else modelo.id > after)
+    q = q.order_by(modelo.id.desc() if decrescente else modelo.id)
+    if limit: q = q.limit(limit + 1)
+    linhas = q.all()
+    proximo = None
+    if limit and len(linhas) > limit:
+        linhas = linhas[:limit]
+        proximo = str(linhas[-1]._cursor if nomes else linhas[-1].id)
+    if nomes: linhas = [{n: getattr(l, n) for n in nomes} for l in linhas]
+    return linhas, proximo
+
+class ParametrosPagina:
+    # Dependência comum das listagens: ?after=<id>&limit=N&fields=a,b -> header X-Next-Cursor
+    def __init__(self, response: Response, after: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO_LISTA), fields: Optional[str] = None):
+        self.response, self.after, self.limit, self.fields = response, after, limit, fields
+
+    def listar(self, db, modelo, decrescente: bool = False):
+        try: linhas, proximo = pagina_por_id(db, modelo, self.after, self.limit, self.fields, decrescente)
+        except ValueError as e: raise HTTPException(400, str(e))
+        if proximo: self.response.headers["X-Next-Cursor"] = proximo
+        return linhas
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+# --- FILA DE RELATÓRIOS ---
+# submeter() devolve um job_id na hora; o PDF é gerado num pool de processos
+# (fora das threads que atendem a API) e fica em disco até expirar o TTL.
+PASTA_PADRAO = os.getenv("RELATORIOS_DIR", os.path.join(tempfile.gettempdir(), "decant_relatorios"))
+TTL_PADRAO = int(os.getenv("RELATORIOS_TTL_SEGUNDOS", "3600"))
+WORKERS_PADRAO = int(os.getenv("RELATORIOS_WORKERS", "2"))
+
+class FilaRelatorios:
+    def __init__(self, funcao, pasta=PASTA_PADRAO, ttl=TTL_PADRAO, workers=WORKERS_PADRAO):
+        self.funcao = funcao # funcao(tipo, args, caminho): precisa ser importável (picklable)
+        self.pasta = pasta
+        self.ttl = ttl
+        self.workers = workers
+        self._pool = None
+        self._jobs = {}
+        self._futuros = {}
+        self._lock = Lock()
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def _obter_pool(self):
+        if self._pool is None: self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def submeter(self, tipo: str, args: tuple) -> str:
+        self.limpar_expirados()
+        job_id = uuid.uuid4().hex
+        caminho = os.path.join(self.pasta, f"{job_id}.pdf")
+        job = {"job_id": job_id, "tipo": tipo, "status": "processando", "criado_em": time.time(), "concluido_em": None, "erro": None, "caminho": caminho}
+        with self._lock:
+            self._jobs[job_id] = job
+            futuro = self._obter_pool().submit(self.funcao, tipo, args, caminho)
+            self._futuros[job_id] = futuro
+        futuro.add_done_callback(lambda f: self._finalizar(job_id, f))
+        return job_id
+
+    def _finalizar(self, job_id, futuro):
+        with self._lock:
+            self._futuros.pop(job_id, None)
+            job = self._jobs.get(job_id)
+            if job is None: return
+            job["concluido_em"] = time.time()
+            erro = futuro.exception()
+            if erro is None: job["status"] = "concluido"
+            else: job["status"] = "erro"; job["erro"] = str(erro)
+
+    def aguardar(self, job_id: str, timeout=None):
+        # Para os endpoints síncronos antigos: espera o pool sem renderizar na thread da API.
+        # Não depende do status: _finalizar é callback e roda depois de result() acordar quem espera.
+        # Erro do worker sobe como exceção; None = job inexistente/expirado.
+        with self._lock: futuro = self._futuros.get(job_id); job = self._jobs.get(job_id)
+        if job is None: return None
+        if futuro is not None:
+            futuro.result(timeout)
+            return job["caminho"]
+        if job["status"] == "erro": raise RuntimeError(job["erro"])
+        return self.arquivo(job_id)
+
+    def consultar(self, job_id: str):
+        self.limpar_expirados()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None: return None
+            info = {k: v for k, v in job.items() if k != "caminho"}
+        if info["concluido_em"]: info["expira_em"] = info["concluido_em"] + self.ttl
+        return info
+
+    def arquivo(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["status"] == "concluido" and os.path.exists(job["caminho"]): return job["caminho"]
+        return None
+
+    def limpar_expirados(self):
+        agora = time.time()
+        with self._lock:
+            expirados = [j for j in self._jobs.values() if j["concluido_em"] and agora - j["concluido_em"] > self.ttl]
+            for job in expirados: del self._jobs[job["job_id"]]
+        for job in expirados:
+            try: os.remove(job["caminho"])
+            except OSError: pass
@@ -0,0 +1,99 @@
+import io
+import os
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+
+# Renderizadores ReportLab: recebem linhas já prontas (sem sessão de banco),
+# então podem rodar num processo separado do pool de relatórios.
+
+def pdf_vendas(inicio, fim, linhas) -> bytes:
+    # linhas: (id, cliente, produto, quantidade, valor_total)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+    
+    # Título
+    elements.append(Paragraph(f"Relatório de Vendas: {inicio} a {fim}", styles['Title']))
+    elements.append(Spacer(1, 12))
+    
+    # Tabela
+    data = [["ID", "Cliente", "Produto", "Qtd", "Valor (R$)"]] # Cabeçalho
+    total = 0
+    for id, cliente, produto, quantidade, valor_total in linhas:
+        data.append([
+            str(id),
+            cliente or "Desconhecido",
+            produto or "?",
+            str(quantidade),
+            f"{valor_total:.2f}"
+        ])
+        total += valor_total
+    
+    data.append(["", "", "TOTAL:", "", f"{total:.2f}"])
+    
+    t = Table(data, repeatRows=1)
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ]))
+    elements.append(t)
+    
+    doc.build(elements)
+    return buffer.getvalue()
+
+def pdf_estoque(linhas) -> bytes:
+    # linhas: (nome, localizacao, estoque_atual, custo)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+    
+    elements.append(Paragraph("Relatório de Estoque Valorado", styles['Title']))
+    elements.append(Spacer(1, 12))
+    
+    data = [["Produto", "Local", "Qtd", "Custo", "Total"]]
+    total_geral = 0
+    for nome, localizacao, estoque_atual, custo in linhas:
+        subtotal = estoque_atual * custo
+        total_geral += subtotal
+        data.append([
+            nome,
+            localizacao,
+            f"{estoque_atual:.2f}",
+            f"R$ {custo:.2f}",
+            f"R$ {subtotal:.2f}"
+        ])
+    
+    data.append(["", "", "", "TOTAL:", f"R$ {total_geral:.2f}"])
+    
+    t = Table(data, repeatRows=1)
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    elements.append(t)
+    
+    doc.build(elements)
+    return buffer.getvalue()
+
+RENDERIZADORES = {"vendas": pdf_vendas, "estoque": pdf_estoque}
+
+def renderizar_para_arquivo(tipo, args, caminho):
+    # Roda no processo do pool: grava direto no disco em vez de devolver os bytes
+    dados = RENDERIZADORES[tipo](*args)
+    with open(caminho + ".tmp", "wb") as f: f.write(dados)
+    os.replace(caminho + ".tmp", caminho)
+    return len(dados)
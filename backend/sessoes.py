@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+# --- SESSÕES (token de acesso assinado, HS256) ---
+# O bcrypt (100–300 ms de CPU) roda só no login, num pool próprio: uma rajada de
+# logins na troca de turno não prende o event loop nem os workers das outras rotas.
+# Cada chamada autenticada depois só confere a assinatura HMAC do token e a lista
+# de revogados, tudo em memória (microssegundos).
+# Requisito de implantação: TOKEN_SECRET fixo (variável de ambiente). Sem ele a chave
+# é sorteada por processo e a API avisa no log ao subir: os tokens não valem entre
+# workers e todo restart derruba as sessões (os frontends voltam ao login no 401).
+ALGORITMO = "HS256"
+VALIDADE_MINUTOS = int(os.getenv("TOKEN_VALIDADE_MINUTOS", "720"))  # um turno
+WORKERS_HASH = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+
+bearer = HTTPBearer(auto_error=False)
+
+class Sessoes:
+    def __init__(self, pwd_context, chave: str = None, validade_minutos: int = VALIDADE_MINUTOS):
+        self.pwd_context = pwd_context
+        self.chave = chave or os.getenv("TOKEN_SECRET")
+        if not self.chave:
+            self.chave = secrets.token_urlsafe(32)
+            logging.getLogger(__name__).warning("TOKEN_SECRET não definido: chave de sessão temporária; defina TOKEN_SECRET em produção")
+        self.validade = validade_minutos * 60
+        self.pool_hash = ThreadPoolExecutor(max_workers=WORKERS_HASH, thread_name_prefix="bcrypt")
+        self._revogados = {}  # jti -> exp; some sozinho quando o token expiraria de qualquer forma
+        self._lock = threading.Lock()
+
+    # --- HASH (fora do event loop) ---
+    async def _no_pool(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool_hash, fn, *args)
+
+    async def verificar_senha(self, senha, senha_hash):
+        if not senha_hash: return False
+        return await self._no_pool(self.pwd_context.verify, senha, senha_hash)
+
+    async def criar_hash(self, senha):
+        return await self._no_pool(self.pwd_context.hash, senha)
+
+    # --- TOKENS ---
+    def emitir(self, usuario: str, cargo: str):
+        exp = int(time.time()) + self.validade
+        token = jwt.encode({"sub": usuario, "cargo": cargo, "jti": uuid.uuid4().hex, "exp": exp}, self.chave, algorithm=ALGORITMO)
+        return {"access_token": token, "token_type": "bearer", "expira_em": exp}
+
+    def revogar(self, claims: dict):
+        agora = time.time()
+        with self._lock:
+            for jti in [j for j, exp in self._revogados.items() if exp <= agora]: del self._revogados[jti]
+            self._revogados[claims["jti"]] = claims["exp"]
+
+    def validar(self, token: str) -> dict:
+        try: claims = jwt.decode(token, self.chave, algorithms=[ALGORITMO])  # confere assinatura e exp
+        except JWTError: raise HTTPException(401, "Token inválido ou expirado", headers={"WWW-Authenticate": "Bearer"})
+        if claims.get("jti") in self._revogados: raise HTTPException(401, "Sessão encerrada", headers={"WWW-Authenticate": "Bearer"})
+        return claims
+
+    async def usuario_atual(self, credenciais: HTTPAuthorizationCredentials = Depends(bearer)) -> dict:
+        # Dependência async: roda direto no loop, sem pular para o threadpool
+        if credenciais is None: raise HTTPException(401, "Não autenticado", headers={"WWW-Authenticate": "Bearer"})
+        return self.validar(credenciais.credentials)
+
+    def exigir_cargo(self, *cargos):
+        # Dependência: Depends(sessoes.exigir_cargo("Diretor")) -> 401 sem token, 403 com outro cargo
+        async def verificar(claims: dict = Depends(self.usuario_atual)) -> dict:
+            if claims.get("cargo") not in cargos: raise HTTPException(403, "Acesso restrito ao cargo: " + ", ".join(cargos))
+            return claims
+        return verificar
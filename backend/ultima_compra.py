@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import func, insert, select
+
+# --- ÚLTIMA COMPRA POR CLIENTE (resumo do CRM) ---
+# Uma linha por cliente com o produto e a data da compra mais recente: o PDV mantém
+# na mesma transação da venda e o CRM lê por intervalo no índice da data, sem
+# varrer as vendas. reconstruir() refaz tudo a partir das vendas (bancos antigos).
+class UltimaCompra:
+    def __init__(self, resumo, venda):
+        # resumo: modelo (cliente_id PK, produto_id, data_ultima_compra); venda: modelo com cliente_id, produto_id, data_venda
+        self.resumo, self.venda = resumo, venda
+
+    def registrar(self, db, cliente_id: int, produto_id: int, data: datetime):
+        # Chamado pelo PDV na mesma transação da venda
+        resumo = db.get(self.resumo, cliente_id)
+        if resumo is None:
+            db.add(self.resumo(cliente_id=cliente_id, produto_id=produto_id, data_ultima_compra=data))
+        elif resumo.data_ultima_compra is None or data >= resumo.data_ultima_compra:
+            resumo.produto_id = produto_id; resumo.data_ultima_compra = data
+
+    def reconstruir(self, db):
+        # Recalcula o resumo inteiro a partir de vendas (bancos antigos ou correções)
+        V = self.venda
+        ordem = func.row_number().over(partition_by=V.cliente_id, order_by=(V.data_venda.desc(), V.id.desc())).label("ordem")
+        ult = select(V.cliente_id, V.produto_id, V.data_venda, ordem).where(V.cliente_id.isnot(None)).subquery()
+        db.query(self.resumo).delete()
+        db.execute(insert(self.resumo).from_select(["cliente_id", "produto_id", "data_ultima_compra"], select(ult.c.cliente_id, ult.c.produto_id, ult.c.data_venda).where(ult.c.ordem == 1)))
+        db.commit()
@@ -0,0 +1,53 @@
+import hashlib
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import Column, Integer, MetaData, String, Table, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# --- VERSÃO POR TABELA (ETag / If-None-Match) ---
+# Cada escrita feita por uma sessão da fábrica incrementa o contador das tabelas que
+# tocou, na mesma transação. O GET compara o ETag com os contadores (1 SELECT
+# pequeno) e responde 304 sem ler as linhas quando nada mudou.
+metadata_versoes = MetaData()
+tabela_versoes = Table("versoes_tabela", metadata_versoes,
+    Column("tabela", String, primary_key=True),
+    Column("versao", Integer, nullable=False, default=0))
+
+def _incrementar(conexao, tabelas):
+    if not tabelas: return
+    stmt = sqlite_insert(tabela_versoes)
+    stmt = stmt.on_conflict_do_update(index_elements=["tabela"], set_={"versao": tabela_versoes.c.versao + 1})
+    conexao.execute(stmt, [{"tabela": t, "versao": 1} for t in sorted(tabelas)])
+
+class ControleVersoes:
+    def __init__(self, fabrica_sessao, engine):
+        self.engine = engine
+        metadata_versoes.create_all(bind=engine)
+        event.listen(fabrica_sessao, "after_flush", self._apos_flush)
+        event.listen(fabrica_sessao, "do_orm_execute", self._dml)
+
+    def _apos_flush(self, session, contexto):
+        objetos = list(session.new) + list(session.deleted) + [o for o in session.dirty if session.is_modified(o)]
+        _incrementar(session.connection(), {o.__table__.name for o in objetos})
+
+    def _dml(self, estado):
+        # UPDATE/INSERT/DELETE em massa (db.execute(update(...)), query.delete()) não passam pelo flush
+        if estado.is_insert or estado.is_update or estado.is_delete:
+            _incrementar(estado.session.connection(), {estado.statement.table.name})
+
+    def invalidar(self, tabelas):
+        # Para o que não passa pela sessão (drop_all/create_all, SQL cru): força ETag novo
+        with self.engine.begin() as c: _incrementar(c, set(tabelas))
+
+    def versoes(self, tabelas):
+        with self.engine.connect() as c:
+            linhas = dict(c.execute(select(tabela_versoes.c.tabela, tabela_versoes.c.versao).where(tabela_versoes.c.tabela.in_(tabelas))).all())
+        return [linhas.get(t, 0) for t in tabelas]
+
+    def etag(self, *tabelas):
+        # Dependência: Depends(versoes.etag("produtos")) -> header ETag ou 304
+        def verificar(request: Request, response: Response):
+            chave = f"{request.url.path}?{request.url.query}|{self.versoes(tabelas)}"
+            etag = f'W/"{hashlib.sha1(chave.encode()).hexdigest()[:20]}"'
+            if etag in request.headers.get("if-none-match", ""): raise HTTPException(304, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+        return verificar
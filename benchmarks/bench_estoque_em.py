@@ -0,0 +1,72 @@
+# Benchmark: estoque em uma data com milhões de movimentos, replay do razão inteiro vs.
+# checkpoint mensal + movimentos posteriores.
+# Uso: python benchmarks/bench_estoque_em.py [movimentos] [produtos] [meses]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import sessionmaker
+from backend.database import Base, criar_engine
+from backend.kardex import DELTA_MOVIMENTACAO, historico_estoque
+from backend.models import Movimentacao, Produto
+
+MOVIMENTOS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+PRODUTOS = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+MESES = int(sys.argv[3]) if len(sys.argv) > 3 else 24
+CONSULTAS = 20
+
+def popular(engine):
+    rnd = random.Random(7)
+    inicio = datetime(2024, 1, 1)
+    passo = timedelta(days=30 * MESES) / MOVIMENTOS
+    with engine.begin() as conn:
+        conn.execute(insert(Produto), [{"id": i, "nome": f"P{i}", "tipo": "Materia Prima", "unidade": "L", "estoque_atual": 0, "custo": 1} for i in range(1, PRODUTOS + 1)])
+        lote = []
+        for n in range(MOVIMENTOS):
+            lote.append({"produto_id": rnd.randint(1, PRODUTOS), "tipo": "Entrada" if rnd.random() < 0.55 else "Saida", "quantidade": rnd.randint(1, 20), "origem": "bench", "usuario": "bench", "data": inicio + passo * n})
+            if len(lote) == 50_000: conn.execute(insert(Movimentacao), lote); lote = []
+        if lote: conn.execute(insert(Movimentacao), lote)
+    return inicio
+
+def replay(db, dia):
+    # Sem checkpoint: soma todos os movimentos até o fim do dia
+    fim = datetime.combine(dia + timedelta(days=1), datetime.min.time())
+    return dict(db.execute(select(Movimentacao.produto_id, func.sum(DELTA_MOVIMENTACAO)).where(Movimentacao.data < fim).group_by(Movimentacao.produto_id)).all())
+
+def main():
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = criar_engine(f"sqlite:///{os.path.join(pasta, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        t = time.perf_counter(); inicio = popular(engine)
+        print(f"{MOVIMENTOS:,} movimentos, {PRODUTOS} produtos, {MESES} meses (carga {time.perf_counter() - t:.1f}s)")
+        Sessao = sessionmaker(bind=engine)
+        rnd = random.Random(3)
+        dias = [(inicio + timedelta(days=rnd.randint(0, 30 * MESES - 1))).date() for _ in range(CONSULTAS)]
+        with Sessao() as db:
+            t = time.perf_counter(); n = historico_estoque.gerar_pendentes(db, datetime(2030, 1, 1))
+            print(f"checkpoints mensais: {n:,} linhas em {time.perf_counter() - t:.2f}s (uma vez; depois 1 mês por vez)")
+
+            t = time.perf_counter()
+            esperado = [replay(db, d) for d in dias]
+            t_replay = (time.perf_counter() - t) / CONSULTAS
+            t = time.perf_counter()
+            obtido = [historico_estoque.estoque_em(db, d) for d in dias]
+            t_cp = (time.perf_counter() - t) / CONSULTAS
+            t = time.perf_counter()
+            for d in dias: historico_estoque.estoque_em(db, d, produto_id=rnd.randint(1, PRODUTOS))
+            t_um = (time.perf_counter() - t) / CONSULTAS
+
+        for e, o in zip(esperado, obtido):
+            assert all(abs(e.get(l["produto_id"], 0.0) - l["estoque"]) < 1e-6 for l in o), "divergência entre replay e checkpoint"
+        print(f"replay do razão        : {t_replay * 1000:8.1f} ms por data (todos os produtos)")
+        print(f"checkpoint + movimentos: {t_cp * 1000:8.1f} ms por data (todos os produtos)")
+        print(f"checkpoint, 1 produto  : {t_um * 1000:8.1f} ms por data")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
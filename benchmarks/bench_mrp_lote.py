@@ -0,0 +1,84 @@
+# Benchmark: plano de produção com milhares de fórmulas, uma chamada de /planejamento/calcular/ por
+# fórmula vs. uma chamada de /planejamento/lote/ (carrega o grafo inteiro + planejar()).
+# Referências por chamada: a consulta original (joinedload de uma fórmula, só o 1º nível) e o
+# caminho atual (carregar_subgrafo + calcular, multinível). Cada chamada usa sessão nova, como um request.
+# Uso: python benchmarks/bench_mrp_lote.py [formulas] [materias_primas] [itens_por_formula]
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, sessionmaker
+from backend.database import Base, criar_engine
+from backend.models import Formula, FormulaItem, Produto
+from backend.mrp import GrafoBOM
+
+FORMULAS = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+MATERIAS = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+ITENS = int(sys.argv[3]) if len(sys.argv) > 3 else 15
+BASES = 50        # semiacabados com fórmula própria, usados como ingrediente
+AMOSTRA = 20      # chamadas individuais medidas (o total é extrapolado)
+
+def popular(engine):
+    rnd = random.Random(42)
+    total_produtos = MATERIAS + BASES + FORMULAS
+    produtos = [{"id": pid, "nome": f"P{pid}", "tipo": "Materia Prima" if pid <= MATERIAS else "Produto Acabado", "unidade": "L", "estoque_atual": rnd.uniform(0, 5000), "custo": rnd.uniform(1, 50)} for pid in range(1, total_produtos + 1)]
+    materias = list(range(1, MATERIAS + 1))
+    bases = list(range(MATERIAS + 1, MATERIAS + BASES + 1))
+    formulas, itens = [], []
+    for fid, pid in enumerate(range(MATERIAS + 1, total_produtos + 1), start=1):
+        formulas.append({"id": fid, "nome": f"F{fid}", "produto_final_id": pid})
+        ingredientes = rnd.sample(materias, ITENS) + ([rnd.choice(bases)] if pid not in bases else [])
+        itens += [{"formula_id": fid, "materia_prima_id": mp, "quantidade": rnd.uniform(0.01, 2)} for mp in ingredientes]
+    with engine.begin() as conn:
+        conn.execute(insert(Produto), produtos)
+        conn.execute(insert(Formula), formulas)
+        conn.execute(insert(FormulaItem), itens)
+    return [(fid, rnd.uniform(10, 100)) for fid in range(BASES + 1, BASES + FORMULAS + 1)]
+
+def calcular_original(db, formula_id, qtd):
+    # /planejamento/calcular/ antes da explosão multinível
+    f = db.query(Formula).options(joinedload(Formula.itens).joinedload(FormulaItem.materia_prima)).filter(Formula.id == formula_id).first()
+    return [(i.materia_prima.nome, i.quantidade * qtd, i.materia_prima.estoque_atual >= i.quantidade * qtd) for i in f.itens]
+
+def calcular_subgrafo(db, formula_id, qtd):
+    return GrafoBOM.carregar_subgrafo(db, Formula, FormulaItem, Produto, formula_id).calcular(formula_id, qtd)
+
+def por_chamada(Sessao, plano, funcao):
+    t = time.perf_counter()
+    for fid, qtd in plano[:AMOSTRA]:
+        with Sessao() as db: funcao(db, fid, qtd)
+    return (time.perf_counter() - t) / AMOSTRA
+
+def main():
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = criar_engine(f"sqlite:///{os.path.join(pasta, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        plano = popular(engine)
+        Sessao = sessionmaker(bind=engine)
+        print(f"{FORMULAS} fórmulas no plano, {MATERIAS} matérias-primas, ~{ITENS} itens por fórmula")
+
+        referencias = {"consulta original (1 nível)": por_chamada(Sessao, plano, calcular_original), "carregar_subgrafo (multinível)": por_chamada(Sessao, plano, calcular_subgrafo)}
+        for nome, t_chamada in referencias.items():
+            print(f"uma chamada por fórmula, {nome:30}: {t_chamada * 1000:6.1f} ms/chamada -> ~{t_chamada * len(plano):.1f}s para o plano (sem somar faltas)")
+
+        with Sessao() as db:
+            t = time.perf_counter()
+            g = GrafoBOM.carregar(db, Formula, FormulaItem, Produto)
+            t_carga = time.perf_counter() - t
+            res = g.planejar(plano)
+            t_lote = time.perf_counter() - t
+            t = time.perf_counter()
+            for fid, qtd in plano: g.explodir(fid, qtd)
+            t_mem = time.perf_counter() - t
+        faltas = sum(1 for m in res["materiais"] if m["status"] == "FALTA")
+        print(f"plano em lote          : {t_lote:8.3f}s (carga do grafo {t_carga:.3f}s; {faltas} matérias-primas em falta)")
+        print(f"só o cálculo, grafo já em memória: explodir() x{len(plano)} {t_mem:.3f}s vs planejar() {t_lote - t_carga:.3f}s")
+        for nome, t_chamada in referencias.items(): print(f"ganho sobre {nome}: ~{t_chamada * len(plano) / t_lote:.0f}x")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
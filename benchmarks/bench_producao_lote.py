@@ -0,0 +1,55 @@
+# Benchmark: confirmação de OP no backend/main.py, versão antiga (1 consulta + 1 commit por
+# ingrediente) vs. transação única com executemany.
+# Uso: python benchmarks/bench_producao_lote.py [ingredientes] [ops]
+import os
+import sys
+import tempfile
+import time
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ); sys.path.insert(0, os.path.join(RAIZ, "backend"))
+
+INGREDIENTES = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+OPS = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+def confirmar_antigo(erp, p, db):
+    # Cópia do fluxo anterior: uma consulta por ingrediente e commit a cada Kardex
+    formula = db.query(erp.Formula).filter(erp.Formula.id == p.formula_id).first()
+    produto_final = db.query(erp.Produto).filter(erp.Produto.id == formula.produto_final_id).first()
+    for item in db.query(erp.FormulaItem).filter(erp.FormulaItem.formula_id == p.formula_id).all():
+        mp = db.query(erp.Produto).filter(erp.Produto.id == item.materia_prima_id).first()
+        qtd = item.quantidade * p.quantidade
+        mp.estoque_atual -= qtd
+        db.add(erp.Kardex(produto_id=mp.id, tipo_movimento=f"Produção Lote {p.lote_final}", quantidade=-qtd)); db.commit()
+    produto_final.estoque_atual += p.quantidade
+    db.add(erp.Kardex(produto_id=produto_final.id, tipo_movimento=f"Entrada Produção {p.lote_final}", quantidade=p.quantidade)); db.commit()
+    db.add(erp.ProducaoHistorico(formula_id=p.formula_id, produto_nome=produto_final.nome, quantidade_produzida=p.quantidade, lote_gerado=p.lote_final))
+    db.add(erp.Lote(produto_id=produto_final.id, codigo_lote=p.lote_final, quantidade_inicial=p.quantidade, quantidade_atual=p.quantidade, validade=p.validade_final))
+    db.commit()
+
+def preparar(erp):
+    with erp.SessionLocal() as db:
+        db.add_all([erp.Produto(nome=f"MP{i}", tipo="Materia Prima", unidade="L", estoque_atual=1e9, custo=1) for i in range(INGREDIENTES)])
+        final = erp.Produto(nome="Perfume", tipo="Produto Acabado", unidade="Un", estoque_atual=0, custo=1); db.add(final); db.flush()
+        formula = erp.Formula(nome="F", produto_final_id=final.id); db.add(formula); db.flush()
+        db.add_all([erp.FormulaItem(formula_id=formula.id, materia_prima_id=i + 1, quantidade=0.1) for i in range(INGREDIENTES)])
+        db.commit()
+        return formula.id
+
+def rodar(erp, nome, confirmar, formula_id):
+    inicio = time.perf_counter()
+    for n in range(OPS):
+        with erp.SessionLocal() as db:
+            confirmar(erp.ProducaoConfirmacao(formula_id=formula_id, quantidade=10, lote_final=f"{nome}-{n}", validade_final="2030-01-01"), db)
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<10} {OPS:>5} OPs  {duracao:7.2f}s  {OPS / duracao:8.1f} OPs/s  {OPS * (INGREDIENTES + 1) / duracao:9.0f} movimentos/s")
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)  # backend/main.py cria ./decant_erp.db no diretório atual
+        import main as erp
+        formula_id = preparar(erp)
+        print(f"fórmula com {INGREDIENTES} ingredientes, {OPS} OPs")
+        rodar(erp, "antigo", lambda p, db: confirmar_antigo(erp, p, db), formula_id)
+        rodar(erp, "lote", erp.confirmar_producao, formula_id)
+        erp.engine.dispose(); erp.engine_leitura.dispose()
+        os.chdir(RAIZ)
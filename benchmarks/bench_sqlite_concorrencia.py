@@ -0,0 +1,62 @@
+# Benchmark: escrita concorrente (PDV + retaguarda) com engine padrão vs. engine ajustada.
+# Uso: python benchmarks/bench_sqlite_concorrencia.py [threads] [transacoes_por_thread]
+import os
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from backend.database import criar_engine
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+TRANSACOES = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+def preparar(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE produtos (id INTEGER PRIMARY KEY, estoque_atual FLOAT)"))
+        conn.execute(text("CREATE TABLE vendas (id INTEGER PRIMARY KEY, produto_id INTEGER, quantidade FLOAT)"))
+        conn.execute(text("INSERT INTO produtos (id, estoque_atual) VALUES (1, 1e9)"))
+
+def escritor(engine, erros):
+    for _ in range(TRANSACOES):
+        try:
+            with engine.begin() as conn:
+                # Leitura seguida de escrita: o padrão que gera "database is locked" no modo rollback
+                conn.execute(text("SELECT estoque_atual FROM produtos WHERE id = 1")).scalar()
+                conn.execute(text("UPDATE produtos SET estoque_atual = estoque_atual - 1 WHERE id = 1"))
+                conn.execute(text("INSERT INTO vendas (produto_id, quantidade) VALUES (1, 1)"))
+        except Exception:
+            erros.append(1)
+
+def leitor(engine, parar, erros):
+    while not parar.is_set():
+        try:
+            with engine.connect() as conn: conn.execute(text("SELECT count(*), sum(quantidade) FROM vendas")).scalar()
+        except Exception:
+            erros.append(1)
+
+def rodar(nome, fabrica):
+    with tempfile.TemporaryDirectory() as d:
+        url = f"sqlite:///{d}/bench.db"
+        engine = fabrica(url); preparar(engine)
+        erros, erros_leitura, parar = [], [], threading.Event()
+        leitores = [threading.Thread(target=leitor, args=(engine, parar, erros_leitura)) for _ in range(2)]
+        escritores = [threading.Thread(target=escritor, args=(engine, erros)) for _ in range(THREADS)]
+        for t in leitores: t.start()
+        inicio = time.perf_counter()
+        for t in escritores: t.start()
+        for t in escritores: t.join()
+        duracao = time.perf_counter() - inicio
+        parar.set()
+        for t in leitores: t.join()
+        ok = THREADS * TRANSACOES - len(erros)
+        print(f"{nome:<10} {ok:>7} commits  {len(erros):>5} erros escrita  {len(erros_leitura):>5} erros leitura  {duracao:7.2f}s  {ok / duracao:9.1f} tx/s")
+        engine.dispose()
+
+if __name__ == "__main__":
+    print(f"{THREADS} escritores x {TRANSACOES} transações + 2 leitores")
+    # Configuração anterior: só check_same_thread (journal rollback, timeout padrão do driver)
+    rodar("padrão", lambda url: create_engine(url, connect_args={"check_same_thread": False}))
+    rodar("ajustada", lambda url: criar_engine(url))
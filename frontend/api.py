@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CLIENTE DA API (Streamlit) ---
+# Uma sessão keep-alive por processo (reaproveita conexões TCP/TLS), cache por
+# endpoint com TTL + ETag, busca em paralelo e timeout em toda chamada.
+TIMEOUT = (5, 20)  # (conexão, leitura) em segundos
+TTL_PADRAO = 30
+TTL_ENDPOINT = {"dashboard/bootstrap": 5, "financeiro/dashboard": 15, "vendas": 15, "estoque/kardex": 10, "crm/oportunidades": 120}
+
+class ClienteAPI:
+    def __init__(self, base_url: str, workers: int = 8):
+        self.base_url = base_url.rstrip("/")
+        self.sessao = requests.Session()
+        self.sessao.mount("http://", HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+        self.sessao.mount("https://", HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._cache = {}  # endpoint -> [expira_em, etag, dados]
+        self._lock = threading.Lock()
+
+    def _url(self, caminho: str) -> str:
+        return f"{self.base_url}/{caminho.lstrip('/')}"
+
+    def get(self, endpoint: str, padrao=None):
+        # JSON com cache: dentro do TTL não vai à rede; depois revalida com If-None-Match
+        endpoint = endpoint.strip("/")
+        padrao = [] if padrao is None else padrao
+        with self._lock: item = self._cache.get(endpoint)
+        if item and item[0] > time.monotonic(): return item[2]
+        try:
+            resp = self.sessao.get(self._url(f"{endpoint}/"), headers={"If-None-Match": item[1]} if item and item[1] else {}, timeout=TIMEOUT)
+        except requests.RequestException:
+            return item[2] if item else padrao  # API lenta/fora: mostra o último dado conhecido
+        expira = time.monotonic() + TTL_ENDPOINT.get(endpoint, TTL_PADRAO)
+        if resp.status_code == 304 and item:
+            with self._lock: item[0] = expira
+            return item[2]
+        if resp.status_code != 200: return item[2] if item else padrao
+        dados = resp.json()
+        with self._lock: self._cache[endpoint] = [expira, resp.headers.get("ETag"), dados]
+        return dados
+
+    def varios(self, *endpoints):
+        # Buscas independentes em paralelo: o tempo total é o da mais lenta
+        return list(self.pool.map(self.get, endpoints))
+
+    def invalidar(self):
+        # Escritas expiram tudo (uma venda mexe em estoque, vendas, CRM e financeiro);
+        # o ETag fica, então a próxima leitura custa um 304 se nada mudou de fato
+        with self._lock:
+            for item in self._cache.values(): item[0] = 0
+
+    def requisitar(self, metodo: str, caminho: str, invalidar: bool = None, **kwargs):
+        # invalidar=False para POSTs que não escrevem (cálculos, login/logout): o cliente é
+        # compartilhado entre todas as sessões do Streamlit, então expirar o cache custa para todos
+        kwargs.setdefault("timeout", TIMEOUT)
+        resp = self.sessao.request(metodo, self._url(caminho), **kwargs)
+        if invalidar is None: invalidar = metodo.upper() != "GET"
+        if invalidar: self.invalidar()
+        return resp
+
+    def get_bruto(self, caminho: str, **kwargs): return self.requisitar("GET", caminho, **kwargs)
+    def post(self, caminho: str, **kwargs): return self.requisitar("POST", caminho, **kwargs)
+    def delete(self, caminho: str, **kwargs): return self.requisitar("DELETE", caminho, **kwargs)
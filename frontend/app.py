@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-import requests
+try: from frontend.api import ClienteAPI
+except ImportError: from api import ClienteAPI # executando de dentro de frontend/
 import plotly.express as px
 import plotly.graph_objects as go
 from streamlit_option_menu import option_menu
@@ -17,6 +18,7 @@ if 'carrinho' not in st.session_state: st.session_state['carrinho'] = []
 if 'logado' not in st.session_state: st.session_state['logado'] = False
 if 'usuario' not in st.session_state: st.session_state['usuario'] = ""
 if 'cargo' not in st.session_state: st.session_state['cargo'] = ""
+if 'token' not in st.session_state: st.session_state['token'] = ""
 
 def render_logo_svg(width="50px", color="#EC4899"):
     return f'<svg width="{width}" height="{width}" viewBox="0 0 100 100" fill="none" xmlns="http://www.w3.org/2000/svg"><path d="M30 20 V80 C30 90 40 95 50 85 L80 50 C90 40 80 20 60 20 Z" stroke="{color}" stroke-width="8" fill="none"/><path d="M30 50 L60 20" stroke="{color}" stroke-width="8" stroke-linecap="round"/><circle cx="35" cy="85" r="5" fill="{color}"/></svg>'
@@ -119,14 +121,33 @@ def apply_custom_style():
 
 apply_custom_style()
 
+@st.cache_resource
+def cliente_api(): return ClienteAPI(API_URL) # sessão keep-alive e cache compartilhados entre reruns
+
+api = cliente_api()
+
+# O cliente é compartilhado entre sessões: o token de cada usuário vai por chamada
+def auth(): return {"Authorization": f"Bearer {st.session_state['token']}"}
+def encerrar_sessao(aviso=""):
+    st.session_state['logado'] = False; st.session_state['token'] = ""; st.session_state['aviso_login'] = aviso; st.rerun()
+def sair():
+    try: api.post("auth/logout/", headers=auth(), invalidar=False)
+    except Exception: pass # sem conexão o token expira sozinho
+    encerrar_sessao()
+def autenticada(res):
+    # 401: token expirado, revogado ou a API reiniciou sem TOKEN_SECRET fixo -> volta ao login
+    if res.status_code == 401: encerrar_sessao("Sessão expirada. Entre novamente.")
+    return res
+
 def get_data(endpoint):
-    try:
-        endpoint = endpoint.strip("/")
-        resp = requests.get(f"{API_URL}/{endpoint}/")
-        if resp.status_code == 200: return resp.json()
-        return [] 
+    try: return api.get(endpoint)
     except: return [] 
 
+def get_varios(*endpoints):
+    # Várias listagens independentes de uma vez (em paralelo)
+    try: return api.varios(*endpoints)
+    except: return [[] for _ in endpoints]
+
 def card_html(titulo, valor, subtexto, cor="bg-purple"): 
     st.markdown(f"""
     <div class='glass-card'>
@@ -149,6 +170,8 @@ def tela_login():
         st.markdown("<br><br><br>", unsafe_allow_html=True)
         with st.container(border=True):
             st.markdown(f"<div style='display:flex; flex-direction:column; align-items:center; gap: 15px; margin-bottom: 30px;'>{render_logo_svg(width='70px', color='#E879F9')}<h2 style='margin:0; color:white !important; font-size:28px;'>Decant ERP</h2></div>", unsafe_allow_html=True)
+            aviso = st.session_state.pop('aviso_login', "")
+            if aviso: st.warning(aviso)
             with st.form("login_form"):
                 u_input = st.text_input("Usuário", placeholder="admin")
                 p_input = st.text_input("Senha", type="password", placeholder="••••••")
@@ -159,14 +182,14 @@ def tela_login():
                     with st.spinner("Conectando..."):
                         for tentativa in range(1, 4):
                             try:
-                                res = requests.post(f"{API_URL}/auth/login/", json={"username": u_input, "senha": p_input, "cargo": ""}, timeout=10)
+                                res = api.post("auth/login/", json={"username": u_input, "senha": p_input, "cargo": ""}, invalidar=False, timeout=10)
                                 if res.status_code == 200: sucesso = True; break
                                 else: mensagem_erro = "Acesso Negado."; break
                             except:
                                 if tentativa < 3: time.sleep(3)
                                 else: mensagem_erro = "Sem conexão."
                     if sucesso:
-                        data = res.json(); st.session_state['logado'] = True; st.session_state['usuario'] = data['usuario']; st.session_state['cargo'] = data['cargo']; st.rerun()
+                        data = res.json(); st.session_state['logado'] = True; st.session_state['usuario'] = data['usuario']; st.session_state['cargo'] = data['cargo']; st.session_state['token'] = data['access_token']; st.rerun()
                     else: st.error(mensagem_erro)
 
 def sistema_erp():
@@ -189,12 +212,13 @@ def sistema_erp():
         page_id = next(x["id"] for x in menu if x["l"] == sel)
         
         st.markdown("<br>", unsafe_allow_html=True)
-        if st.button("SAIR DO SISTEMA", use_container_width=True): st.session_state['logado'] = False; st.rerun()
+        if st.button("SAIR DO SISTEMA", use_container_width=True): sair()
 
     # --- DASHBOARD (AGORA COM 3 COLUNAS - METAS DE VOLTA) ---
     if page_id == "dash":
         header("Visão Geral")
-        d = get_data("financeiro/dashboard"); vendas = get_data("vendas"); clientes = get_data("clientes"); prods = get_data("produtos")
+        boot = get_data("dashboard/bootstrap") or {}
+        d = {**boot.get('kpis', {}), 'grafico': boot.get('grafico', [])}
         
         c1, c2, c3, c4 = st.columns(4)
         with c1: card_html("RECEITA TOTAL", f"R$ {d.get('receita', 0):,.2f}", "+12% este mês", "bg-green")
@@ -224,10 +248,8 @@ def sistema_erp():
             with st.container(border=True):
                 st.markdown("#### Últimas Vendas")
                 rows_html = ""
-                map_clientes = {c['id']: c for c in clientes}
-                for v in vendas[:5]:
-                    cli = map_clientes.get(v['cliente_id'], {'nome': 'Cliente', 'email': '-'})
-                    rows_html += get_sales_row_html(cli['nome'], cli['email'], v['valor_total'])
+                for v in boot.get('ultimas_vendas', []):
+                    rows_html += get_sales_row_html(v['cliente'], v['email'], v['valor_total'])
                 st.markdown(f"<div style='height: 300px; overflow-y: auto;'>{rows_html}</div>", unsafe_allow_html=True)
 
         with c_meta:
@@ -254,7 +276,7 @@ def sistema_erp():
     # --- PDV ---
     elif page_id == "pdv":
         header("PDV - Frente de Caixa")
-        clis = get_data("clientes"); prods = get_data("produtos"); pas = [p for p in prods if p['tipo'] == 'Produto Acabado']
+        clis, prods = get_varios("clientes", "produtos"); pas = [p for p in prods if p['tipo'] == 'Produto Acabado']
         c1, c2 = st.columns([1.5, 1])
         with c1:
             with st.container(border=True):
@@ -291,7 +313,7 @@ def sistema_erp():
                     if st.button("FINALIZAR VENDA", type="primary", use_container_width=True): 
                         if cli_sel:
                             cid = next(x['id'] for x in clis if x['nome']==cli_sel)
-                            requests.post(f"{API_URL}/vendas/pdv/", json={"cliente_id":cid,"itens":[{"produto_id":i['id'],"quantidade":i['qtd'],"valor_total":i['total']} for i in st.session_state['carrinho']],"metodo_pagamento":"Pix"})
+                            api.post("vendas/pdv/", json={"cliente_id":cid,"itens":[{"produto_id":i['id'],"quantidade":i['qtd'],"valor_total":i['total']} for i in st.session_state['carrinho']],"metodo_pagamento":"Pix"})
                             st.session_state['carrinho']=[]; st.success("Venda OK!"); time.sleep(1); st.rerun()
                         else: st.error("Selecione um cliente!")
                 else: st.info("Caixa Livre")
@@ -305,7 +327,7 @@ def sistema_erp():
                 st.markdown("#### Cadastro Rápido")
                 with st.form("new_cli"):
                     n = st.text_input("Nome"); e = st.text_input("Email"); t = st.text_input("Telefone")
-                    if st.form_submit_button("Salvar"): requests.post(f"{API_URL}/clientes/", json={"nome":n, "email":e, "telefone":t}); st.success("OK!"); st.rerun()
+                    if st.form_submit_button("Salvar"): api.post("clientes/", json={"nome":n, "email":e, "telefone":t}); st.success("OK!"); st.rerun()
         with c2: st.dataframe(pd.DataFrame(get_data("clientes")), use_container_width=True)
 
     elif page_id == "fin":
@@ -314,7 +336,7 @@ def sistema_erp():
             with st.container(border=True):
                 with st.form("frm_fin"):
                     desc = st.text_input("Descrição"); tipo = st.selectbox("Tipo", ["Despesa", "Receita"]); valor = st.number_input("Valor"); pg = st.checkbox("Pago?")
-                    if st.form_submit_button("Lançar"): requests.post(f"{API_URL}/financeiro/lancamento/", json={"descricao": desc, "tipo": tipo, "categoria": "Geral", "valor": valor, "data_vencimento": str(date.today()), "pago": pg}); st.success("OK!"); st.rerun()
+                    if st.form_submit_button("Lançar"): api.post("financeiro/lancamento/", json={"descricao": desc, "tipo": tipo, "categoria": "Geral", "valor": valor, "data_vencimento": str(date.today()), "pago": pg}); st.success("OK!"); st.rerun()
         with t2: st.dataframe(pd.DataFrame(get_data("financeiro/lancamentos")), use_container_width=True)
 
     elif page_id == "crm":
@@ -334,7 +356,7 @@ def sistema_erp():
         with c1: 
             with st.form("nf"):
                 n = st.text_input("Empresa"); p = st.number_input("Prazo", 1)
-                if st.form_submit_button("Salvar"): requests.post(f"{API_URL}/fornecedores/", json={"nome":n,"prazo_entrega_dias":p}); st.success("OK"); st.rerun()
+                if st.form_submit_button("Salvar"): api.post("fornecedores/", json={"nome":n,"prazo_entrega_dias":p}); st.success("OK"); st.rerun()
         with c2: st.dataframe(pd.DataFrame(get_data("fornecedores")), use_container_width=True)
 
     elif page_id == "prod": 
@@ -345,7 +367,7 @@ def sistema_erp():
             with st.container(border=True):
                 with st.form("np"):
                     n = st.text_input("Nome"); t = st.selectbox("Tipo", ["Materia Prima", "Produto Acabado"]); e = st.number_input("Estoque"); c = st.number_input("Custo"); loc = st.text_input("Localização")
-                    if st.form_submit_button("Salvar"): requests.post(f"{API_URL}/produtos/", json={"nome":n,"tipo":t,"unidade":"Un","estoque_atual":e,"custo":c, "localizacao": loc}); st.success("OK"); st.rerun()
+                    if st.form_submit_button("Salvar"): api.post("produtos/", json={"nome":n,"tipo":t,"unidade":"Un","estoque_atual":e,"custo":c, "localizacao": loc}); st.success("OK"); st.rerun()
 
     elif page_id == "eng":
         header("Engenharia")
@@ -358,7 +380,7 @@ def sistema_erp():
                     pf = st.selectbox("Produto Final", [x['nome'] for x in pas]) if pas else None
                     if st.form_submit_button("Criar Fórmula") and pf: 
                         pid = next(x['id'] for x in pas if x['nome']==pf)
-                        requests.post(f"{API_URL}/formulas/", json={"nome":nm,"produto_final_id":pid}); st.success("Criado!")
+                        api.post("formulas/", json={"nome":nm,"produto_final_id":pid}); st.success("Criado!")
         with t2: st.dataframe(pd.DataFrame(get_data("formulas")), use_container_width=True)
 
     elif page_id == "mrp":
@@ -371,11 +393,11 @@ def sistema_erp():
                 qtd = st.number_input("Quantidade", 100)
                 if st.button("Calcular"):
                     fid = next(f['id'] for f in forms if f['nome']==sel_f)
-                    res = requests.post(f"{API_URL}/planejamento/calcular/?formula_id={fid}&quantidade_producao={qtd}").json()
+                    res = api.post(f"planejamento/calcular/?formula_id={fid}&quantidade_producao={qtd}", invalidar=False).json()
                     st.session_state['mrp_res'] = res
             with c2:
                 if 'mrp_res' in st.session_state:
-                    st.dataframe(pd.DataFrame(st.session_state['mrp_res']['materiais']))
+                    st.dataframe(pd.DataFrame(st.session_state['mrp_res'].get('explosao') or st.session_state['mrp_res'].get('materiais', [])))
                     st.metric("Custo Estimado", f"R$ {st.session_state['mrp_res']['custo_total']:.2f}")
 
     elif page_id == "comp": header("Compras"); st.dataframe(pd.DataFrame(get_data("compras")))
@@ -390,20 +412,30 @@ def sistema_erp():
         t1, t2 = st.tabs(["DRE", "Downloads"])
         with t1:
             if st.button("Gerar DRE"):
-                dre = requests.get(f"{API_URL}/relatorios/dre?inicio={ini}&fim={fim}").json()
+                dre = api.get_bruto(f"relatorios/dre?inicio={ini}&fim={fim}").json()
                 fig = go.Figure(go.Waterfall(x = ["Receita", "Impostos", "Liq", "Custos", "Margem", "Despesas", "Lucro"], y = [dre['receita_bruta'], -dre['impostos'], dre['receita_liquida'], -dre['custos_variaveis'], dre['margem_contribuicao'], -dre['despesas_fixas'], dre['lucro_liquido']], connector = {"line":{"color":"#555"}}))
                 fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font={'color': '#FFFFFF'})
                 st.plotly_chart(fig, use_container_width=True)
         with t2:
+            # O PDF é gerado em segundo plano: envia o job e consulta o status
             if st.button("📄 PDF Vendas"): 
-                pdf = requests.get(f"{API_URL}/relatorios/vendas_pdf?inicio={ini}&fim={fim}")
-                if pdf.status_code==200: st.download_button("Baixar", pdf.content, "vendas.pdf", "application/pdf")
+                job = api.post(f"relatorios/jobs/?tipo=vendas&inicio={ini}&fim={fim}")
+                if job.status_code==200: st.session_state['job_vendas'] = job.json()['job_id']
+            if st.session_state.get('job_vendas'):
+                job = api.get_bruto(f"relatorios/jobs/{st.session_state['job_vendas']}").json()
+                if job.get('status') == "concluido":
+                    pdf = api.get_bruto(f"relatorios/jobs/{st.session_state['job_vendas']}/download")
+                    if pdf.status_code==200: st.download_button("Baixar", pdf.content, "vendas.pdf", "application/pdf")
+                elif job.get('status') == "processando":
+                    st.info("Gerando relatório..."); st.button("🔄 Atualizar")
+                else: st.error(f"Falha ao gerar: {job.get('erro') or job.get('detail')}"); st.session_state['job_vendas'] = None
 
     elif page_id == "cfg": 
         header("Configurações"); 
         if st.button("🗑️ RESETAR SISTEMA", type="primary"):
-            res = requests.delete(f"{API_URL}/sistema/resetar_dados/")
+            res = autenticada(api.delete("sistema/resetar_dados/", headers=auth()))
             if res.status_code == 200: st.success("Sistema Resetado!"); time.sleep(2); st.rerun()
+            elif res.status_code == 403: st.error("Área restrita ao cargo Diretor.")
 
 if st.session_state['logado']: sistema_erp()
 else: tela_login()
\ No newline at end of file
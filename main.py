@@ -1,24 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, FileResponse 
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import bindparam, insert, select, update
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
-from backend.database import SessionLocal, engine, Base
+from backend.database import SQLALCHEMY_DATABASE_URL, SessionLocal, SessionLeitura, engine, Base, aplicar_migracoes, caminho_arquivo, garantir_colunas, garantir_indices, normalizar_coluna_data
 from passlib.context import CryptContext
-from backend.models import Produto, Lote, Fornecedor, Cotacao, Formula, FormulaItem, PedidoCompra, OrdemProducao, Cliente, Venda, Usuario, Movimentacao, Lancamento
+from backend.models import Produto, Lote, Fornecedor, Cotacao, Formula, FormulaItem, PedidoCompra, OrdemProducao, Cliente, Venda, Usuario, Movimentacao, Lancamento, ClienteUltimaCompra, ResumoFinanceiroMensal, EstoqueCheckpoint
 from fpdf import FPDF 
 import io
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
 import random
 from collections import defaultdict
 import os
-import qrcode
-import tempfile
 import uuid
+from typing import Optional
+from backend.kardex import pagina_kardex, formatar_linha, historico_estoque, DELTA_MOVIMENTACAO, LIMITE_PADRAO, LIMITE_MAXIMO
+from backend.paginacao import stream_json, ParametrosPagina
+from backend.crm import FAIXAS_STATUS, registrar_compra, reconstruir_ultima_compra, pagina_oportunidades
+from backend.curva_abc import calcular_curva_abc
+from backend.cache_pdf import CachePDF
+from backend.etiquetas import carregar_etiquetas, encerrar_pool, gerar_pdf_etiquetas
+from backend.exportacao import gerar_csv, nome_arquivo
+from backend.fefo import COM_SALDO, alocar_fefo_varios, alocacoes_json
+from backend.versoes import ControleVersoes
+from backend.mrp import GrafoBOM
+from backend.diario import DiarioMovimentos
+from backend.sessoes import Sessoes
+from backend.backup import Backups
+from backend.importacao import Importador, filtrar
+from backend.financeiro import acumular, acumular_lancamento, reconstruir_resumo_mensal, resumo_dashboard
 
 Base.metadata.create_all(bind=engine)
+garantir_colunas(Base.metadata, engine)
+garantir_indices(Base.metadata, engine)
+# Migrações de dados (PRAGMA user_version): 1 = lotes.validade String -> Date
+aplicar_migracoes(engine, [lambda conn: normalizar_coluna_data(conn, "lotes", "validade")])
 
-app = FastAPI(title="Decant ERP")
+app = FastAPI(title="Decant ERP", on_shutdown=[encerrar_pool]) # pool de etiquetas (se ligado) sai junto
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,33 +48,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+cache_pdf = CachePDF()
+backups = Backups(caminho_arquivo(SQLALCHEMY_DATABASE_URL)) # snapshots online, rotativos em backups/
+versoes = ControleVersoes(SessionLocal, engine) # ETag das listagens
+diario = DiarioMovimentos(SessionLocal, Movimentacao, ("produto_id", "tipo", "quantidade", "origem", "usuario"), "data", delta=DELTA_MOVIMENTACAO, relogio=datetime.utcnow)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-def verificar_senha(plain, hashed): return pwd_context.verify(plain, hashed)
 def criar_hash(senha): return pwd_context.hash(senha)
+sessoes = Sessoes(pwd_context) # token assinado emitido no login; bcrypt só ali, num pool próprio
+somente_diretor = sessoes.exigir_cargo("Diretor") # usuários e /sistema/* (backup, reset)
 
 def get_db():
     db = SessionLocal()
     try: yield db
     finally: db.close()
 
-def consumir_estoque_lotes(db: Session, produto_id: int, quantidade: float):
-    lotes = db.query(Lote).filter(Lote.produto_id == produto_id, Lote.quantidade_atual > 0).order_by(Lote.validade.asc()).all()
-    qtd_a_consumir = quantidade
-    for lote in lotes:
-        if qtd_a_consumir <= 0: break
-        if lote.quantidade_atual >= qtd_a_consumir:
-            lote.quantidade_atual -= qtd_a_consumir
-            qtd_a_consumir = 0
-        else:
-            qtd_a_consumir -= lote.quantidade_atual
-            lote.quantidade_atual = 0
-    return
+def get_db_leitura():
+    # Relatórios e consultas: conexão somente leitura (não bloqueia o PDV)
+    db = SessionLeitura()
+    try: yield db
+    finally: db.close()
+
+def baixar_estoque(db: Session, quantidades: dict):
+    # UPDATE condicional por produto: a checagem e a baixa são atômicas no banco,
+    # então dois caixas vendendo a última unidade não passam os dois.
+    # Devolve os produtos que não tinham saldo; quem chama decide o rollback.
+    faltantes = []
+    for produto_id, qtd in quantidades.items():
+        res = db.execute(update(Produto).where(Produto.id == produto_id, Produto.estoque_atual >= qtd).values(estoque_atual=Produto.estoque_atual - qtd).execution_options(synchronize_session=False))
+        if res.rowcount == 0: faltantes.append(produto_id)
+    return faltantes
 
 def seed_db():
     db = SessionLocal()
     if not db.query(Usuario).first():
         db.add(Usuario(username="admin", senha_hash=criar_hash("123"), cargo="Diretor"))
         db.commit()
+    # Bancos anteriores ao resumo de última compra: preenche uma vez a partir das vendas
+    if not db.query(ClienteUltimaCompra).first() and db.query(Venda).first():
+        reconstruir_ultima_compra(db)
+    if not db.query(ResumoFinanceiroMensal).first() and (db.query(Venda).first() or db.query(Lancamento).first() or db.query(PedidoCompra).first()):
+        reconstruir_resumo_mensal(db)
+    historico_estoque.gerar_pendentes(db, datetime.utcnow()) # checkpoints mensais de estoque que faltarem
     db.close()
 
 seed_db()
@@ -79,9 +114,17 @@ class ClienteBase(BaseModel):
 class VendaBase(BaseModel):
     cliente_id: int; produto_id: int; quantidade: float; valor_total: float
 class RecebimentoBase(BaseModel):
-    lote: str; validade: str
+    lote: str; validade: date
+class EstoqueInicialBase(BaseModel):
+    produto_id: int; quantidade: float; lote: str = "INI-IMP"; validade: Optional[date] = None
+class PlanoItemBase(BaseModel):
+    formula_id: int; quantidade: float
+class PlanoLoteBase(BaseModel):
+    itens: list[PlanoItemBase]
 class ProducaoConfirmBase(BaseModel):
-    formula_id: int; quantidade: float; lote_final: str; validade_final: str
+    formula_id: int; quantidade: float; lote_final: str; validade_final: date
+class EtiquetasBase(BaseModel):
+    ids: list[int] = []; lote_inicio: Optional[str] = None; lote_fim: Optional[str] = None; paralelo: bool = False
 class LancamentoBase(BaseModel):
     descricao: str; tipo: str; categoria: str; valor: float; data_vencimento: str; pago: bool
 
@@ -98,53 +141,35 @@ class VendaPDV(BaseModel):
 
 # --- ROTAS CRM (NOVO) ---
 @app.get("/crm/oportunidades/")
-def crm_oportunidades(db: Session = Depends(get_db)):
-    # Lógica: Pega a última compra de cada cliente
-    vendas = db.query(Venda).order_by(Venda.data_venda.desc()).all()
-    mapa_clientes = {}
-    
-    for v in vendas:
-        # Se já processamos esse cliente, pula (pois ordenamos por data desc)
-        if v.cliente_id in mapa_clientes: continue
-        
-        c = db.query(Cliente).filter(Cliente.id == v.cliente_id).first()
-        p = db.query(Produto).filter(Produto.id == v.produto_id).first()
-        
-        if c and p:
-            dias = (datetime.now() - v.data_venda).days
-            status = "🟢 Recente"
-            if dias > 25: status = "🟡 Atenção (25+ dias)"
-            if dias > 45: status = "🔴 Crítico (45+ dias)"
-            if dias > 90: status = "💤 Inativo"
-
-            # Só mostra quem comprou há mais de 25 dias
-            if dias >= 25:
-                mapa_clientes[v.cliente_id] = {
-                    "Cliente": c.nome,
-                    "Telefone": c.telefone,
-                    "Último Produto": p.nome,
-                    "Data": v.data_venda.strftime("%d/%m/%Y"),
-                    "Dias sem Comprar": dias,
-                    "Status": status
-                }
-    
-    return list(mapa_clientes.values())
+def crm_oportunidades(response: Response, status: Optional[str] = None, after: Optional[str] = None, limit: int = Query(200, ge=1, le=5000), db: Session = Depends(get_db_leitura)):
+    # Lê o resumo de última compra (atualizado pelo PDV) por faixa de dias sem comprar
+    if status and status not in FAIXAS_STATUS: raise HTTPException(400, f"Status inválido. Use: {', '.join(FAIXAS_STATUS)}")
+    try: res, proximo = pagina_oportunidades(db, status, after, limit)
+    except ValueError as e: raise HTTPException(400, str(e))
+    if proximo: response.headers["X-Next-Cursor"] = proximo
+    return res
 
 # --- ROTAS PDV ---
 @app.post("/vendas/pdv/")
 def realizar_venda_pdv(v: VendaPDV, db: Session = Depends(get_db)):
     grupo_id = str(uuid.uuid4()) # ID Único da Nota
+    agora = datetime.utcnow()
     total_geral = 0.0
-    
+
+    # Quantidade total por produto (o mesmo item pode aparecer em mais de uma linha)
+    quantidades = defaultdict(float)
+    for item in v.itens: quantidades[item.produto_id] += item.quantidade
+    produtos = {p.id: p for p in db.query(Produto).filter(Produto.id.in_(quantidades)).all()}
+
+    # Baixa Estoque (carrinho inteiro ou nada)
+    faltantes = baixar_estoque(db, quantidades)
+    if faltantes:
+        db.rollback()
+        itens = [{"produto_id": pid, "produto": produtos[pid].nome if pid in produtos else None, "solicitado": quantidades[pid], "disponivel": produtos[pid].estoque_atual if pid in produtos else 0} for pid in faltantes]
+        raise HTTPException(400, {"msg": "Estoque insuficiente para " + ", ".join(str(i["produto"] or i["produto_id"]) for i in itens), "faltantes": itens})
+    lotes = alocar_fefo_varios(db, quantidades)
+
     for item in v.itens:
-        p = db.query(Produto).filter(Produto.id == item.produto_id).first()
-        if p.estoque_atual < item.quantidade: 
-            raise HTTPException(400, f"Estoque insuficiente para {p.nome}")
-        
-        # Baixa Estoque
-        p.estoque_atual -= item.quantidade
-        consumir_estoque_lotes(db, p.id, item.quantidade)
-        
         # Registra Venda Individual
         nova_venda = Venda(
             cliente_id=v.cliente_id,
@@ -152,15 +177,19 @@ def realizar_venda_pdv(v: VendaPDV, db: Session = Depends(get_db)):
             quantidade=item.quantidade,
             valor_total=item.valor_total,
             metodo_pagamento=v.metodo_pagamento,
-            venda_agrupada_id=grupo_id
+            venda_agrupada_id=grupo_id,
+            data_venda=agora
         )
         db.add(nova_venda)
         
         # Log Kardex
-        db.add(Movimentacao(produto_id=p.id, tipo="Saida", quantidade=item.quantidade, origem=f"PDV {v.metodo_pagamento}", usuario="Vendas"))
+        diario.registrar(db, item.produto_id, "Saida", item.quantidade, f"PDV {v.metodo_pagamento}", "Vendas")
         
         total_geral += item.valor_total
 
+    if v.itens: registrar_compra(db, v.cliente_id, v.itens[-1].produto_id, agora)
+    acumular(db, agora, "venda", total_geral)
+
     # LANÇA NO FINANCEIRO AUTOMATICAMENTE
     if total_geral > 0:
         lanc = Lancamento(
@@ -173,15 +202,21 @@ def realizar_venda_pdv(v: VendaPDV, db: Session = Depends(get_db)):
             data_pagamento=datetime.now().date()
         )
         db.add(lanc)
+        acumular_lancamento(db, lanc)
 
     db.commit()
-    return {"msg": "Venda PDV realizada", "grupo_id": grupo_id}
+    return {"msg": "Venda PDV realizada", "grupo_id": grupo_id, "lotes": alocacoes_json(lotes)}
 
 @app.get("/vendas/recibo/{grupo_id}/")
 def gerar_cupom_pdv(grupo_id: str, db: Session = Depends(get_db)):
-    vendas = db.query(Venda).filter(Venda.venda_agrupada_id == grupo_id).all()
+    # Itens da nota já com o nome do produto (uma consulta só)
+    vendas = db.query(Venda.id, Venda.quantidade, Venda.valor_total, Venda.metodo_pagamento, Venda.data_venda, Produto.nome).outerjoin(Produto, Produto.id == Venda.produto_id).filter(Venda.venda_agrupada_id == grupo_id).order_by(Venda.id).all()
     if not vendas: return Response(content=b"")
-    
+    linhas = [tuple(v) for v in vendas]
+    pdf = cache_pdf.obter(f"cupom:{grupo_id}", linhas, lambda: pdf_cupom(grupo_id, vendas))
+    return Response(content=pdf, media_type="application/pdf")
+
+def pdf_cupom(grupo_id, vendas):
     # PDF Estilo Cupom Fiscal (80mm)
     pdf = FPDF('P', 'mm', (80, 200))
     pdf.add_page()
@@ -189,13 +224,13 @@ def gerar_cupom_pdv(grupo_id: str, db: Session = Depends(get_db)):
     
     pdf.set_font("Arial", 'B', 10); pdf.cell(0, 5, "DECANT COSMETICS", 0, 1, 'C')
     pdf.set_font("Arial", '', 8); pdf.cell(0, 4, f"Cupom: {grupo_id[:8]}", 0, 1, 'C')
-    pdf.cell(0, 4, datetime.now().strftime("%d/%m/%Y %H:%M"), 0, 1, 'C')
+    emitido = vendas[0].data_venda.replace(tzinfo=timezone.utc).astimezone() # gravada em UTC; no cupom vai a hora local
+    pdf.cell(0, 4, emitido.strftime("%d/%m/%Y %H:%M"), 0, 1, 'C')
     pdf.line(2, 20, 78, 20); pdf.ln(5)
     
     total = 0
     for v in vendas:
-        p = db.query(Produto).filter(Produto.id == v.produto_id).first()
-        pdf.set_font("Arial", 'B', 8); pdf.cell(0, 4, f"{p.nome}", 0, 1)
+        pdf.set_font("Arial", 'B', 8); pdf.cell(0, 4, f"{v.nome}", 0, 1)
         pdf.set_font("Arial", '', 8)
         pdf.cell(40, 4, f"{v.quantidade} x R$ {v.valor_total/v.quantidade:.2f}", 0, 0)
         pdf.cell(35, 4, f"R$ {v.valor_total:.2f}", 0, 1, 'R')
@@ -208,78 +243,133 @@ def gerar_cupom_pdv(grupo_id: str, db: Session = Depends(get_db)):
     pdf.set_font("Arial", '', 8)
     pdf.cell(0, 5, f"Pagamento: {vendas[0].metodo_pagamento}", 0, 1, 'C')
     
-    return Response(content=pdf.output(dest='S').encode('latin-1'), media_type="application/pdf")
+    return pdf.output(dest='S').encode('latin-1')
 
 # --- ROTAS DE SISTEMA ---
-@app.get("/usuarios/")
+@app.get("/usuarios/", dependencies=[Depends(somente_diretor), Depends(versoes.etag("usuarios"))])
 def listar_usuarios(db: Session = Depends(get_db)): return db.query(Usuario).all()
-@app.post("/usuarios/")
-def criar_usuario(u: UsuarioBase, db: Session = Depends(get_db)):
-    existe = db.query(Usuario).filter(Usuario.username == u.username).first()
+@app.post("/usuarios/", dependencies=[Depends(somente_diretor)])
+async def criar_usuario(u: UsuarioBase, db: Session = Depends(get_db)):
+    existe = await run_in_threadpool(lambda: db.query(Usuario).filter(Usuario.username == u.username).first())
     if existe: raise HTTPException(400, "Usuário já existe")
-    novo = Usuario(username=u.username, senha_hash=criar_hash(u.senha), cargo=u.cargo)
-    db.add(novo); db.commit()
+    novo = Usuario(username=u.username, senha_hash=await sessoes.criar_hash(u.senha), cargo=u.cargo)
+    db.add(novo); await run_in_threadpool(db.commit)
     return {"msg": "Usuário criado"}
-@app.delete("/sistema/resetar_dados/")
+@app.delete("/sistema/resetar_dados/", dependencies=[Depends(somente_diretor)])
 def resetar_dados(db: Session = Depends(get_db)):
     db.query(Movimentacao).delete(); db.query(Venda).delete(); db.query(OrdemProducao).delete()
     db.query(PedidoCompra).delete(); db.query(FormulaItem).delete(); db.query(Formula).delete()
     db.query(Lote).delete(); db.query(Cotacao).delete(); db.query(Produto).delete()
     db.query(Cliente).delete(); db.query(Fornecedor).delete(); db.query(Lancamento).delete()
-    db.commit()
+    db.query(ClienteUltimaCompra).delete(); db.query(ResumoFinanceiroMensal).delete(); db.query(EstoqueCheckpoint).delete()
+    db.commit(); cache_pdf.limpar()
     return {"msg": "Dados apagados"}
 @app.post("/auth/login/")
-def login(u: UsuarioBase, db: Session = Depends(get_db)):
-    user = db.query(Usuario).filter(Usuario.username == u.username).first()
-    if not user or not verificar_senha(u.senha, user.senha_hash):
-        if u.username == "admin" and u.senha == "123": return {"msg": "OK", "cargo": "Diretor", "usuario": "admin"}
+async def login(u: UsuarioBase, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(lambda: db.query(Usuario).filter(Usuario.username == u.username).first())
+    if not user or not await sessoes.verificar_senha(u.senha, user.senha_hash):
+        # admin/123 só serve para a instalação: enquanto não houver nenhum usuário cadastrado
+        if u.username == "admin" and u.senha == "123" and not await run_in_threadpool(lambda: db.query(Usuario.id).first()):
+            return {"msg": "OK", "cargo": "Diretor", "usuario": "admin", **sessoes.emitir("admin", "Diretor")}
         raise HTTPException(401, "Credenciais inválidas")
-    return {"msg": "OK", "cargo": user.cargo, "usuario": user.username}
-@app.get("/sistema/backup/")
+    return {"msg": "OK", "cargo": user.cargo, "usuario": user.username, **sessoes.emitir(user.username, user.cargo)}
+@app.get("/auth/sessao/")
+async def sessao_atual(claims: dict = Depends(sessoes.usuario_atual)): return {"usuario": claims["sub"], "cargo": claims["cargo"], "expira_em": claims["exp"]}
+@app.post("/auth/logout/")
+async def logout(claims: dict = Depends(sessoes.usuario_atual)):
+    sessoes.revogar(claims); return {"msg": "Sessão encerrada"}
+@app.get("/sistema/backup/", dependencies=[Depends(somente_diretor)])
 def baixar_backup():
-    file_path = "sistema_final.db"
-    if os.path.exists(file_path): return FileResponse(path=file_path, filename=f"decant_backup_{datetime.now().strftime('%Y%m%d')}.db", media_type='application/octet-stream')
-    return {"erro": "404"}
+    # Snapshot consistente pela API de backup do sqlite, compactado durante o envio
+    if not os.path.exists(backups.banco): raise HTTPException(404, "Banco não encontrado")
+    headers = {"Content-Disposition": f'attachment; filename="{backups.nome()}"'}
+    return StreamingResponse(backups.stream(), media_type="application/gzip", headers=headers)
+@app.get("/sistema/backups/", dependencies=[Depends(somente_diretor)])
+def listar_backups(): return backups.listar()
+@app.post("/sistema/backups/", dependencies=[Depends(somente_diretor)])
+def criar_backup():
+    caminho = backups.criar()
+    return {"arquivo": os.path.basename(caminho), "verificacao": backups.verificar(caminho)["detalhe"]}
 
 # --- OPERACIONAL ---
 @app.post("/financeiro/lancamento/")
 def criar_lancamento(l: LancamentoBase, db: Session = Depends(get_db)):
     data_venc = datetime.strptime(l.data_vencimento, "%Y-%m-%d").date()
     novo = Lancamento(descricao=l.descricao, tipo=l.tipo, categoria=l.categoria, valor=l.valor, data_vencimento=data_venc, pago=l.pago, data_pagamento=data_venc if l.pago else None)
-    db.add(novo); db.commit()
+    db.add(novo); acumular_lancamento(db, novo); db.commit()
     return {"msg": "Lançamento criado"}
-@app.get("/financeiro/lancamentos/")
+@app.get("/financeiro/lancamentos/", dependencies=[Depends(versoes.etag("financeiro"))])
 def listar_lancamentos(db: Session = Depends(get_db)): return db.query(Lancamento).order_by(Lancamento.data_vencimento.desc()).all()
 @app.post("/financeiro/pagar/{id}")
 def pagar_conta(id: int, db: Session = Depends(get_db)):
     lan = db.query(Lancamento).filter(Lancamento.id == id).first()
     if lan:
+        acumular_lancamento(db, lan, -1) # estorna o pagamento anterior, se havia
         lan.pago = not lan.pago; lan.data_pagamento = datetime.now().date() if lan.pago else None
+        acumular_lancamento(db, lan)
         db.commit()
     return {"msg": "Status alterado"}
-@app.get("/produtos/")
-def listar_produtos(db: Session = Depends(get_db)): return db.query(Produto).all()
+@app.get("/produtos/", dependencies=[Depends(versoes.etag("produtos"))])
+def listar_produtos(p: ParametrosPagina = Depends(), db: Session = Depends(get_db)): return p.listar(db, Produto)
 @app.post("/produtos/")
 def criar_produto(p: ProdutoBase, db: Session = Depends(get_db)): 
     novo = Produto(**p.dict()); db.add(novo); db.commit(); db.refresh(novo)
     if p.estoque_atual > 0:
-        db.add(Movimentacao(produto_id=novo.id, tipo="Entrada", quantidade=p.estoque_atual, origem="Cadastro Inicial", usuario="Admin"))
-        db.add(Lote(produto_id=novo.id, codigo="INI-CAD", validade="2030-12-31", quantidade_atual=p.estoque_atual))
+        diario.registrar(db, novo.id, "Entrada", p.estoque_atual, "Cadastro Inicial", "Admin")
+        db.add(Lote(produto_id=novo.id, codigo="INI-CAD", validade=date(2030, 12, 31), quantidade_atual=p.estoque_atual))
         db.commit()
     return {"msg": "OK"}
-@app.get("/fornecedores/")
-def listar_fornecedores(db: Session = Depends(get_db)): return db.query(Fornecedor).all()
+@app.get("/fornecedores/", dependencies=[Depends(versoes.etag("fornecedores"))])
+def listar_fornecedores(p: ParametrosPagina = Depends(), db: Session = Depends(get_db)): return p.listar(db, Fornecedor)
 @app.post("/fornecedores/")
 def criar_fornecedor(f: FornecedorBase, db: Session = Depends(get_db)): db.add(Fornecedor(**f.dict())); db.commit(); return {"msg": "OK"}
-@app.get("/cotacoes/")
-def listar_cotacoes(db: Session = Depends(get_db)): return db.query(Cotacao).all()
+@app.get("/cotacoes/", dependencies=[Depends(versoes.etag("cotacoes"))])
+def listar_cotacoes(p: ParametrosPagina = Depends(), db: Session = Depends(get_db)): return p.listar(db, Cotacao)
 @app.post("/cotacoes/")
 def criar_cotacao(c: CotacaoBase, db: Session = Depends(get_db)): db.add(Cotacao(**c.dict())); db.commit(); return {"msg": "OK"}
-@app.get("/clientes/")
-def listar_clientes(db: Session = Depends(get_db)): return db.query(Cliente).all()
+@app.get("/clientes/", dependencies=[Depends(versoes.etag("clientes"))])
+def listar_clientes(p: ParametrosPagina = Depends(), db: Session = Depends(get_db)): return p.listar(db, Cliente)
 @app.post("/clientes/")
 def criar_cliente(c: ClienteBase, db: Session = Depends(get_db)): db.add(Cliente(**c.dict())); db.commit(); return {"msg": "OK"}
-@app.get("/formulas/")
+
+# --- IMPORTAÇÃO EM MASSA (executemany Core por lote; cada função devolve as linhas recusadas) ---
+def ids_existentes(db, modelo, ids): return set(db.scalars(select(modelo.id).where(modelo.id.in_(ids))))
+def entrada_inicial(db, itens, origem):
+    # itens: (produto_id, qtd, lote, validade) -> um Lote e uma Movimentacao (diário) por item
+    if not itens: return
+    db.execute(insert(Lote.__table__), [{"produto_id": p, "codigo": l, "validade": v, "quantidade_atual": q} for p, q, l, v in itens])
+    for p, q, _, _ in itens: diario.registrar(db, p, "Entrada", q, origem, "Admin")
+def importar_produtos(db, regs):
+    ids = db.scalars(insert(Produto.__table__).returning(Produto.id, sort_by_parameter_order=True), regs).all()
+    entrada_inicial(db, [(i, r["estoque_atual"], "INI-CAD", date(2030, 12, 31)) for i, r in zip(ids, regs) if r["estoque_atual"] > 0], "Cadastro Inicial")
+    return []
+def importar_clientes(db, regs):
+    db.execute(insert(Cliente.__table__), regs); return []
+def importar_cotacoes(db, regs):
+    produtos = ids_existentes(db, Produto, {r["produto_id"] for r in regs}); fornecedores = ids_existentes(db, Fornecedor, {r["fornecedor_id"] for r in regs})
+    aceitos, recusados = filtrar(regs, lambda r: "produto_id inexistente" if r["produto_id"] not in produtos else "fornecedor_id inexistente" if r["fornecedor_id"] not in fornecedores else None)
+    if aceitos: db.execute(insert(Cotacao.__table__), aceitos)
+    return recusados
+def importar_estoque(db, regs):
+    produtos = ids_existentes(db, Produto, {r["produto_id"] for r in regs})
+    aceitos, recusados = filtrar(regs, lambda r: "produto_id inexistente" if r["produto_id"] not in produtos else "quantidade deve ser positiva" if r["quantidade"] <= 0 else None)
+    if aceitos:
+        db.execute(update(Produto.__table__).where(Produto.id == bindparam("pid")).values(estoque_atual=Produto.estoque_atual + bindparam("qtd")), [{"pid": r["produto_id"], "qtd": r["quantidade"]} for r in aceitos])
+        entrada_inicial(db, [(r["produto_id"], r["quantidade"], r["lote"], r["validade"]) for r in aceitos], "Estoque Inicial")
+    return recusados
+IMPORTADORES = {
+    "produtos": Importador(SessionLocal, ProdutoBase, importar_produtos),
+    "clientes": Importador(SessionLocal, ClienteBase, importar_clientes),
+    "cotacoes": Importador(SessionLocal, CotacaoBase, importar_cotacoes),
+    "estoque": Importador(SessionLocal, EstoqueInicialBase, importar_estoque),
+}
+@app.post("/importar/{entidade}/", dependencies=[Depends(sessoes.usuario_atual)])
+async def importar(entidade: str, request: Request, formato: Optional[str] = Query(None, pattern="^(csv|jsonl)$")):
+    # Corpo cru (curl --data-binary @arquivo.csv); sem ?formato= decide pelo Content-Type
+    if entidade not in IMPORTADORES: raise HTTPException(404, f"Entidade inválida ({', '.join(IMPORTADORES)})")
+    formato = formato or ("jsonl" if "json" in request.headers.get("content-type", "") else "csv")
+    return await IMPORTADORES[entidade].importar(request.stream(), formato)
+@app.get("/formulas/", dependencies=[Depends(versoes.etag("formulas", "formula_itens"))])
 def listar_formulas(db: Session = Depends(get_db)): return db.query(Formula).options(joinedload(Formula.itens)).all()
 @app.post("/formulas/")
 def criar_formula(f: FormulaBase, db: Session = Depends(get_db)): novo = Formula(**f.dict()); db.add(novo); db.commit(); db.refresh(novo); return novo
@@ -292,15 +382,16 @@ def delete_ingrediente(item_id: int, db: Session = Depends(get_db)):
     return {"msg": "Deleted"}
 @app.post("/planejamento/calcular/")
 def calcular_mrp(formula_id: int, quantidade_producao: float, db: Session = Depends(get_db)):
-    f = db.query(Formula).options(joinedload(Formula.itens).joinedload(FormulaItem.materia_prima)).filter(Formula.id == formula_id).first()
-    res = []; custo_total = 0.0
-    if f and f.itens:
-        for item in f.itens:
-            qtd = item.quantidade * quantidade_producao; custo = item.materia_prima.custo * qtd; custo_total += custo
-            res.append({"id":item.id, "ingrediente":item.materia_prima.nome, "necessario":qtd, "unidade":item.materia_prima.unidade, "estoque":item.materia_prima.estoque_atual, "custo_unit":item.materia_prima.custo, "subtotal":custo, "status":"OK" if item.materia_prima.estoque_atual >= qtd else "FALTA"})
-    return {"producao": quantidade_producao, "materiais": res, "custo_total": custo_total}
-@app.get("/compras/")
-def listar_compras(db: Session = Depends(get_db)): return db.query(PedidoCompra).all()
+    # Explosão multinível (semiacabados com fórmula própria) sobre o grafo pré-carregado
+    try: return GrafoBOM.carregar_subgrafo(db, Formula, FormulaItem, Produto, formula_id).calcular(formula_id, quantidade_producao)
+    except ValueError as e: raise HTTPException(400, str(e))
+@app.post("/planejamento/lote/")
+def calcular_mrp_lote(plano: PlanoLoteBase, db: Session = Depends(get_db_leitura)):
+    # Plano da semana inteiro de uma vez: totais, faltas e disputa entre fórmulas
+    try: return GrafoBOM.carregar(db, Formula, FormulaItem, Produto).planejar([(i.formula_id, i.quantidade) for i in plano.itens])
+    except ValueError as e: raise HTTPException(400, str(e))
+@app.get("/compras/", dependencies=[Depends(versoes.etag("pedidos_compra"))])
+def listar_compras(p: ParametrosPagina = Depends(), db: Session = Depends(get_db)): return p.listar(db, PedidoCompra)
 @app.post("/compras/")
 def criar_compra(c: PedidoCompraBase, db: Session = Depends(get_db)): db.add(PedidoCompra(**c.dict(), status="Pendente")); db.commit(); return {"msg": "OK"}
 @app.post("/compras/{id}/processar/")
@@ -309,116 +400,143 @@ def processar_recebimento(id: int, dados: RecebimentoBase, db: Session = Depends
     if pc and pc.status == "Pendente":
         prod = db.query(Produto).filter(Produto.id == pc.produto_id).first()
         prod.estoque_atual += pc.quantidade
-        pc.status = "Recebido"
+        pc.status = "Recebido"; pc.data_recebimento = datetime.utcnow()
+        acumular(db, pc.data_recebimento, "compra", pc.quantidade * pc.valor_unitario)
         db.add(Lote(produto_id=prod.id, codigo=dados.lote, validade=dados.validade, quantidade_atual=pc.quantidade))
-        db.add(Movimentacao(produto_id=prod.id, tipo="Entrada", quantidade=pc.quantidade, origem=f"Compra #{pc.id}", usuario="Almox."))
+        diario.registrar(db, prod.id, "Entrada", pc.quantidade, f"Compra #{pc.id}", "Almox.")
         db.commit()
     return {"msg": "OK"}
 @app.post("/producao/confirmar_lote/")
 def produzir_com_lote(dados: ProducaoConfirmBase, db: Session = Depends(get_db)):
     f = db.query(Formula).options(joinedload(Formula.itens).joinedload(FormulaItem.materia_prima)).filter(Formula.id == dados.formula_id).first()
+    consumo = defaultdict(float)
     for i in f.itens:
         qtd_nec = i.quantidade * dados.quantidade
         i.materia_prima.estoque_atual -= qtd_nec
-        consumir_estoque_lotes(db, i.materia_prima.id, qtd_nec)
-        db.add(Movimentacao(produto_id=i.materia_prima.id, tipo="Saida", quantidade=qtd_nec, origem="OP (Consumo)", usuario="Produção"))
+        consumo[i.materia_prima.id] += qtd_nec
+        diario.registrar(db, i.materia_prima.id, "Saida", qtd_nec, "OP (Consumo)", "Produção")
+    lotes = alocar_fefo_varios(db, consumo)
     pa = db.query(Produto).filter(Produto.id == f.produto_final_id).first()
     pa.estoque_atual += dados.quantidade
     db.add(Lote(produto_id=pa.id, codigo=dados.lote_final, validade=dados.validade_final, quantidade_atual=dados.quantidade))
     db.add(OrdemProducao(formula_id=dados.formula_id, quantidade_produzida=dados.quantidade, lote_codigo=dados.lote_final, status="Concluída"))
-    db.add(Movimentacao(produto_id=pa.id, tipo="Entrada", quantidade=dados.quantidade, origem="OP (Conclusão)", usuario="Produção"))
+    diario.registrar(db, pa.id, "Entrada", dados.quantidade, "OP (Conclusão)", "Produção")
     db.commit()
-    return {"msg": "Produzido"}
-@app.get("/producao/historico/")
-def listar_producao(db: Session = Depends(get_db)): return db.query(OrdemProducao).all()
-@app.get("/vendas/")
+    return {"msg": "Produzido", "lotes": alocacoes_json(lotes)}
+@app.get("/producao/historico/", dependencies=[Depends(versoes.etag("ordens_producao"))])
+def listar_producao(p: ParametrosPagina = Depends(), db: Session = Depends(get_db)): return p.listar(db, OrdemProducao)
+@app.get("/vendas/", dependencies=[Depends(versoes.etag("vendas"))])
 def listar_vendas(db: Session = Depends(get_db)): return db.query(Venda).order_by(Venda.id.desc()).limit(20).all()
 @app.get("/compras/{id}/pdf/")
 def pdf_compra(id: int, db: Session = Depends(get_db)):
     pc = db.query(PedidoCompra).filter(PedidoCompra.id == id).first()
     if not pc: return Response(content=b"", media_type="application/pdf")
-    pdf = FPDF(); pdf.add_page(); pdf.set_font("Arial", 'B', 16)
-    pdf.cell(190, 10, "PEDIDO DE COMPRA", 0, 1, 'C'); pdf.line(10, 20, 200, 20); pdf.ln(10)
-    pdf.set_font("Arial", '', 12); pdf.cell(100, 10, f"Pedido #: {pc.id}", 0, 1)
-    return Response(content=pdf.output(dest='S').encode('latin-1'), media_type="application/pdf")
+    def gerar():
+        pdf = FPDF(); pdf.add_page(); pdf.set_font("Arial", 'B', 16)
+        pdf.cell(190, 10, "PEDIDO DE COMPRA", 0, 1, 'C'); pdf.line(10, 20, 200, 20); pdf.ln(10)
+        pdf.set_font("Arial", '', 12); pdf.cell(100, 10, f"Pedido #: {pc.id}", 0, 1)
+        return pdf.output(dest='S').encode('latin-1')
+    linhas = [pc.id, pc.fornecedor_id, pc.produto_id, pc.quantidade, pc.valor_unitario, pc.status]
+    return Response(content=cache_pdf.obter(f"compra:{id}", linhas, gerar), media_type="application/pdf")
 @app.get("/vendas/{id}/pdf/")
 def pdf_venda(id: int, db: Session = Depends(get_db)):
     v = db.query(Venda).filter(Venda.id == id).first()
     if not v: return Response(content=b"", media_type="application/pdf")
-    pdf = FPDF(); pdf.add_page(); pdf.set_font("Arial", 'B', 16)
-    pdf.cell(190, 10, "RECIBO DE VENDA", 0, 1, 'C'); pdf.line(10, 20, 200, 20); pdf.ln(10)
-    pdf.set_font("Arial", '', 12); pdf.cell(100, 10, f"Venda #: {v.id}", 0, 1); pdf.cell(100, 10, f"Valor: R$ {v.valor_total}", 0, 1)
-    return Response(content=pdf.output(dest='S').encode('latin-1'), media_type="application/pdf")
+    def gerar():
+        pdf = FPDF(); pdf.add_page(); pdf.set_font("Arial", 'B', 16)
+        pdf.cell(190, 10, "RECIBO DE VENDA", 0, 1, 'C'); pdf.line(10, 20, 200, 20); pdf.ln(10)
+        pdf.set_font("Arial", '', 12); pdf.cell(100, 10, f"Venda #: {v.id}", 0, 1); pdf.cell(100, 10, f"Valor: R$ {v.valor_total}", 0, 1)
+        return pdf.output(dest='S').encode('latin-1')
+    linhas = [v.id, v.cliente_id, v.produto_id, v.quantidade, v.valor_total, v.metodo_pagamento, v.data_venda]
+    return Response(content=cache_pdf.obter(f"venda:{id}", linhas, gerar), media_type="application/pdf")
 @app.get("/producao/{id}/pdf/")
 def pdf_producao(id: int, db: Session = Depends(get_db)):
     op = db.query(OrdemProducao).filter(OrdemProducao.id == id).first()
     if not op: return Response(content=b"", media_type="application/pdf")
-    pdf = FPDF(); pdf.add_page(); pdf.set_font("Arial", 'B', 16)
-    pdf.cell(190, 10, "ORDEM DE PRODUCAO", 0, 1, 'C'); pdf.line(10, 20, 200, 20); pdf.ln(10)
-    pdf.set_font("Arial", '', 12); pdf.cell(100, 10, f"OP #: {op.id}", 0, 1)
-    return Response(content=pdf.output(dest='S').encode('latin-1'), media_type="application/pdf")
+    def gerar():
+        pdf = FPDF(); pdf.add_page(); pdf.set_font("Arial", 'B', 16)
+        pdf.cell(190, 10, "ORDEM DE PRODUCAO", 0, 1, 'C'); pdf.line(10, 20, 200, 20); pdf.ln(10)
+        pdf.set_font("Arial", '', 12); pdf.cell(100, 10, f"OP #: {op.id}", 0, 1)
+        return pdf.output(dest='S').encode('latin-1')
+    linhas = [op.id, op.formula_id, op.quantidade_produzida, op.lote_codigo, op.data_producao, op.status]
+    return Response(content=cache_pdf.obter(f"producao:{id}", linhas, gerar), media_type="application/pdf")
 @app.get("/producao/{id}/etiqueta/")
 def pdf_etiqueta(id: int, db: Session = Depends(get_db)):
-    op = db.query(OrdemProducao).filter(OrdemProducao.id == id).first()
-    if not op: return Response(content=b"", media_type="application/pdf")
-    f = db.query(Formula).filter(Formula.id == op.formula_id).first()
-    p = db.query(Produto).filter(Produto.id == f.produto_final_id).first()
-    lote = db.query(Lote).filter(Lote.codigo == op.lote_codigo, Lote.produto_id == p.id).first()
-    validade = lote.validade if lote else "???"
-    qr_data = f"PROD:{p.nome}\nLOTE:{op.lote_codigo}\nVAL:{validade}\nID:{op.id}"
-    qr = qrcode.make(qr_data); temp_qr = tempfile.NamedTemporaryFile(delete=False, suffix=".png"); qr.save(temp_qr.name)
-    pdf = FPDF('L', 'mm', (60, 100)); pdf.add_page(); pdf.set_margins(2, 2, 2)
-    pdf.set_font("Arial", 'B', 10); pdf.cell(0, 5, "DECANT COSMETICS", 0, 1, 'C'); pdf.ln(2)
-    pdf.set_font("Arial", 'B', 8); pdf.multi_cell(60, 4, f"{p.nome}"); pdf.ln(2)
-    pdf.set_font("Arial", '', 8); pdf.cell(20, 4, "Lote:", 0, 0); pdf.set_font("Arial", 'B', 8); pdf.cell(40, 4, f"{op.lote_codigo}", 0, 1)
-    pdf.set_font("Arial", '', 8); pdf.cell(20, 4, "Validade:", 0, 0); pdf.set_font("Arial", 'B', 8); pdf.cell(40, 4, f"{validade}", 0, 1)
-    pdf.image(temp_qr.name, x=65, y=15, w=30, h=30); temp_qr.close(); os.unlink(temp_qr.name)
-    return Response(content=pdf.output(dest='S').encode('latin-1'), media_type="application/pdf")
+    etiquetas = carregar_etiquetas(db, ids=[id])
+    if not etiquetas: return Response(content=b"", media_type="application/pdf")
+    return Response(content=gerar_pdf_etiquetas(etiquetas), media_type="application/pdf")
+@app.post("/producao/etiquetas/")
+def pdf_etiquetas_lote(dados: EtiquetasBase, db: Session = Depends(get_db_leitura)):
+    # Várias OPs (por id ou faixa de lote) num PDF só, uma etiqueta por página
+    if not dados.ids and not dados.lote_inicio and not dados.lote_fim: raise HTTPException(400, "Informe ids ou uma faixa de lotes")
+    try: etiquetas = carregar_etiquetas(db, dados.ids, dados.lote_inicio, dados.lote_fim)
+    except ValueError as e: raise HTTPException(413, str(e))
+    if not etiquetas: raise HTTPException(404, "Nenhuma OP encontrada")
+    return Response(content=gerar_pdf_etiquetas(etiquetas, dados.paralelo), media_type="application/pdf", headers={"X-Total-Etiquetas": str(len(etiquetas))})
 @app.get("/financeiro/dashboard/")
-def dashboard(db: Session = Depends(get_db)):
-    vendas = db.query(Venda).all(); compras = db.query(PedidoCompra).all(); lancamentos = db.query(Lancamento).all()
-    receita_vendas = sum(v.valor_total for v in vendas)
-    custo_mp = sum(c.quantidade * c.valor_unitario for c in compras)
-    despesas_fixas = sum(l.valor for l in lancamentos if l.tipo == "Despesa" and l.pago)
-    receitas_extras = sum(l.valor for l in lancamentos if l.tipo == "Receita" and l.pago)
-    receita_total = receita_vendas + receitas_extras; custo_total = custo_mp + despesas_fixas; lucro_liquido = receita_total - custo_total
-    margem = (lucro_liquido / receita_total * 100) if receita_total > 0 else 0
-    d_map = defaultdict(float)
-    meses_map = {1:"Jan", 2:"Fev", 3:"Mar", 4:"Abr", 5:"Mai", 6:"Jun", 7:"Jul", 8:"Ago", 9:"Set", 10:"Out", 11:"Nov", 12:"Dez"}
-    for v in vendas: d_map[meses_map[v.data_venda.month]] += v.valor_total
-    for l in lancamentos: 
-        if l.pago and l.tipo == "Despesa": d_map[meses_map[l.data_pagamento.month]] -= l.valor
-    graf = [{"Mês":m,"Valor":v,"Tipo":"Saldo"} for m,v in d_map.items() if v != 0]
-    return {"receita": receita_total, "despesas": custo_total, "lucro": lucro_liquido, "margem": margem, "grafico": graf}
+def dashboard(db: Session = Depends(get_db_leitura)):
+    # Lê o resumo mensal (ano, mês, tipo) em vez de varrer vendas/compras/lançamentos
+    return resumo_dashboard(db)
 @app.get("/estoque/kardex/")
-def kardex(db: Session = Depends(get_db)):
-    movs = db.query(Movimentacao).order_by(Movimentacao.data.desc()).all()
-    res = []
-    for m in movs:
-        p = db.query(Produto).filter(Produto.id == m.produto_id).first()
-        res.append({"Data": m.data.strftime("%d/%m/%Y"), "Produto": p.nome if p else "?", "Tipo": m.tipo, "Qtd": m.quantidade, "Origem": m.origem})
-    return res
+def kardex(produto_id: Optional[int] = None, tipo: Optional[str] = None, inicio: Optional[date] = None, fim: Optional[date] = None, after: Optional[str] = None, limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO), db: Session = Depends(get_db_leitura)):
+    # Página keyset por (data, id); a próxima página vem no header X-Next-Cursor
+    try: linhas, proximo = pagina_kardex(db, produto_id, tipo, inicio, fim, after, limit)
+    except ValueError as e: raise HTTPException(400, str(e))
+    headers = {"X-Next-Cursor": proximo} if proximo else {}
+    return StreamingResponse(stream_json(formatar_linha(m) for m in linhas), media_type="application/json", headers=headers)
+@app.get("/estoque/em/")
+def estoque_em(data: date, produto_id: Optional[int] = None, db: Session = Depends(get_db_leitura)):
+    # Estoque no fim do dia: checkpoint mensal mais próximo + movimentos posteriores
+    return historico_estoque.estoque_em(db, data, produto_id)
+@app.get("/estoque/extrato/{produto_id}")
+def extrato_produto(produto_id: int, limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO), db: Session = Depends(get_db_leitura)):
+    # Movimentos do diário com o saldo corrente após cada um
+    return diario.extrato(db, produto_id, limit)
+@app.get("/estoque/saldos/")
+def saldos_diario(produto_id: Optional[list[int]] = Query(None), db: Session = Depends(get_db_leitura)):
+    # Saldo por produto somando o diário (confere com estoque_atual); ?produto_id=1&produto_id=2 filtra
+    return [{"produto_id": pid, "saldo": saldo} for pid, saldo in sorted(diario.saldos(db, produto_id).items())]
+# --- EXPORTAÇÃO CSV (streaming) ---
+def consulta_exportacao(entidade: str, inicio: Optional[date], fim: Optional[date]):
+    # (select, cabeçalho, coluna de data usada no filtro de período)
+    if entidade == "vendas":
+        stmt = select(Venda.id, Venda.data_venda, Venda.venda_agrupada_id, Venda.cliente_id, Cliente.nome, Venda.produto_id, Produto.nome, Venda.quantidade, Venda.valor_total, Venda.metodo_pagamento).outerjoin(Cliente, Cliente.id == Venda.cliente_id).outerjoin(Produto, Produto.id == Venda.produto_id).order_by(Venda.id)
+        cab, col = ["id", "data", "grupo", "cliente_id", "cliente", "produto_id", "produto", "quantidade", "valor_total", "metodo_pagamento"], Venda.data_venda
+    elif entidade == "kardex":
+        stmt = select(Movimentacao.id, Movimentacao.data, Movimentacao.produto_id, Produto.nome, Movimentacao.tipo, Movimentacao.quantidade, Movimentacao.origem, Movimentacao.usuario).outerjoin(Produto, Produto.id == Movimentacao.produto_id).order_by(Movimentacao.data, Movimentacao.id)
+        cab, col = ["id", "data", "produto_id", "produto", "tipo", "quantidade", "origem", "usuario"], Movimentacao.data
+    elif entidade == "lancamentos":
+        stmt = select(Lancamento.id, Lancamento.data_vencimento, Lancamento.descricao, Lancamento.tipo, Lancamento.categoria, Lancamento.valor, Lancamento.pago, Lancamento.data_pagamento).order_by(Lancamento.data_vencimento, Lancamento.id)
+        cab, col = ["id", "data_vencimento", "descricao", "tipo", "categoria", "valor", "pago", "data_pagamento"], Lancamento.data_vencimento
+        if inicio: stmt = stmt.where(col >= inicio)
+        if fim: stmt = stmt.where(col <= fim)
+        return stmt, cab
+    else: raise HTTPException(404, "Entidade inválida (vendas, kardex, lancamentos)")
+    if inicio: stmt = stmt.where(col >= datetime.combine(inicio, datetime.min.time()))
+    if fim: stmt = stmt.where(col < datetime.combine(fim + timedelta(days=1), datetime.min.time()))
+    return stmt, cab
+
+@app.get("/export/{entidade}.csv")
+def exportar_csv(entidade: str, inicio: Optional[date] = None, fim: Optional[date] = None, gzip: bool = False):
+    stmt, cab = consulta_exportacao(entidade, inicio, fim)
+    headers = {"Content-Disposition": f'attachment; filename="{nome_arquivo(entidade, gzip)}"'}
+    return StreamingResponse(gerar_csv(SessionLeitura, stmt, cab, gzip), media_type="application/gzip" if gzip else "text/csv; charset=utf-8", headers=headers)
+
 @app.get("/relatorios/lotes_vencimento/")
-def lotes_vencimento(db: Session = Depends(get_db)):
-    lotes = db.query(Lote).filter(Lote.quantidade_atual > 0).order_by(Lote.validade.asc()).all()
-    res = []
-    for l in lotes:
-        p = db.query(Produto).filter(Produto.id == l.produto_id).first()
-        res.append({"Produto": p.nome, "Lote": l.codigo, "Validade": l.validade, "Qtd": l.quantidade_atual})
-    return res
+def lotes_vencimento(dias: Optional[int] = Query(None, ge=0), db: Session = Depends(get_db_leitura)):
+    # Lotes com saldo vencendo em até N dias (vencidos inclusos), pelo índice parcial de validade
+    hoje = date.today()
+    q = db.query(Lote.codigo, Lote.validade, Lote.quantidade_atual, Produto.nome).join(Produto, Produto.id == Lote.produto_id).filter(COM_SALDO)
+    if dias is not None: q = q.filter(Lote.validade <= hoje + timedelta(days=dias))
+    return [{"Produto": l.nome, "Lote": l.codigo, "Validade": l.validade, "Dias": (l.validade - hoje).days if l.validade else None, "Qtd": l.quantidade_atual} for l in q.order_by(Lote.validade.asc()).all()]
 @app.get("/relatorios/estoque/")
-def relatorio_estoque(db: Session = Depends(get_db)):
+def relatorio_estoque(db: Session = Depends(get_db_leitura)):
     produtos = db.query(Produto).all(); dados = []; total = 0
     for p in produtos:
         val = p.estoque_atual * p.custo; total += val
         dados.append({"Produto": p.nome, "Qtd": p.estoque_atual, "Custo Unit": p.custo, "Valor Total": val})
     return {"total": total, "itens": dados}
 @app.get("/relatorios/curva_abc/")
-def curva_abc(db: Session = Depends(get_db)):
-    vendas = db.query(Venda).all(); rec = defaultdict(float)
-    for v in vendas:
-        p = db.query(Produto).filter(Produto.id == v.produto_id).first()
-        if p: rec[p.nome] += v.valor_total
-    lst = [{"Produto":k,"Receita":v} for k,v in rec.items()]; lst.sort(key=lambda x:x["Receita"], reverse=True)
-    for i,x in enumerate(lst): x["Classe"] = "A" if i==0 else "B" if i==1 else "C"
-    return lst
\ No newline at end of file
+def curva_abc(inicio: Optional[date] = None, fim: Optional[date] = None, limite_a: float = Query(80.0, gt=0, le=100), limite_b: float = Query(95.0, gt=0, le=100), db: Session = Depends(get_db_leitura)):
+    if limite_b < limite_a: raise HTTPException(400, "limite_b deve ser maior ou igual a limite_a")
+    return calcular_curva_abc(db, inicio, fim, limite_a, limite_b)
\ No newline at end of file